@@ -1,13 +1,22 @@
 from pathlib import Path
 from typing import List, Dict
 import logging
-from logging.handlers import RotatingFileHandler
 import os
 from flask import Flask
-from app.extensions import db, auth, limiter
+from app.extensions import db, read_session, auth, limiter, blob_cache, log_pipeline, metrics, access_tracker
 from app.models.user import User
 from app.routes.auth import auth_bp
 from app.routes.files import files_bp
+from app.routes.metrics import metrics_bp
+from app.cli import register_commands
+from app.services.gc_service import GarbageCollectionService
+from app.services.storage_service import StorageService
+from app.services.tiering_service import TieringService
+from app.services.upload_session_service import UploadSessionService
+from app.utils.background import PeriodicTask
+from app.utils.database import DatabaseProfile
+from app.utils.log_pipeline import JsonFormatter, SamplingFilter, SharedRotatingFileHandler
+from app.utils.volumes import StorageVolumes
 
 
 def create_app() -> Flask:
@@ -25,17 +34,26 @@ def create_app() -> Flask:
     data_dir = Path(__file__).parent.parent / 'data'
     data_dir.mkdir(parents=True, exist_ok=True)
 
+    DatabaseProfile.init_app(app)
     db.init_app(app)
+    DatabaseProfile.install(app, db)
+    read_session.init_app(app)
     limiter.init_app(app)
+    blob_cache.init_app(app)
+    access_tracker.init_app(app, len(StorageVolumes.get_tiers()))
+    metrics.init_app(app)
 
     app.register_blueprint(files_bp, url_prefix='/files')
     app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(metrics_bp)
+    register_commands(app)
     _setup_logging(app)
 
     with app.app_context():
         db.create_all()
         _initialize_default_users()
 
+    _start_background_tasks(app)
     logging.info("Flask application created and initialized.")
 
     return app
@@ -56,25 +74,72 @@ def _initialize_default_users() -> None:
             user = User(username=user_data['username'])
             user.set_password(user_data['password'])
             db.session.add(user)
-            logging.info(f"User '{user_data['username']}' created.")
+            logging.info("User '%s' created.", user_data['username'])
     db.session.commit()
 
 
-def _setup_logging(app):
+def _start_background_tasks(app: Flask) -> None:
+    """
+    Запускает фоновый сборщик мусора, если он не выключен (GC_INTERVAL_SECONDS = 0),
+    периодический сброс метрик процесса в METRICS_DIR и сведение файлов завершившихся процессов,
+    сборку завершённых загрузок по частям,
+    перенос свежих загрузок на свои тома при нескольких томах, а при нескольких уровнях хранилища —
+    запись накопленных скачиваний в БД и перенос файлов между уровнями.
+    """
+    if app.config['GC_INTERVAL_SECONDS'] > 0:
+        PeriodicTask(
+            app, 'blob-gc', app.config['GC_INTERVAL_SECONDS'], GarbageCollectionService.run_scheduled,
+            lock_path=os.path.join(app.config['STORAGE_PATH'], '.gc.lock'),
+        ).start()
+    if metrics.directory:
+        PeriodicTask(app, 'metrics-flush', app.config['METRICS_FLUSH_SECONDS'], metrics.flush).start()
+        PeriodicTask(
+            app, 'metrics-compact', app.config['METRICS_COMPACT_SECONDS'], metrics.compact,
+            lock_path=os.path.join(metrics.directory, '.compact.lock'),
+        ).start()
+    if app.config['UPLOAD_FINALIZE_INTERVAL_SECONDS'] > 0:
+        PeriodicTask(
+            app, 'upload-finalize', app.config['UPLOAD_FINALIZE_INTERVAL_SECONDS'],
+            UploadSessionService.finalize_committed,
+            lock_path=os.path.join(app.config['STORAGE_PATH'], '.uploads.lock'),
+        ).start()
+    if app.config['RELOCATE_INTERVAL_SECONDS'] > 0 and len(StorageVolumes.get_tier_volumes()) > 1:
+        PeriodicTask(
+            app, 'relocate', app.config['RELOCATE_INTERVAL_SECONDS'], StorageService.relocate_queued,
+            lock_path=os.path.join(app.config['STORAGE_PATH'], '.relocate.lock'),
+        ).start()
+    if access_tracker.enabled:
+        PeriodicTask(app, 'access-flush', app.config['ACCESS_FLUSH_SECONDS'], TieringService.flush_access).start()
+    if app.config['TIER_MIGRATION_INTERVAL_SECONDS'] > 0 and len(StorageVolumes.get_tiers()) > 1:
+        PeriodicTask(
+            app, 'tier-migrate', app.config['TIER_MIGRATION_INTERVAL_SECONDS'], TieringService.migrate,
+            lock_path=os.path.join(app.config['STORAGE_PATH'], '.tiering.lock'),
+        ).start()
+
+
+def _setup_logging(app: Flask) -> None:
+    """
+    Настраивает логирование через очередь: запись в файл (с ротацией) и в stderr
+    выполняет фоновый поток, поток запроса только кладёт запись в очередь.
+    """
     logs_dir = os.path.join(os.getcwd(), 'logs')
     if not os.path.exists(logs_dir):
         os.mkdir(logs_dir)
 
     log_file = os.path.join(logs_dir, 'file_storage.log')
-    file_handler = RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
-
-    formatter = logging.Formatter(
+    file_handler = SharedRotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
+    text_formatter = logging.Formatter(
         '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
     )
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
+    file_handler.setFormatter(JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else text_formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    log_pipeline.start(
+        app.logger, [file_handler, console_handler],
+        queue_size=app.config['LOG_QUEUE_SIZE'],
+        sample_rates=SamplingFilter.parse_rates(app.config['LOG_SAMPLE_RATES']),
+    )
 
-    app.logger.info('Application startup')
\ No newline at end of file
+    app.logger.info('Application startup')
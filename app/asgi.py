@@ -0,0 +1,274 @@
+"""
+ASGI-режим обслуживания.
+
+Запуск (uvicorn ставится отдельно, приложение его не импортирует):
+    uvicorn app.asgi:application --workers 4
+или под gunicorn:
+    gunicorn -k uvicorn.workers.UvicornWorker app.asgi:application
+"""
+import asyncio
+import base64
+import binascii
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+from werkzeug.http import parse_accept_header, parse_etags, parse_if_range_header, parse_range_header
+
+from app import create_app
+from app.extensions import access_tracker, metrics
+from app.exceptions.custom_exceptions import FileNotFoundInStorageError
+from app.models.blob import Blob
+from app.services.auth_service import AuthService
+from app.services.file_service import FileService
+from app.utils.asgi_bridge import WsgiBridge
+from app.utils.compression import BlobCompressor
+from app.utils.hashing import FileHasher
+
+
+class AsyncFileApp:
+    """
+    ASGI-приложение: скачивание файлов (GET/HEAD /files/<hash>) и /auth/verify
+    обслуживаются нативно в event loop, остальные ручки — Flask через WsgiBridge.
+
+    Ожидание сокета не держит поток: чтение файла, запросы в БД и bcrypt уходят
+    в пул потоков короткими вызовами, а отправка клиенту идёт через await.
+    Сервисы, репозитории и хранилище используются те же, что и в WSGI-режиме,
+    нативные ручки пишут те же метрики запросов, что и Flask.
+    При DOWNLOAD_OFFLOAD скачивание, как и во Flask, отвечает заголовком для прокси без тела.
+    Тело PUT /files мост не спулит во временный файл: Flask читает его прямо из receive.
+    """
+
+    # Только хэши: прочие /files/<name> (например, /files/usage) — ручки Flask
+    DOWNLOAD_PATH = re.compile(r'/files/(?P<file_hash>[0-9a-f]{64})')
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self.fallback = WsgiBridge(app, stream_body=self._is_raw_upload)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        method = scope['method']
+        match = AsyncFileApp.DOWNLOAD_PATH.fullmatch(scope['path'])
+        if match and method in ('GET', 'HEAD'):
+            await self._measured('files.download', scope, send, self._download, match['file_hash'])
+        elif scope['path'] == '/auth/verify' and method == 'GET':
+            await self._measured('auth.verify', scope, send, self._verify)
+        else:
+            await self.fallback(scope, receive, send)
+
+    async def _measured(self, endpoint: str, scope: Dict[str, Any], send: Callable,
+                        handler: Callable, *args: Any) -> None:
+        """
+        Выполняет нативную ручку, учитывая запрос в метриках под именем эндпоинта Flask.
+        """
+        start = time.perf_counter()
+        status, body_bytes = 500, 0
+
+        async def measured_send(message: Dict[str, Any]) -> None:
+            nonlocal status, body_bytes
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                body_bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await handler(scope, measured_send, *args)
+        finally:
+            metrics.record_request(endpoint, scope['method'], status, time.perf_counter() - start)
+            if endpoint == 'files.download' and status in (200, 206):
+                metrics.inc('download_bytes_total', body_bytes)
+
+    async def _run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Выполняет синхронный вызов слоя сервисов в пуле потоков внутри app context.
+        """
+        def call():
+            with self.app.app_context():
+                return fn(*args)
+        return await asyncio.to_thread(call)
+
+    async def _download(self, scope: Dict[str, Any], send: Callable, file_hash: str) -> None:
+        headers = self._request_headers(scope)
+
+        blob = await self._run(FileService.get_blob, file_hash)
+        if scope['method'] == 'HEAD':
+            if blob is None:
+                await self._respond(send, 404, [])
+            else:
+                await self._respond(send, 200, self._blob_headers(blob, blob.size))
+            return
+
+        accept_encoding = parse_accept_header(headers.get('accept-encoding'))
+        encodings = [e for e in BlobCompressor.SUFFIXES if accept_encoding[e]]
+        try:
+            offload = None if blob is None else await self._run(FileService.get_offload, file_hash, encodings)
+        except FileNotFoundInStorageError:
+            blob = None
+        if blob is None:
+            self.app.logger.warning("Download attempt for non-existent file: %s", file_hash)
+            await self._respond_json(send, 404, {'error': 'File not found'})
+            return
+
+        if_none_match = parse_etags(headers.get('if-none-match'))
+        for etag in [self._etag(file_hash, e) for e in (None, *BlobCompressor.SUFFIXES)]:
+            if if_none_match.contains_weak(etag):
+                access_tracker.record(file_hash)
+                await self._respond(send, 304, self._cache_headers(etag))
+                return
+
+        self.app.logger.info("File download requested: %s", file_hash, extra={'sample': 'download'})
+        access_tracker.record(file_hash)
+        if offload is not None:
+            header, value, encoding = offload
+            response_headers = self._blob_headers(blob, 0, self._etag(file_hash, encoding))
+            response_headers.append((header.lower().encode(), value.encode('latin-1')))
+            if encoding is not None:
+                response_headers.append((b'content-encoding', encoding.encode()))
+            metrics.inc('offloaded_downloads_total')
+            await self._respond(send, 200, response_headers)
+            return
+        cached = FileService.get_cached_content(file_hash, encodings)
+        stream = None
+        try:
+            if cached is None:
+                cached = await self._run(FileService.load_cacheable_content, file_hash, encodings)
+            if cached is not None:
+                content, encoding = cached
+                size = len(content)
+            else:
+                stream, size, encoding = await self._run(FileService.open_encoded_file, file_hash, encodings)
+        except FileNotFoundInStorageError:
+            await self._respond_json(send, 404, {'error': 'File not found'})
+            return
+
+        status, start, stop = 200, 0, size
+        etag = self._etag(file_hash, encoding)
+        response_headers = self._blob_headers(blob, size, etag)
+        if encoding is not None:
+            response_headers.append((b'content-encoding', encoding.encode()))
+        byte_range = parse_range_header(headers.get('range'))
+        if_range = parse_if_range_header(headers.get('if-range'))
+        range_applies = if_range.date is None and if_range.etag in (None, etag)
+        if byte_range is not None and len(byte_range.ranges) == 1 and range_applies:
+            bounds = byte_range.range_for_length(size)
+            if bounds is None:
+                if stream is not None:
+                    stream.close()
+                await self._respond(send, 416, [(b'content-range', f'bytes */{size}'.encode())])
+                return
+            status, (start, stop) = 206, bounds
+            response_headers = [h for h in response_headers if h[0] != b'content-length']
+            response_headers += [
+                (b'content-length', str(stop - start).encode()),
+                (b'content-range', f'bytes {start}-{stop - 1}/{size}'.encode()),
+            ]
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        if stream is None:
+            await send({'type': 'http.response.body', 'body': content[start:stop]})
+            return
+
+        try:
+            await asyncio.to_thread(stream.seek, start)
+            remaining = stop - start
+            while remaining > 0 and (chunk := await asyncio.to_thread(stream.read, min(FileHasher.CHUNK_SIZE, remaining))):
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            await asyncio.to_thread(stream.close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _verify(self, scope: Dict[str, Any], send: Callable) -> None:
+        scheme, _, credentials = self._request_headers(scope).get('authorization', '').partition(' ')
+        username = None
+        if scheme.lower() == 'basic':
+            try:
+                login, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+            except (binascii.Error, UnicodeDecodeError):
+                login, password = '', ''
+            username = await self._run(self._check_password, login, password)
+        elif scheme.lower() == 'bearer':
+            with self.app.app_context():
+                user = AuthService.verify_token(credentials)
+            username = user.username if user else None
+
+        if username is None:
+            await self._respond_json(send, 401, {
+                "error": "Authentication required",
+                "message": "Invalid credentials or missing authorization header"
+            }, [(b'www-authenticate', b'Basic realm="Authentication Required"')])
+            return
+        self.app.logger.info("User verified: %s", username, extra={'sample': 'auth'})
+        await self._respond_json(send, 200, {"username": username})
+
+    @staticmethod
+    def _is_raw_upload(scope: Dict[str, Any]) -> bool:
+        """
+        Загрузка сырым телом (PUT /files) читает тело из сокета сама, без спула моста.
+        """
+        return scope['method'] == 'PUT' and scope['path'] == '/files'
+
+    @staticmethod
+    def _check_password(login: str, password: str) -> Optional[str]:
+        user = AuthService.verify_password(login, password)
+        return user.username if user else None
+
+    @staticmethod
+    def _etag(file_hash: str, encoding: Optional[str]) -> str:
+        return file_hash if encoding is None else f"{file_hash}-{encoding}"
+
+    def _cache_headers(self, etag: str) -> List[Tuple[bytes, bytes]]:
+        max_age = self.app.config['DOWNLOAD_CACHE_MAX_AGE']
+        return [
+            (b'etag', f'"{etag}"'.encode()),
+            (b'cache-control', f'public, max-age={max_age}, immutable'.encode()),
+            (b'vary', b'Accept-Encoding'),
+        ]
+
+    def _blob_headers(self, blob: Blob, size: int, etag: Optional[str] = None) -> List[Tuple[bytes, bytes]]:
+        return self._cache_headers(etag or blob.hash) + [
+            (b'content-type', blob.content_type.encode('latin-1')),
+            (b'content-disposition', f'attachment; filename={blob.hash}'.encode()),
+            (b'content-length', str(size).encode()),
+            (b'accept-ranges', b'bytes'),
+        ]
+
+    @staticmethod
+    def _request_headers(scope: Dict[str, Any]) -> Dict[str, str]:
+        return {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+    @staticmethod
+    async def _respond(send: Callable, status: int, headers: List[Tuple[bytes, bytes]], body: bytes = b'') -> None:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _respond_json(send: Callable, status: int, payload: Dict[str, Any],
+                            headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        await AsyncFileApp._respond(send, status, [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ] + (headers or []), body)
+
+    @staticmethod
+    async def _lifespan(receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncFileApp(create_app())
@@ -0,0 +1,93 @@
+import click
+from flask import Flask
+
+from app.services.file_service import FileService
+from app.services.gc_service import GarbageCollectionService
+from app.services.scrub_service import ScrubService
+from app.services.storage_service import StorageService
+from app.services.tiering_service import TieringService
+from app.services.upload_session_service import UploadSessionService
+
+
+def register_commands(app: Flask) -> None:
+    """
+    Регистрирует служебные CLI-команды (flask <command>).
+
+    Args:
+        app (Flask): экземпляр Flask приложения.
+    """
+
+    @app.cli.command('purge-uploads')
+    def purge_uploads() -> None:
+        """Удаляет просроченные сессии загрузки по частям."""
+        purged = UploadSessionService.purge_expired()
+        click.echo(f"Purged {purged} expired upload sessions")
+
+    @app.cli.command('rebalance-storage')
+    @click.option('--dry-run', is_flag=True, help='Только показать, сколько данных переедет.')
+    def rebalance_storage(dry_run: bool) -> None:
+        """Переносит файлы на тома, назначенные текущей конфигурацией STORAGE_VOLUMES."""
+        stats = StorageService.rebalance(dry_run=dry_run)
+        action = 'Would move' if dry_run else 'Moved'
+        click.echo(f"{action} {stats['moved']} objects ({stats['bytes']} bytes)")
+
+    @app.cli.command('gc')
+    @click.option('--grace', type=int, default=None, help='Grace period в секундах (по умолчанию GC_GRACE_SECONDS).')
+    @click.option('--reconcile', is_flag=True, help='Также сверить диск с БД и удалить файлы-сироты.')
+    def collect_garbage(grace: int, reconcile: bool) -> None:
+        """Удаляет из хранилища содержимое, на которое не осталось ссылок."""
+        stats = GarbageCollectionService.collect(grace_seconds=grace)
+        click.echo(f"Deleted {stats['deleted']} blobs, {stats['revived']} back in use")
+        if reconcile:
+            stats = GarbageCollectionService.reconcile(grace_seconds=grace)
+            click.echo(', '.join(f"{key}: {value}" for key, value in stats.items()))
+
+    @app.cli.command('scrub')
+    @click.option('--workers', type=int, default=None,
+                  help='Потоков чтения на том (по умолчанию SCRUB_WORKERS_PER_VOLUME).')
+    @click.option('--max-rate', type=float, default=None,
+                  help='Лимит чтения на том в МиБ/с, 0 — без ограничения (по умолчанию SCRUB_MAX_BYTES_PER_SECOND).')
+    @click.option('--quarantine', is_flag=True,
+                  help='Переносить повреждённые файлы и файлы без записей в <том>/.quarantine.')
+    @click.option('--restart', is_flag=True, help='Начать проверку заново, не продолжая сохранённую.')
+    def scrub(workers: int, max_rate: float, quarantine: bool, restart: bool) -> None:
+        """Перечитывает хранилище и сверяет хэши файлов с именами и БД."""
+        rate = None if max_rate is None else int(max_rate * 1024 * 1024)
+        try:
+            stats = ScrubService.scrub(workers_per_volume=workers, bytes_per_second=rate,
+                                       quarantine=quarantine, restart=restart)
+        except KeyboardInterrupt:
+            click.echo("Interrupted, progress saved; run flask scrub again to resume")
+            raise SystemExit(1)
+        click.echo(', '.join(f"{key}: {value}" for key, value in stats.items()))
+
+    @app.cli.command('usage')
+    @click.option('--recount', is_flag=True, help='Сначала пересчитать счётчики по записям о файлах.')
+    def usage(recount: bool) -> None:
+        """Печатает использование хранилища по пользователям из счётчиков в БД."""
+        if recount:
+            click.echo(f"Corrected counters of {FileService.recount_usage()} users")
+        for row in FileService.get_usage_report():
+            quota = row['quota_bytes'] if row['quota_bytes'] is not None else '-'
+            click.echo(f"{row['username']}\t{row['used_bytes']}\t{row['file_count']}\t{quota}")
+
+    @app.cli.command('migrate-tiers')
+    @click.option('--dry-run', is_flag=True, help='Только показать, сколько файлов переедет.')
+    @click.option('--max-rate', type=float, default=None,
+                  help='Лимит копирования в МиБ/с, 0 — без ограничения (по умолчанию TIER_MAX_BYTES_PER_SECOND).')
+    def migrate_tiers(dry_run: bool, max_rate: float) -> None:
+        """Переносит файлы между уровнями STORAGE_TIERS по давности и частоте скачиваний."""
+        rate = None if max_rate is None else int(max_rate * 1024 * 1024)
+        stats = TieringService.migrate(dry_run=dry_run, bytes_per_second=rate)
+        click.echo(', '.join(f"{key}: {value}" for key, value in stats.items()))
+
+    @app.cli.command('tiers')
+    def tiers() -> None:
+        """Печатает заполненность уровней хранилища и статистику последнего переноса."""
+        report = TieringService.report()
+        for row in report['tiers']:
+            click.echo(f"{row['name']}\t{row['blobs']}\t{row['bytes']}\t{row['disk_used']}/{row['disk_total']}"
+                       f"\t{','.join(row['volumes'])}")
+        if report['last_migration'] is not None:
+            last = report['last_migration']
+            click.echo('last migration: ' + ', '.join(f"{key}: {value}" for key, value in last.items()))
@@ -11,8 +11,80 @@ class Config:
         SECRET_KEY (str): Секретный ключ для сессий Flask.
         SQLALCHEMY_DATABASE_URI (str): URI для подключения к базе данных.
         SQLALCHEMY_TRACK_MODIFICATIONS (bool): Отключение отслеживания изменений SQLAlchemy.
+        DATABASE_READ_URL (str): URI реплики для чтений; пусто — для SQLite read-only соединения к тому же файлу.
+        DB_SQLITE_JOURNAL_MODE (str): Режим журнала SQLite, WAL не блокирует читателей при записи.
+        DB_SQLITE_SYNCHRONOUS (str): PRAGMA synchronous; NORMAL в режиме WAL не теряет целостность при сбое.
+        DB_SQLITE_BUSY_TIMEOUT_MS (int): Сколько ждать блокировку записи до ошибки "database is locked".
+        DB_SQLITE_MMAP_SIZE (int): Сколько байт файла SQLite читать через mmap.
+        DB_POOL_SIZE, DB_MAX_OVERFLOW (int): Пул соединений серверной БД на процесс.
+        DB_POOL_RECYCLE (int): Через сколько секунд пересоздавать соединение серверной БД.
+        DB_POOL_PRE_PING (bool): Проверять соединение серверной БД перед выдачей из пула.
+        DB_STATEMENT_CACHE_SIZE (int): Размер кэша скомпилированных запросов SQLAlchemy.
         STORAGE_PATH (str): Абсолютный путь к директории для хранения файлов.
+        STORAGE_VOLUMES (str): Тома хранилища "path[:weight],...", пусто — один том STORAGE_PATH.
+        STORAGE_TIERS (str): Уровни хранилища от быстрого к ёмким "hot=path[:weight],...;cold=path[:weight],...",
+            пусто — один уровень из STORAGE_VOLUMES.
+        RELOCATE_INTERVAL_SECONDS (int): Период фонового переноса загрузок, записанных не на свой том,
+            0 — только командой flask rebalance-storage.
+        RELOCATE_BATCH_SIZE (int): Сколько файлов из очереди переноса обрабатывается за одну транзакцию.
+        TIER_DEMOTE_AFTER_SECONDS (int): Сколько файл не читали, чтобы перенести его с уровня i на i+1
+            (для уровня i умножается на i+1).
+        TIER_PROMOTE_HITS (int): Сколько скачиваний за TIER_DEMOTE_AFTER_SECONDS возвращают файл на быстрый уровень.
+        TIER_HOT_MAX_USAGE (float): Заполненность дисков быстрого уровня, выше которой давно не читанные
+            файлы переносятся вниз и без ожидания; 0 — не следить.
+        TIER_MIGRATION_INTERVAL_SECONDS (int): Период фонового переноса между уровнями,
+            0 — только командой flask migrate-tiers.
+        TIER_MIGRATION_BATCH_SIZE (int): Сколько файлов переносится за одну транзакцию.
+        TIER_MAX_BYTES_PER_SECOND (int): Лимит копирования при переносе, 0 — без ограничения.
+        TIER_UNLINK_GRACE_SECONDS (float): Пауза между копированием пачки и удалением старых копий,
+            чтобы уже найденный путь (в том числе отданный прокси) успели открыть.
+        TIER_REPORT_PATH (str): Файл со статистикой последнего переноса для flask tiers.
+        ACCESS_FLUSH_SECONDS (int): Как часто процесс записывает в БД накопленные скачивания, 0 — не учитывать.
+        STORAGE_ENGINE (str): 'file' — файл целиком по хэшу, 'chunked' — дедупликация по кускам.
+        CDC_MIN_SIZE, CDC_AVG_SIZE, CDC_MAX_SIZE (int): Размеры кусков для движка 'chunked'.
+        STORAGE_COMPRESSION (str): 'gzip' — хранить сжимаемые файлы сжатыми, 'none' — как есть.
+        COMPRESSION_LEVEL (int): Уровень сжатия gzip.
+        COMPRESSION_SAMPLE_SIZE (int): Сколько байт с начала файла сжимается для оценки выгоды.
+        COMPRESSION_MIN_SAVING (float): Минимальная доля экономии на пробе, чтобы хранить файл сжатым.
         BASIC_AUTH_FORCE (bool): Флаг, требующий базовую аутентификацию для защищенных эндпоинтов.
+        TOKEN_TTL_SECONDS (int): Время жизни Bearer-токена, выдаваемого /auth/token.
+        DOWNLOAD_CACHE_MAX_AGE (int): max-age для скачиваний, содержимое по хэшу неизменяемо.
+        DOWNLOAD_OFFLOAD (str): 'x-accel-redirect' или 'x-sendfile' — файл отдаёт фронтовой прокси, 'none' — приложение.
+        DOWNLOAD_OFFLOAD_PREFIX (str): Internal location прокси для X-Accel-Redirect.
+        DOWNLOAD_OFFLOAD_ROOT (str): Каталог, на который смотрит этот location, пусто — STORAGE_PATH.
+        BLOB_CACHE_MAX_BYTES (int): Бюджет in-memory кэша файлов на процесс, 0 — кэш выключен.
+        BLOB_CACHE_MAX_OBJECT_BYTES (int): Максимальный исходный (несжатый) размер файла, который кладётся в кэш.
+        UPLOAD_MAX_BYTES (int): Максимальный Content-Length загрузки сырым телом (PUT /files), 0 — без ограничения.
+        USER_QUOTA_BYTES (int): Квота на пользователя, если у него нет своей (User.quota_bytes), 0 — без ограничения.
+        UPLOAD_DEFAULT_CHUNK_SIZE (int): Размер части загрузки по умолчанию.
+        UPLOAD_MAX_CHUNK_SIZE (int): Максимальный размер части загрузки.
+        UPLOAD_SESSION_TTL_SECONDS (int): Через сколько секунд без активности сессия загрузки удаляется.
+        UPLOAD_FINALIZE_INTERVAL_SECONDS (float): Период сборки завершённых загрузок по частям, 0 — сразу в запросе.
+        CHUNK_REQUESTS_PER_MINUTE (str): Лимит запросов на отправку частей.
+        BATCH_MAX_ITEMS (int): Максимальное количество файлов/хэшей в одной пачке.
+        BATCH_ITEMS_PER_MINUTE (str): Лимит для пачек, считается по количеству элементов.
+        ARCHIVE_MAX_ITEMS (int): Максимальное количество файлов в одном архиве.
+        ARCHIVE_MANIFEST_MAX_BYTES (int): Максимальный размер сохранённого манифеста архива.
+        ARCHIVE_REQUESTS_PER_MINUTE (str): Лимит запросов архивов.
+        FILES_PAGE_SIZE (int): Размер страницы списка файлов по умолчанию.
+        FILES_MAX_PAGE_SIZE (int): Максимальный размер страницы списка файлов.
+        LIST_REQUESTS_PER_MINUTE (str): Лимит запросов списка файлов.
+        GC_GRACE_SECONDS (int): Сколько содержимое без ссылок (и файлы-сироты) лежит до удаления.
+        GC_BATCH_SIZE (int): Сколько кандидатов сборщик мусора обрабатывает одной транзакцией.
+        GC_INTERVAL_SECONDS (int): Период фоновой сборки мусора, 0 — только командой flask gc.
+        GC_RECONCILE_INTERVAL_SECONDS (int): Период сверки диска с БД в фоновом сборщике, 0 — не сверять.
+        SCRUB_WORKERS_PER_VOLUME (int): Потоков чтения на том при проверке целостности (flask scrub).
+        SCRUB_MAX_BYTES_PER_SECOND (int): Лимит чтения проверки на том, 0 — без ограничения.
+        SCRUB_CHECKPOINT_PATH (str): Файл с прогрессом проверки, по нему прерванная проверка продолжается.
+        SCRUB_CHECKPOINT_SECONDS (int): Как часто сохранять прогресс проверки.
+        LOG_LEVEL (str): Уровень логгера приложения.
+        LOG_FORMAT (str): 'json' — одна JSON-строка на запись в файле лога, 'text' — обычный текст.
+        LOG_QUEUE_SIZE (int): Сколько записей ждут в очереди записи, при переполнении новые отбрасываются.
+        LOG_SAMPLE_RATES (str): Доли пропускаемых массовых событий, "download=0.1,auth=0.1".
+        METRICS_DIR (str): Каталог, через который процессы gunicorn складывают метрики, пусто — только свой процесс.
+        METRICS_FLUSH_SECONDS (int): Как часто процесс сбрасывает свои метрики в METRICS_DIR;
+            столько же /metrics переиспользует посчитанные по БД размеры хранилища.
+        METRICS_COMPACT_SECONDS (int): Как часто файлы завершившихся процессов складываются в архив METRICS_DIR.
     """
 
     SECRET_KEY: str = os.environ.get('SECRET_KEY') or 'dev-key-123'
@@ -21,8 +93,93 @@ class Config:
         f"sqlite:///{Path(__file__).parent.parent / 'data' / 'data.db'}"
 
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
+    DATABASE_READ_URL: str = os.environ.get('DATABASE_READ_URL', '')
+
+    DB_SQLITE_JOURNAL_MODE: str = 'WAL'
+    DB_SQLITE_SYNCHRONOUS: str = 'NORMAL'
+    DB_SQLITE_BUSY_TIMEOUT_MS: int = int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', 30 * 1000))
+    DB_SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_POOL_SIZE: int = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW: int = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_RECYCLE: int = 30 * 60
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
 
     STORAGE_PATH: str = str(Path(__file__).parent.parent / 'store')
+    STORAGE_VOLUMES: str = os.environ.get('STORAGE_VOLUMES', '')
+    STORAGE_TIERS: str = os.environ.get('STORAGE_TIERS', '')
+    RELOCATE_INTERVAL_SECONDS: int = int(os.environ.get('RELOCATE_INTERVAL_SECONDS', 60))
+    RELOCATE_BATCH_SIZE: int = 100
+    STORAGE_ENGINE: str = os.environ.get('STORAGE_ENGINE', 'file')
+    CDC_MIN_SIZE: int = 256 * 1024
+    CDC_AVG_SIZE: int = 1024 * 1024
+    CDC_MAX_SIZE: int = 4 * 1024 * 1024
+    STORAGE_COMPRESSION: str = os.environ.get('STORAGE_COMPRESSION', 'none')
+    COMPRESSION_LEVEL: int = 6
+    COMPRESSION_SAMPLE_SIZE: int = 1024 * 1024
+    COMPRESSION_MIN_SAVING: float = 0.1
 
     BASIC_AUTH_FORCE: bool = True  # Надо требовать аутентификацию для протектед ручек
     REQUESTS_PER_MINUTE: str = "10 per minute"
+
+    TOKEN_TTL_SECONDS: int = int(os.environ.get('TOKEN_TTL_SECONDS', 15 * 60))
+    DOWNLOAD_CACHE_MAX_AGE: int = 365 * 24 * 60 * 60
+    DOWNLOAD_OFFLOAD: str = os.environ.get('DOWNLOAD_OFFLOAD', 'none')
+    DOWNLOAD_OFFLOAD_PREFIX: str = os.environ.get('DOWNLOAD_OFFLOAD_PREFIX', '/_storage/')
+    DOWNLOAD_OFFLOAD_ROOT: str = os.environ.get('DOWNLOAD_OFFLOAD_ROOT', '')
+
+    BLOB_CACHE_MAX_BYTES: int = int(os.environ.get('BLOB_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    BLOB_CACHE_MAX_OBJECT_BYTES: int = int(os.environ.get('BLOB_CACHE_MAX_OBJECT_BYTES', 256 * 1024))
+
+    UPLOAD_MAX_BYTES: int = int(os.environ.get('UPLOAD_MAX_BYTES', 0))
+    USER_QUOTA_BYTES: int = int(os.environ.get('USER_QUOTA_BYTES', 0))
+
+    UPLOAD_DEFAULT_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_MAX_CHUNK_SIZE: int = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL_SECONDS: int = int(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', 24 * 60 * 60))
+    UPLOAD_FINALIZE_INTERVAL_SECONDS: float = float(os.environ.get('UPLOAD_FINALIZE_INTERVAL_SECONDS', 1))
+    CHUNK_REQUESTS_PER_MINUTE: str = "600 per minute"
+
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_ITEMS_PER_MINUTE: str = "10000 per minute"
+
+    ARCHIVE_MAX_ITEMS: int = 10000
+    ARCHIVE_MANIFEST_MAX_BYTES: int = 1024 * 1024
+    ARCHIVE_REQUESTS_PER_MINUTE: str = "60 per minute"
+
+    FILES_PAGE_SIZE: int = 100
+    FILES_MAX_PAGE_SIZE: int = 1000
+    LIST_REQUESTS_PER_MINUTE: str = "600 per minute"
+
+    GC_GRACE_SECONDS: int = int(os.environ.get('GC_GRACE_SECONDS', 60 * 60))
+    GC_BATCH_SIZE: int = 100
+    GC_INTERVAL_SECONDS: int = int(os.environ.get('GC_INTERVAL_SECONDS', 5 * 60))
+    GC_RECONCILE_INTERVAL_SECONDS: int = int(os.environ.get('GC_RECONCILE_INTERVAL_SECONDS', 24 * 60 * 60))
+
+    TIER_DEMOTE_AFTER_SECONDS: int = int(os.environ.get('TIER_DEMOTE_AFTER_SECONDS', 30 * 24 * 60 * 60))
+    TIER_PROMOTE_HITS: int = int(os.environ.get('TIER_PROMOTE_HITS', 3))
+    TIER_HOT_MAX_USAGE: float = float(os.environ.get('TIER_HOT_MAX_USAGE', 0.85))
+    TIER_MIGRATION_INTERVAL_SECONDS: int = int(os.environ.get('TIER_MIGRATION_INTERVAL_SECONDS', 15 * 60))
+    TIER_MIGRATION_BATCH_SIZE: int = 100
+    TIER_MAX_BYTES_PER_SECOND: int = int(os.environ.get('TIER_MAX_BYTES_PER_SECOND', 100 * 1024 * 1024))
+    TIER_UNLINK_GRACE_SECONDS: float = 5
+    TIER_REPORT_PATH: str = os.environ.get(
+        'TIER_REPORT_PATH', str(Path(__file__).parent.parent / 'data' / 'tier_migration.json')
+    )
+    ACCESS_FLUSH_SECONDS: int = int(os.environ.get('ACCESS_FLUSH_SECONDS', 10))
+
+    SCRUB_WORKERS_PER_VOLUME: int = int(os.environ.get('SCRUB_WORKERS_PER_VOLUME', 2))
+    SCRUB_MAX_BYTES_PER_SECOND: int = int(os.environ.get('SCRUB_MAX_BYTES_PER_SECOND', 50 * 1024 * 1024))
+    SCRUB_CHECKPOINT_PATH: str = os.environ.get(
+        'SCRUB_CHECKPOINT_PATH', str(Path(__file__).parent.parent / 'data' / 'scrub_checkpoint.json')
+    )
+    SCRUB_CHECKPOINT_SECONDS: int = 30
+
+    LOG_LEVEL: str = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT: str = os.environ.get('LOG_FORMAT', 'json')
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_RATES: str = os.environ.get('LOG_SAMPLE_RATES', 'download=0.1,auth=0.1')
+
+    METRICS_DIR: str = os.environ.get('METRICS_DIR', str(Path(__file__).parent.parent / 'data' / 'metrics'))
+    METRICS_FLUSH_SECONDS: int = 5
+    METRICS_COMPACT_SECONDS: int = 300
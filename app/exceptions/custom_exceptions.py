@@ -15,4 +15,16 @@ class PermissionDeniedError(APIError):
 
 class AuthenticationError(APIError):
     def __init__(self, message="Authentication required"):
-        super().__init__(message, 401)
\ No newline at end of file
+        super().__init__(message, 401)
+
+class InvalidRequestError(APIError):
+    def __init__(self, message="Invalid request"):
+        super().__init__(message, 400)
+
+class UploadSessionNotFoundError(APIError):
+    def __init__(self, message="Upload session not found"):
+        super().__init__(message, 404)
+
+class QuotaExceededError(APIError):
+    def __init__(self, message="Storage quota exceeded"):
+        super().__init__(message, 507)
@@ -1,12 +1,38 @@
 import logging
 from flask_sqlalchemy import SQLAlchemy
-from flask_httpauth import HTTPBasicAuth
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from app.utils.access import AccessTracker
+from app.utils.cache import BlobCache
+from app.utils.database import ReadSession
+from app.utils.log_pipeline import LogPipeline
+from app.utils.metrics import MetricsRegistry
+
 limiter = Limiter(key_func=get_remote_address)
 
 db = SQLAlchemy()  # Объект SQLAlchemy для работы с базой данных.
+read_session = ReadSession(db)  # Сессия для чтений без записи: реплика или read-only соединение.
+
+
+basic_auth = HTTPBasicAuth()  # Объект HTTPBasicAuth для базовой HTTP-аутентификации.
+token_auth = HTTPTokenAuth(scheme='Bearer')  # Подписанные токены, проверка без bcrypt и БД.
+auth = MultiAuth(basic_auth, token_auth)  # Защищённые ручки принимают и Basic, и Bearer.
+
+blob_cache = BlobCache()  # Кэш горячих небольших файлов для скачивания.
+access_tracker = AccessTracker()  # Счётчики скачиваний для переноса файлов между уровнями хранилища.
 
+log_pipeline = LogPipeline()  # Очередь логов, файл пишет фоновый поток.
 
-auth = HTTPBasicAuth()  # Объект HTTPBasicAuth для базовой HTTP-аутентификации.
+metrics = MetricsRegistry(prefix='file_storage_')  # Метрики Prometheus, общие для всех процессов gunicorn.
+metrics.counter('http_requests_total', 'HTTP requests by endpoint, method and status.')
+metrics.histogram('http_request_duration_seconds', 'HTTP request latency by endpoint and method.')
+metrics.counter('upload_bytes_total', 'Bytes of file content received from clients.')
+metrics.counter('download_bytes_total', 'Bytes of file content sent to clients by the application.')
+metrics.counter('offloaded_downloads_total', 'Downloads handed off to the front proxy via X-Accel-Redirect/X-Sendfile.')
+metrics.counter('uploads_total', 'Uploaded or claimed files by result: created (new content) or deduplicated.')
+metrics.counter('tier_migrations_total', 'Files moved between storage tiers by direction: promote or demote.')
+metrics.counter('tier_migrated_bytes_total', 'Bytes copied between storage tiers by direction.')
+metrics.histogram('operation_duration_seconds', 'Duration of hot-path operations: hashing, storage writes, bcrypt.')
+metrics.histogram('db_query_duration_seconds', 'Duration of repository calls by method.')
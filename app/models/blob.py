@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+from sqlalchemy.orm import Mapped
+from app.extensions import db
+from app.utils.clock import utcnow
+
+
+if TYPE_CHECKING:
+    # Для избежания циклических импортов при type checking
+    from sqlalchemy.orm import Mapped
+
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+class Blob(db.Model):
+    """Модель содержимого в хранилище, одна строка на уникальный хэш.
+
+    Индекс (tier, last_accessed_at) служит выбору давно не читанных файлов уровня для переноса вниз.
+
+    Attributes:
+        hash: SHA-256 хеш содержимого (первичный ключ).
+        size: Размер содержимого в байтах.
+        refcount: Количество записей File, ссылающихся на этот хеш.
+        content_type: MIME-тип, заявленный при первой загрузке содержимого.
+        tier: Уровень хранилища, на который файл перенесён; None — первый (быстрый) уровень.
+        last_accessed_at: Время последнего скачивания или создания записи (UTC).
+        access_count: Скачиваний с начала текущего окна учёта или с последнего переноса.
+    """
+    __table_args__ = (
+        db.Index('ix_blob_tier_last_accessed_at', 'tier', 'last_accessed_at'),
+    )
+
+    hash: 'Mapped[str]' = db.Column(db.String(64), primary_key=True)
+    size: 'Mapped[int]' = db.Column(db.BigInteger, nullable=False)
+    refcount: 'Mapped[int]' = db.Column(db.Integer, nullable=False, default=0)
+    content_type: 'Mapped[str]' = db.Column(db.String(255), nullable=False, default=DEFAULT_CONTENT_TYPE)
+    tier: 'Mapped[Optional[str]]' = db.Column(db.String(32), nullable=True)
+    last_accessed_at: 'Mapped[datetime]' = db.Column(db.DateTime, nullable=False, default=utcnow)
+    access_count: 'Mapped[int]' = db.Column(db.Integer, nullable=False, default=0)
+
+
+class BlobRelocation(db.Model):
+    """Очередь файлов, записанных не на свой том, для фонового переноса.
+
+    Хэш загружаемого файла известен только после записи, поэтому файл остаётся на томе,
+    куда его записали, а переносит его StorageService.relocate_queued.
+
+    Attributes:
+        hash: SHA-256 хеш содержимого (первичный ключ).
+        queued_at: Время постановки в очередь (UTC).
+    """
+    hash: 'Mapped[str]' = db.Column(db.String(64), primary_key=True)
+    queued_at: 'Mapped[datetime]' = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class BlobGcCandidate(db.Model):
+    """Очередь содержимого, на которое не осталось ссылок, для отложенной сборки мусора.
+
+    Attributes:
+        hash: SHA-256 хеш содержимого (первичный ключ).
+        queued_at: Время, когда счётчик ссылок упал до нуля (UTC).
+    """
+    hash: 'Mapped[str]' = db.Column(db.String(64), primary_key=True)
+    queued_at: 'Mapped[datetime]' = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,53 @@
+from typing import TYPE_CHECKING
+from sqlalchemy.orm import Mapped
+from app.extensions import db
+
+
+if TYPE_CHECKING:
+    # Для избежания циклических импортов при type checking
+    from sqlalchemy.orm import Mapped
+
+
+class Chunk(db.Model):
+    """Модель уникального куска содержимого для движка хранения с дедупликацией по кускам.
+
+    Attributes:
+        hash: SHA-256 хеш куска (первичный ключ).
+        size: Размер куска в байтах.
+        refcount: Количество вхождений куска в манифесты файлов.
+    """
+    hash: 'Mapped[str]' = db.Column(db.String(64), primary_key=True)
+    size: 'Mapped[int]' = db.Column(db.Integer, nullable=False)
+    refcount: 'Mapped[int]' = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Manifest(db.Model):
+    """Модель манифеста файла, собранного из кусков.
+
+    Attributes:
+        blob_hash: SHA-256 хеш всего файла (первичный ключ).
+        size: Размер файла в байтах.
+        chunk_count: Количество кусков в манифесте.
+    """
+    blob_hash: 'Mapped[str]' = db.Column(db.String(64), primary_key=True)
+    size: 'Mapped[int]' = db.Column(db.BigInteger, nullable=False)
+    chunk_count: 'Mapped[int]' = db.Column(db.Integer, nullable=False)
+
+
+class ManifestChunk(db.Model):
+    """Модель позиции куска в манифесте файла.
+
+    Attributes:
+        blob_hash: Ссылка на манифест.
+        seq: Порядковый номер куска в файле.
+        chunk_hash: Ссылка на кусок.
+        offset: Смещение куска в файле.
+        size: Размер куска в байтах.
+    """
+    blob_hash: 'Mapped[str]' = db.Column(
+        db.String(64), db.ForeignKey('manifest.blob_hash', ondelete='CASCADE'), primary_key=True
+    )
+    seq: 'Mapped[int]' = db.Column(db.Integer, primary_key=True)
+    chunk_hash: 'Mapped[str]' = db.Column(db.String(64), db.ForeignKey('chunk.hash'), nullable=False)
+    offset: 'Mapped[int]' = db.Column(db.BigInteger, nullable=False)
+    size: 'Mapped[int]' = db.Column(db.Integer, nullable=False)
@@ -1,4 +1,5 @@
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
 from sqlalchemy.orm import Mapped
 from app.extensions import db
 
@@ -12,14 +13,29 @@ if TYPE_CHECKING:
 class File(db.Model):
     """Модель для хранения информации о загруженных файлах.
 
+    Одна строка — факт владения пользователем содержимым с данным хешем,
+    пара (hash, user_id) уникальна. Индекс (user_id, id) служит постраничному списку
+    файлов пользователя, id не переиспользуются (AUTOINCREMENT), поэтому курсор
+    синхронизации по id не пропускает новые записи.
+
     Attributes:
         id: Уникальный идентификатор файла в БД.
         hash: SHA-256 хеш содержимого файла.
         user_id: Ссылка на владельца файла.
-        user: Связь с моделью User (backref: files).
+        filename: Имя файла у этого владельца, как его прислал клиент при загрузке.
+        created_at: Время, когда владелец получил файл (UTC).
+        user: Связь с моделью User (backref: files — запрос, а не загрузка всех файлов).
     """
+    __table_args__ = (
+        db.Index('ix_file_hash_user_id', 'hash', 'user_id', unique=True),
+        db.Index('ix_file_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
     id: 'Mapped[int]' = db.Column(db.Integer, primary_key=True)
-    hash: 'Mapped[str]' = db.Column(db.String(64), nullable=False)
+    hash: 'Mapped[str]' = db.Column(db.String(64), db.ForeignKey('blob.hash'), nullable=False)
     user_id: 'Mapped[int]' = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename: 'Mapped[Optional[str]]' = db.Column(db.String(255), nullable=True)
+    created_at: 'Mapped[Optional[datetime]]' = db.Column(db.DateTime, nullable=True)
 
-    user: 'Mapped["User"]' = db.relationship('User', backref=db.backref('files', lazy=True))
+    user: 'Mapped["User"]' = db.relationship('User', backref=db.backref('files', lazy='dynamic'))
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+from sqlalchemy.orm import Mapped
+from app.extensions import db
+
+
+if TYPE_CHECKING:
+    # Для избежания циклических импортов при type checking
+    from sqlalchemy.orm import Mapped
+
+
+class UploadSession(db.Model):
+    """Модель сессии возобновляемой загрузки по частям.
+
+    Attributes:
+        id: Идентификатор сессии (uuid4 hex), выдаётся клиенту.
+        user_id: Владелец сессии.
+        total_size: Итоговый размер файла в байтах.
+        chunk_size: Размер части в байтах (последняя часть может быть меньше).
+        filename: Имя файла, заявленное при открытии сессии.
+        content_type: MIME-тип файла, заявленный при открытии сессии.
+        created_at: Время открытия сессии (UTC).
+        expires_at: Время, после которого брошенная сессия удаляется (UTC).
+        committed_at: Время запроса на завершение (UTC); None — части ещё принимаются.
+        file_hash: Хэш собранного файла, когда сборка завершена.
+        error: Почему файл не удалось зарегистрировать (например, квота), сессия при этом завершена.
+    """
+    id: 'Mapped[str]' = db.Column(db.String(32), primary_key=True)
+    user_id: 'Mapped[int]' = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    total_size: 'Mapped[int]' = db.Column(db.BigInteger, nullable=False)
+    chunk_size: 'Mapped[int]' = db.Column(db.Integer, nullable=False)
+    filename: 'Mapped[Optional[str]]' = db.Column(db.String(255), nullable=True)
+    content_type: 'Mapped[Optional[str]]' = db.Column(db.String(255), nullable=True)
+    created_at: 'Mapped[datetime]' = db.Column(db.DateTime, nullable=False)
+    expires_at: 'Mapped[datetime]' = db.Column(db.DateTime, nullable=False, index=True)
+    committed_at: 'Mapped[Optional[datetime]]' = db.Column(db.DateTime, nullable=True)
+    file_hash: 'Mapped[Optional[str]]' = db.Column(db.String(64), nullable=True)
+    error: 'Mapped[Optional[str]]' = db.Column(db.String(255), nullable=True)
+
+    @property
+    def chunk_count(self) -> int:
+        """Количество частей, из которых состоит файл."""
+        return -(-self.total_size // self.chunk_size)
+
+    def expected_chunk_size(self, index: int) -> int:
+        """Ожидаемый размер части с данным номером."""
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+
+
+class UploadChunk(db.Model):
+    """Модель принятой части загрузки.
+
+    Attributes:
+        session_id: Ссылка на сессию загрузки.
+        index: Номер части, начиная с 0.
+        size: Размер части в байтах.
+        sha256: SHA-256 хеш содержимого части.
+    """
+    session_id: 'Mapped[str]' = db.Column(
+        db.String(32), db.ForeignKey('upload_session.id', ondelete='CASCADE'), primary_key=True
+    )
+    index: 'Mapped[int]' = db.Column(db.Integer, primary_key=True)
+    size: 'Mapped[int]' = db.Column(db.Integer, nullable=False)
+    sha256: 'Mapped[str]' = db.Column(db.String(64), nullable=False)
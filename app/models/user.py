@@ -1,5 +1,5 @@
-from typing import TYPE_CHECKING
-from app.extensions import db
+from typing import TYPE_CHECKING, Optional
+from app.extensions import db, metrics
 from sqlalchemy.orm import Mapped
 import bcrypt
 from flask import current_app
@@ -17,10 +17,16 @@ class User(db.Model):
         id: Уникальный идентификатор пользователя.
         username: Логин пользователя (уникальный).
         password_hash: Хеш пароля (bcrypt).
+        used_bytes: Суммарный размер файлов пользователя, меняется в одной транзакции с записями File.
+        file_count: Количество файлов пользователя.
+        quota_bytes: Квота пользователя в байтах, None — USER_QUOTA_BYTES из конфигурации.
     """
     id: 'Mapped[int]' = db.Column(db.Integer, primary_key=True)
     username: 'Mapped[str]' = db.Column(db.String(64), unique=True, nullable=False)
     password_hash: 'Mapped[str]' = db.Column(db.String(128), nullable=False)
+    used_bytes: 'Mapped[int]' = db.Column(db.BigInteger, nullable=False, default=0)
+    file_count: 'Mapped[int]' = db.Column(db.Integer, nullable=False, default=0)
+    quota_bytes: 'Mapped[Optional[int]]' = db.Column(db.BigInteger, nullable=True)
 
     def set_password(self, password: str) -> None:
         """Генерирует и устанавливает хеш пароля.
@@ -29,13 +35,14 @@ class User(db.Model):
             password: Пароль в чистом виде.
         """
         try:
-            self.password_hash = bcrypt.hashpw(
-                password.encode('utf-8'),
-                bcrypt.gensalt()
-            ).decode('utf-8')
-            current_app.logger.debug(f"Password hash set for user {self.username}")
+            with metrics.time('operation_duration_seconds', operation='bcrypt_hash'):
+                self.password_hash = bcrypt.hashpw(
+                    password.encode('utf-8'),
+                    bcrypt.gensalt()
+                ).decode('utf-8')
+            current_app.logger.debug("Password hash set for user %s", self.username)
         except Exception as e:
-            current_app.logger.error(f"Password hashing failed for user {self.username}: {str(e)}")
+            current_app.logger.error("Password hashing failed for user %s: %s", self.username, e)
             raise
 
     def check_password(self, password: str) -> bool:
@@ -48,13 +55,14 @@ class User(db.Model):
             bool: True если пароль верный, False в противном случае.
         """
         try:
-            result = bcrypt.checkpw(
-                password.encode('utf-8'),
-                self.password_hash.encode('utf-8')
-            )
+            with metrics.time('operation_duration_seconds', operation='bcrypt_check'):
+                result = bcrypt.checkpw(
+                    password.encode('utf-8'),
+                    self.password_hash.encode('utf-8')
+                )
             if not result:
-                current_app.logger.warning(f"Invalid password attempt for user {self.username}")
+                current_app.logger.warning("Invalid password attempt for user %s", self.username)
             return result
         except Exception as e:
-            current_app.logger.error(f"Password check failed for user {self.username}: {str(e)}")
+            current_app.logger.error("Password check failed for user %s: %s", self.username, e)
             return False
\ No newline at end of file
@@ -0,0 +1,367 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import ColumnElement, and_, bindparam, case, delete, func, or_, select, update
+
+from app.extensions import db, metrics
+from app.models.blob import DEFAULT_CONTENT_TYPE, Blob, BlobGcCandidate, BlobRelocation
+
+
+@metrics.timed_methods('db_query_duration_seconds', 'method')
+class BlobRepository:
+    """Репозиторий для работы с сущностью Blob и её счётчиком ссылок.
+
+    Методы не коммитят: изменения счётчика идут в одной транзакции с записями File.
+    Запись с нулевым счётчиком не удаляется сразу, а ставится в очередь сборки мусора.
+    """
+
+    @staticmethod
+    def get(file_hash: str) -> Optional[Blob]:
+        """
+        Получить запись о содержимом по хэшу.
+
+        Args:
+            file_hash (str): Хэш файла.
+
+        Returns:
+            Optional[Blob]: Объект Blob или None, если такого содержимого нет.
+        """
+        return db.session.get(Blob, file_hash)
+
+    @staticmethod
+    def get_live(file_hash: str) -> Optional[Blob]:
+        """
+        Получить запись о содержимом, на которое есть хотя бы одна ссылка.
+
+        Содержимое без ссылок ждёт сборщика мусора: файл и запись ещё на месте,
+        но для чтения его уже нет.
+
+        Args:
+            file_hash (str): Хэш файла.
+
+        Returns:
+            Optional[Blob]: Объект Blob или None, если содержимого нет или на него не осталось ссылок.
+        """
+        blob = db.session.get(Blob, file_hash)
+        return blob if blob is not None and blob.refcount > 0 else None
+
+    @staticmethod
+    def increment_refcount(file_hash: str, size: int, content_type: str = DEFAULT_CONTENT_TYPE) -> bool:
+        """
+        Атомарно увеличить счётчик ссылок, создав запись при первой ссылке.
+
+        Args:
+            file_hash (str): Хэш файла.
+            size (int): Размер содержимого в байтах.
+            content_type (str): MIME-тип, записывается только при создании записи.
+
+        Returns:
+            bool: True, если запись о содержимом создана впервые.
+        """
+        result = db.session.execute(
+            update(Blob).where(Blob.hash == file_hash).values(refcount=Blob.refcount + 1)
+        )
+        created = result.rowcount == 0
+        if created:
+            db.session.add(Blob(hash=file_hash, size=size, refcount=1, content_type=content_type))
+            db.session.flush()
+        current_app.logger.debug("Refcount incremented for hash=%s", file_hash)
+        return created
+
+    @staticmethod
+    def add_reference(file_hash: str) -> bool:
+        """
+        Атомарно увеличить счётчик ссылок на содержимое, у которого уже есть ссылки.
+
+        Запись не создаётся: одно условное UPDATE не даёт сослаться на содержимое, которое
+        сборщик мусора как раз удаляет (delete_if_unreferenced с обратным условием).
+
+        Args:
+            file_hash (str): Хэш файла.
+
+        Returns:
+            bool: True, если ссылка добавлена; False, если содержимого нет или на него не осталось ссылок.
+        """
+        result = db.session.execute(
+            update(Blob).where(Blob.hash == file_hash, Blob.refcount > 0).values(refcount=Blob.refcount + 1)
+        )
+        current_app.logger.debug("Reference to hash=%s added: %s", file_hash, result.rowcount > 0)
+        return result.rowcount > 0
+
+    @staticmethod
+    def decrement_refcount(file_hash: str) -> int:
+        """
+        Атомарно уменьшить счётчик ссылок.
+
+        Args:
+            file_hash (str): Хэш файла.
+
+        Returns:
+            int: Оставшееся количество ссылок.
+        """
+        db.session.execute(
+            update(Blob).where(Blob.hash == file_hash).values(refcount=Blob.refcount - 1)
+        )
+        refcount = db.session.execute(
+            select(Blob.refcount).where(Blob.hash == file_hash)
+        ).scalar_one_or_none() or 0
+        current_app.logger.debug("Refcount decremented for hash=%s: %s", file_hash, refcount)
+        return refcount
+
+    @staticmethod
+    def delete_if_unreferenced(file_hash: str) -> bool:
+        """
+        Удалить запись о содержимом, если на него по-прежнему никто не ссылается.
+
+        Условие проверяется тем же запросом, поэтому параллельная загрузка,
+        успевшая увеличить счётчик, запись сохранит.
+
+        Args:
+            file_hash (str): Хэш файла.
+
+        Returns:
+            bool: True, если запись удалена.
+        """
+        result = db.session.execute(
+            delete(Blob).where(Blob.hash == file_hash, Blob.refcount <= 0)
+        )
+        return result.rowcount > 0
+
+    @staticmethod
+    def get_page(after_hash: str, limit: int) -> List[Blob]:
+        """
+        Получить страницу записей о содержимом по возрастанию хэша.
+
+        Args:
+            after_hash (str): Хэш, после которого начинается страница ('' — с начала).
+            limit (int): Размер страницы.
+
+        Returns:
+            List[Blob]: Записи о содержимом.
+        """
+        return db.session.execute(
+            select(Blob).where(Blob.hash > after_hash).order_by(Blob.hash).limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def queue_for_gc(file_hash: str, now: datetime) -> None:
+        """
+        Поставить содержимое в очередь сборки мусора.
+
+        Args:
+            file_hash (str): Хэш файла.
+            now (datetime): Время постановки (UTC).
+        """
+        db.session.merge(BlobGcCandidate(hash=file_hash, queued_at=now))
+
+    @staticmethod
+    def queue_unreferenced(now: datetime) -> int:
+        """
+        Поставить в очередь сборки мусора все записи с нулевым счётчиком, которых там ещё нет.
+
+        Args:
+            now (datetime): Время постановки (UTC).
+
+        Returns:
+            int: Количество поставленных в очередь записей.
+        """
+        hashes = db.session.execute(
+            select(Blob.hash)
+            .outerjoin(BlobGcCandidate, BlobGcCandidate.hash == Blob.hash)
+            .where(Blob.refcount <= 0, BlobGcCandidate.hash.is_(None))
+        ).scalars().all()
+        for file_hash in hashes:
+            db.session.add(BlobGcCandidate(hash=file_hash, queued_at=now))
+        return len(hashes)
+
+    @staticmethod
+    def get_gc_candidates(queued_before: datetime, limit: int) -> List[BlobGcCandidate]:
+        """
+        Получить кандидатов на удаление, пролежавших в очереди дольше grace period.
+
+        Args:
+            queued_before (datetime): Граница времени постановки в очередь (UTC).
+            limit (int): Максимальное количество кандидатов.
+
+        Returns:
+            List[BlobGcCandidate]: Кандидаты, самые старые первыми.
+        """
+        return db.session.execute(
+            select(BlobGcCandidate)
+            .where(BlobGcCandidate.queued_at <= queued_before)
+            .order_by(BlobGcCandidate.queued_at)
+            .limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def delete_gc_candidate(file_hash: str) -> None:
+        """
+        Убрать содержимое из очереди сборки мусора.
+
+        Args:
+            file_hash (str): Хэш файла.
+        """
+        db.session.execute(delete(BlobGcCandidate).where(BlobGcCandidate.hash == file_hash))
+
+    @staticmethod
+    def queue_relocation(file_hash: str, now: datetime) -> None:
+        """
+        Поставить файл в очередь переноса на свой том.
+
+        Args:
+            file_hash (str): Хэш файла.
+            now (datetime): Время постановки (UTC).
+        """
+        db.session.merge(BlobRelocation(hash=file_hash, queued_at=now))
+
+    @staticmethod
+    def get_relocations(limit: int) -> List[str]:
+        """
+        Получить хэши файлов из очереди переноса.
+
+        Args:
+            limit (int): Максимальное количество хэшей.
+
+        Returns:
+            List[str]: Хэши, поставленные в очередь раньше всех.
+        """
+        return db.session.execute(
+            select(BlobRelocation.hash).order_by(BlobRelocation.queued_at).limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def delete_relocation(file_hash: str) -> None:
+        """
+        Убрать файл из очереди переноса.
+
+        Args:
+            file_hash (str): Хэш файла.
+        """
+        db.session.execute(delete(BlobRelocation).where(BlobRelocation.hash == file_hash))
+
+    @staticmethod
+    def get_totals() -> Tuple[int, int, int]:
+        """
+        Получить сводку по хранилищу для метрик.
+
+        Returns:
+            Tuple[int, int, int]: Количество записей о содержимом, их суммарный размер в байтах
+            и длина очереди сборки мусора.
+        """
+        count, total_size = db.session.execute(select(func.count(), func.coalesce(func.sum(Blob.size), 0))).one()
+        queued = db.session.execute(select(func.count()).select_from(BlobGcCandidate)).scalar_one()
+        return count, total_size, queued
+
+    @staticmethod
+    def record_access(counts: Dict[str, int], now: datetime, window_start: datetime) -> None:
+        """
+        Записать накопленные скачивания одним пакетом.
+
+        Счётчик копится, пока скачивания идут в пределах окна; если прошлое скачивание
+        было до window_start, счёт начинается заново.
+
+        Args:
+            counts (Dict[str, int]): Количество скачиваний по хэшу.
+            now (datetime): Время скачиваний (UTC).
+            window_start (datetime): Начало окна учёта (UTC).
+        """
+        if not counts:
+            return
+        table = Blob.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.hash == bindparam('file_hash'))
+            .values(
+                access_count=case(
+                    (table.c.last_accessed_at < window_start, bindparam('hits')),
+                    else_=table.c.access_count + bindparam('hits'),
+                ),
+                last_accessed_at=now,
+            ),
+            [{'file_hash': file_hash, 'hits': hits} for file_hash, hits in counts.items()],
+        )
+
+    @staticmethod
+    def get_idle(tier: str, is_default: bool, accessed_before: datetime,
+                 after: Optional[Tuple[datetime, str]], limit: int) -> List[Blob]:
+        """
+        Получить страницу давно не скачанного содержимого уровня, самое давнее первым.
+
+        Args:
+            tier (str): Имя уровня.
+            is_default (bool): Уровень первый, к нему относятся и записи без tier.
+            accessed_before (datetime): Последнее скачивание раньше этого времени (UTC).
+            after (Optional[Tuple[datetime, str]]): (last_accessed_at, hash) последней записи прошлой страницы.
+            limit (int): Размер страницы.
+
+        Returns:
+            List[Blob]: Записи о содержимом.
+        """
+        query = select(Blob).where(BlobRepository._in_tier(tier, is_default), Blob.last_accessed_at < accessed_before)
+        if after is not None:
+            query = query.where(or_(
+                Blob.last_accessed_at > after[0],
+                and_(Blob.last_accessed_at == after[0], Blob.hash > after[1]),
+            ))
+        return db.session.execute(
+            query.order_by(Blob.last_accessed_at, Blob.hash).limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def get_popular(tier: str, min_hits: int, accessed_after: datetime, after_hash: str, limit: int) -> List[Blob]:
+        """
+        Получить страницу содержимого уровня, которое часто скачивают в текущем окне.
+
+        Args:
+            tier (str): Имя уровня (не первого).
+            min_hits (int): Минимальное количество скачиваний.
+            accessed_after (datetime): Начало окна учёта (UTC).
+            after_hash (str): Хэш, после которого начинается страница ('' — с начала).
+            limit (int): Размер страницы.
+
+        Returns:
+            List[Blob]: Записи о содержимом по возрастанию хэша.
+        """
+        return db.session.execute(
+            select(Blob)
+            .where(Blob.tier == tier, Blob.access_count >= min_hits,
+                   Blob.last_accessed_at >= accessed_after, Blob.hash > after_hash)
+            .order_by(Blob.hash)
+            .limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def set_tier(file_hash: str, tier: str) -> bool:
+        """
+        Отметить перенос содержимого на уровень и начать учёт скачиваний заново.
+
+        Args:
+            file_hash (str): Хэш файла.
+            tier (str): Имя уровня.
+
+        Returns:
+            bool: False, если записи уже нет (содержимое удалил сборщик мусора).
+        """
+        result = db.session.execute(
+            update(Blob).where(Blob.hash == file_hash).values(tier=tier, access_count=0)
+        )
+        return result.rowcount > 0
+
+    @staticmethod
+    def get_tier_totals() -> List[Tuple[Optional[str], int, int]]:
+        """
+        Получить количество и суммарный размер содержимого по уровням.
+
+        Returns:
+            List[Tuple[Optional[str], int, int]]: (уровень или None для первого, количество, байт).
+        """
+        return db.session.execute(
+            select(Blob.tier, func.count(), func.coalesce(func.sum(Blob.size), 0)).group_by(Blob.tier)
+        ).all()
+
+    @staticmethod
+    def _in_tier(tier: str, is_default: bool) -> ColumnElement[bool]:
+        if is_default:
+            return or_(Blob.tier.is_(None), Blob.tier == tier)
+        return Blob.tier == tier
@@ -0,0 +1,147 @@
+from typing import List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from app.extensions import db, metrics
+from app.models.blob import Blob
+from app.models.chunk import Chunk, Manifest, ManifestChunk
+
+
+@metrics.timed_methods('db_query_duration_seconds', 'method')
+class ChunkRepository:
+    """Репозиторий для кусков и манифестов движка хранения с дедупликацией по кускам.
+
+    Методы не коммитят: манифест и счётчики кусков меняются одной транзакцией.
+    """
+
+    @staticmethod
+    def get_manifest(blob_hash: str) -> Optional[Manifest]:
+        """
+        Получить манифест файла.
+
+        Args:
+            blob_hash (str): Хэш файла.
+
+        Returns:
+            Optional[Manifest]: Манифест или None, если файл не сохранён.
+        """
+        return db.session.get(Manifest, blob_hash)
+
+    @staticmethod
+    def get_chunk(chunk_hash: str) -> Optional[Chunk]:
+        """
+        Получить запись о куске.
+
+        Args:
+            chunk_hash (str): Хэш куска.
+
+        Returns:
+            Optional[Chunk]: Кусок или None, если на него никто не ссылается.
+        """
+        return db.session.get(Chunk, chunk_hash)
+
+    @staticmethod
+    def get_chunk_page(after_hash: str, limit: int) -> List[Chunk]:
+        """
+        Получить страницу записей о кусках по возрастанию хэша.
+
+        Args:
+            after_hash (str): Хэш, после которого начинается страница ('' — с начала).
+            limit (int): Размер страницы.
+
+        Returns:
+            List[Chunk]: Записи о кусках.
+        """
+        return db.session.execute(
+            select(Chunk).where(Chunk.hash > after_hash).order_by(Chunk.hash).limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def get_orphan_manifests(limit: int) -> List[str]:
+        """
+        Получить манифесты, для которых нет записи о содержимом (Blob).
+
+        Args:
+            limit (int): Максимальное количество манифестов.
+
+        Returns:
+            List[str]: Хэши файлов.
+        """
+        return db.session.execute(
+            select(Manifest.blob_hash)
+            .outerjoin(Blob, Blob.hash == Manifest.blob_hash)
+            .where(Blob.hash.is_(None))
+            .limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def get_manifest_chunks(blob_hash: str) -> List[ManifestChunk]:
+        """
+        Получить куски файла по порядку.
+
+        Args:
+            blob_hash (str): Хэш файла.
+
+        Returns:
+            List[ManifestChunk]: Позиции кусков, отсортированные по seq.
+        """
+        return ManifestChunk.query.filter_by(blob_hash=blob_hash).order_by(ManifestChunk.seq).all()
+
+    @staticmethod
+    def add_manifest(blob_hash: str, size: int, chunks: List[Tuple[str, int]]) -> None:
+        """
+        Добавить манифест и увеличить счётчики ссылок его кусков.
+
+        Args:
+            blob_hash (str): Хэш файла.
+            size (int): Размер файла в байтах.
+            chunks (List[Tuple[str, int]]): Хэши и размеры кусков по порядку.
+        """
+        db.session.add(Manifest(blob_hash=blob_hash, size=size, chunk_count=len(chunks)))
+        offset = 0
+        for seq, (chunk_hash, chunk_size) in enumerate(chunks):
+            result = db.session.execute(
+                update(Chunk).where(Chunk.hash == chunk_hash).values(refcount=Chunk.refcount + 1)
+            )
+            if result.rowcount == 0:
+                db.session.add(Chunk(hash=chunk_hash, size=chunk_size, refcount=1))
+                db.session.flush()
+            db.session.add(ManifestChunk(
+                blob_hash=blob_hash, seq=seq, chunk_hash=chunk_hash, offset=offset, size=chunk_size
+            ))
+            offset += chunk_size
+        db.session.flush()
+        current_app.logger.debug("Manifest added for hash=%s: %s chunks", blob_hash, len(chunks))
+
+    @staticmethod
+    def delete_manifest(blob_hash: str) -> List[str]:
+        """
+        Удалить манифест и уменьшить счётчики ссылок его кусков.
+
+        Args:
+            blob_hash (str): Хэш файла.
+
+        Returns:
+            List[str]: Хэши кусков, на которые больше никто не ссылается (их записи удалены).
+        """
+        chunk_hashes = db.session.execute(
+            select(ManifestChunk.chunk_hash).where(ManifestChunk.blob_hash == blob_hash)
+        ).scalars().all()
+        db.session.execute(delete(ManifestChunk).where(ManifestChunk.blob_hash == blob_hash))
+        db.session.execute(delete(Manifest).where(Manifest.blob_hash == blob_hash))
+
+        released: List[str] = []
+        for chunk_hash in chunk_hashes:
+            db.session.execute(
+                update(Chunk).where(Chunk.hash == chunk_hash).values(refcount=Chunk.refcount - 1)
+            )
+        for chunk_hash in dict.fromkeys(chunk_hashes):
+            refcount = db.session.execute(
+                select(Chunk.refcount).where(Chunk.hash == chunk_hash)
+            ).scalar_one_or_none() or 0
+            if refcount <= 0:
+                db.session.execute(delete(Chunk).where(Chunk.hash == chunk_hash))
+                released.append(chunk_hash)
+        current_app.logger.debug("Manifest deleted for hash=%s, released %s chunks", blob_hash, len(released))
+        return released
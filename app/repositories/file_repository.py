@@ -1,27 +1,34 @@
 from flask import current_app
 
-from typing import List
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+
+from app.extensions import metrics, read_session
+from app.models.blob import Blob
 from app.models.file import File
 
 
+@metrics.timed_methods('db_query_duration_seconds', 'method')
 class FileRepository:
     """Репозиторий для работы с сущностью File."""
 
     @staticmethod
-    def get_by_hash(file_hash: str) -> List[File]:
+    def get_by_hash_and_user(file_hash: str, user_id: int) -> Optional[File]:
         """
-        Получить список файлов по хэшу.
+        Получить запись о владении файлом конкретным пользователем.
+
+        Поиск идёт по уникальному индексу (hash, user_id) и не зависит
+        от количества владельцев этого хэша.
 
         Args:
             file_hash (str): Хэш файла.
+            user_id (int): Идентификатор пользователя.
 
         Returns:
-            List[File]: Список объектов File с данным хэшем.
+            Optional[File]: Объект File или None, если пользователь не владеет файлом.
         """
-        current_app.logger.debug(f"Запрос файлов с hash={file_hash}")
-        files = File.query.filter_by(hash=file_hash).all()
-        current_app.logger.debug(f"Найдено {len(files)} файлов")
-        return files
+        current_app.logger.debug("Запрос файла с hash=%s для user_id=%s", file_hash, user_id)
+        return File.query.filter_by(hash=file_hash, user_id=user_id).first()
 
     @staticmethod
     def count_by_hash(file_hash: str) -> int:
@@ -35,5 +42,47 @@ class FileRepository:
             int: Количество файлов с этим хэшем.
         """
         count = File.query.filter_by(hash=file_hash).count()
-        current_app.logger.debug(f"Количество файлов с hash={file_hash}: {count}")
+        current_app.logger.debug("Количество файлов с hash=%s: %s", file_hash, count)
         return count
+
+    @staticmethod
+    def get_page(user_id: int, after_id: int, limit: int) -> List[Tuple[File, int, str]]:
+        """
+        Получить страницу файлов пользователя после заданного id (keyset-пагинация).
+
+        Запрос идёт по индексу (user_id, id) и стоит одинаково на любой странице
+        при любом количестве файлов у пользователя. Читает через read_session.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            after_id (int): id последнего файла предыдущей страницы (0 — с начала).
+            limit (int): Максимальное количество файлов.
+
+        Returns:
+            List[Tuple[File, int, str]]: Файлы по возрастанию id вместе с размером и MIME-типом содержимого.
+        """
+        return read_session().execute(
+            select(File, Blob.size, Blob.content_type)
+            .join(Blob, Blob.hash == File.hash)
+            .where(File.user_id == user_id, File.id > after_id)
+            .order_by(File.id)
+            .limit(limit)
+        ).tuples().all()
+
+    @staticmethod
+    def get_with_blob(file_hash: str, user_id: int) -> Optional[Tuple[File, Blob]]:
+        """
+        Получить запись о владении вместе с записью о содержимом одним запросом.
+
+        Args:
+            file_hash (str): Хэш файла.
+            user_id (int): Идентификатор пользователя.
+
+        Returns:
+            Optional[Tuple[File, Blob]]: Пара (File, Blob) или None, если пользователь не владеет файлом.
+        """
+        return read_session().execute(
+            select(File, Blob)
+            .join(Blob, Blob.hash == File.hash)
+            .where(File.hash == file_hash, File.user_id == user_id)
+        ).tuples().first()
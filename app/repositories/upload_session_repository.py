@@ -0,0 +1,110 @@
+from datetime import datetime
+from typing import List, Optional
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from app.extensions import db, metrics
+from app.models.upload_session import UploadChunk, UploadSession
+
+
+@metrics.timed_methods('db_query_duration_seconds', 'method')
+class UploadSessionRepository:
+    """Репозиторий для работы с сессиями загрузки по частям и их частями."""
+
+    @staticmethod
+    def get(session_id: str, user_id: int) -> Optional[UploadSession]:
+        """
+        Получить сессию загрузки пользователя.
+
+        Args:
+            session_id (str): Идентификатор сессии.
+            user_id (int): Идентификатор владельца.
+
+        Returns:
+            Optional[UploadSession]: Сессия или None, если не найдена или чужая.
+        """
+        return UploadSession.query.filter_by(id=session_id, user_id=user_id).first()
+
+    @staticmethod
+    def get_expired(now: datetime, limit: int = 100) -> List[UploadSession]:
+        """
+        Получить просроченные сессии.
+
+        Args:
+            now (datetime): Текущее время (UTC).
+            limit (int): Максимальное количество сессий за раз.
+
+        Returns:
+            List[UploadSession]: Сессии с истёкшим сроком жизни.
+        """
+        return UploadSession.query.filter(UploadSession.expires_at < now).limit(limit).all()
+
+    @staticmethod
+    def get_committing(limit: int = 100) -> List[UploadSession]:
+        """
+        Получить завершённые клиентом сессии, файл которых ещё не собран.
+
+        Args:
+            limit (int): Максимальное количество сессий за раз.
+
+        Returns:
+            List[UploadSession]: Сессии в порядке запроса на завершение.
+        """
+        return UploadSession.query.filter(
+            UploadSession.committed_at.is_not(None), UploadSession.file_hash.is_(None), UploadSession.error.is_(None)
+        ).order_by(UploadSession.committed_at).limit(limit).all()
+
+    @staticmethod
+    def get_chunk(session_id: str, index: int) -> Optional[UploadChunk]:
+        """
+        Получить запись о принятой части.
+
+        Args:
+            session_id (str): Идентификатор сессии.
+            index (int): Номер части.
+
+        Returns:
+            Optional[UploadChunk]: Часть или None, если она ещё не принята.
+        """
+        return db.session.get(UploadChunk, (session_id, index))
+
+    @staticmethod
+    def get_chunks(session_id: str) -> List[UploadChunk]:
+        """
+        Получить принятые части сессии по порядку.
+
+        Args:
+            session_id (str): Идентификатор сессии.
+
+        Returns:
+            List[UploadChunk]: Список частей, отсортированный по номеру.
+        """
+        return UploadChunk.query.filter_by(session_id=session_id).order_by(UploadChunk.index).all()
+
+    @staticmethod
+    def count_chunks(session_id: str) -> int:
+        """
+        Подсчитать количество принятых частей.
+
+        Args:
+            session_id (str): Идентификатор сессии.
+
+        Returns:
+            int: Количество частей.
+        """
+        return db.session.execute(
+            select(func.count()).select_from(UploadChunk).where(UploadChunk.session_id == session_id)
+        ).scalar_one()
+
+    @staticmethod
+    def delete(upload_session: UploadSession) -> None:
+        """
+        Удалить сессию вместе с записями о частях (без коммита).
+
+        Args:
+            upload_session (UploadSession): Сессия для удаления.
+        """
+        db.session.execute(delete(UploadChunk).where(UploadChunk.session_id == upload_session.id))
+        db.session.delete(upload_session)
+        current_app.logger.debug("Upload session %s marked for deletion", upload_session.id)
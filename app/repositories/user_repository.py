@@ -1,29 +1,135 @@
 
-from typing import Optional
+from typing import List, Optional
 
 from flask import current_app
+from sqlalchemy import func, or_, select, update
 
+from app.extensions import db, metrics, read_session
+from app.models.blob import Blob
+from app.models.file import File
 from app.models.user import User
 
 
+@metrics.timed_methods('db_query_duration_seconds', 'method')
 class UserRepository:
-    """Репозиторий для работы с сущностью User."""
+    """Репозиторий для работы с сущностью User и её счётчиками использования хранилища.
+
+    Методы изменения счётчиков не коммитят: они идут в одной транзакции с записями File.
+    """
 
     @staticmethod
     def get_by_username(username: str) -> Optional[User]:
         """
         Получить пользователя по имени пользователя.
 
+        Читает через read_session (реплика или read-only соединение):
+        пользователь нужен аутентификации и в пишущие транзакции не добавляется.
+
         Args:
             username (str): Имя пользователя.
 
         Returns:
             Optional[User]: Объект User или None, если не найден.
         """
-        current_app.logger.debug(f"Поиск пользователя с username='{username}'")
-        user = User.query.filter_by(username=username).first()
+        current_app.logger.debug("Поиск пользователя с username='%s'", username)
+        user = read_session().execute(select(User).filter_by(username=username)).scalars().first()
         if user:
-            current_app.logger.debug(f"Пользователь найден: id={user.id}")
+            current_app.logger.debug("Пользователь найден: id=%s", user.id)
         else:
             current_app.logger.debug("Пользователь не найден")
         return user
+
+
+    @staticmethod
+    def get(user_id: int) -> Optional[User]:
+        """
+        Получить пользователя по идентификатору из основной БД.
+
+        Счётчики использования меняются при каждой загрузке, поэтому читаются
+        не с реплики, а из основной БД.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+
+        Returns:
+            Optional[User]: Объект User или None, если не найден.
+        """
+        return db.session.get(User, user_id)
+
+    @staticmethod
+    def add_usage(user_id: int, size: int, default_quota: int) -> bool:
+        """
+        Атомарно учесть новый файл пользователя, если он укладывается в квоту.
+
+        Проверка квоты и увеличение счётчиков — один UPDATE, поэтому параллельные
+        загрузки не превысят квоту вместе.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            size (int): Размер файла в байтах.
+            default_quota (int): Квота для пользователей без своей, 0 — без ограничения.
+
+        Returns:
+            bool: False, если файл не помещается в квоту (счётчики не изменены).
+        """
+        quota = func.coalesce(User.quota_bytes, default_quota)
+        result = db.session.execute(
+            update(User)
+            .where(User.id == user_id, or_(quota <= 0, User.used_bytes + size <= quota))
+            .values(used_bytes=User.used_bytes + size, file_count=User.file_count + 1)
+        )
+        return result.rowcount > 0
+
+    @staticmethod
+    def remove_usage(user_id: int, size: int) -> None:
+        """
+        Атомарно вычесть удалённый файл из счётчиков пользователя.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            size (int): Размер файла в байтах.
+        """
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(used_bytes=User.used_bytes - size, file_count=User.file_count - 1)
+        )
+
+    @staticmethod
+    def recount_usage() -> int:
+        """
+        Пересчитать счётчики всех пользователей по записям File.
+
+        Полный проход по таблице File: нужен один раз после добавления счётчиков
+        в существующую БД или для проверки расхождений.
+
+        Returns:
+            int: Количество пользователей, у которых счётчики изменились.
+        """
+        rows = db.session.execute(
+            select(File.user_id, func.sum(Blob.size), func.count(File.id))
+            .join(Blob, Blob.hash == File.hash)
+            .group_by(File.user_id)
+        ).tuples().all()
+        totals = {user_id: (used_bytes, file_count) for user_id, used_bytes, file_count in rows}
+        changed = 0
+        for user in db.session.execute(select(User)).scalars():
+            used_bytes, file_count = totals.get(user.id, (0, 0))
+            if (user.used_bytes, user.file_count) != (used_bytes, file_count):
+                user.used_bytes, user.file_count = used_bytes, file_count
+                changed += 1
+        return changed
+
+    @staticmethod
+    def get_usage_report() -> List[User]:
+        """
+        Получить счётчики использования всех пользователей, больших — первыми.
+
+        Читает только таблицу User, без обхода файлов.
+
+        Returns:
+            List[User]: Пользователи по убыванию used_bytes.
+        """
+        return read_session().execute(
+            select(User).order_by(User.used_bytes.desc(), User.id)
+        ).scalars().all()
@@ -1,12 +1,15 @@
 from flask import Blueprint, jsonify, current_app
 from app.services import auth_service
+from app.services.auth_service import AuthService
 from app import auth
+from app.extensions import basic_auth, token_auth
 
 
 auth_bp = Blueprint('auth', __name__)
 
 
-@auth.error_handler
+@basic_auth.error_handler
+@token_auth.error_handler
 def auth_error(status: int):
     """
     Обработчик ошибок аутентификации.
@@ -17,7 +20,7 @@ def auth_error(status: int):
     Returns:
         Response: JSON с описанием ошибки и HTTP статусом.
     """
-    current_app.logger.warning(f"Authentication error with status: {status}")
+    current_app.logger.warning("Authentication error with status: %s", status)
     if status == 401:
         return jsonify({
             "error": "Authentication required",
@@ -34,5 +37,21 @@ def verify():
     Возвращает имя пользователя, если аутентификация прошла успешно.
     """
     username = auth.current_user().username
-    current_app.logger.info(f"User verified: {username}")
+    current_app.logger.info("User verified: %s", username, extra={'sample': 'auth'})
     return {"username": username}, 200
+
+
+@auth_bp.route('/token', methods=['POST'])
+@basic_auth.login_required
+def token():
+    """
+    Эндпоинт для обмена Basic-кредов на короткоживущий Bearer-токен.
+
+    Дальнейшие запросы с токеном не требуют проверки пароля через bcrypt.
+    """
+    user = basic_auth.current_user()
+    return {
+        "token": AuthService.issue_token(user),
+        "token_type": "Bearer",
+        "expires_in": current_app.config['TOKEN_TTL_SECONDS'],
+    }, 200
@@ -1,8 +1,16 @@
-from flask import Blueprint, request, send_file, current_app
-from app.exceptions.custom_exceptions import FileNotFoundInStorageError
-from app.extensions import auth, limiter
+import io
+from typing import Any, Iterator, List, Optional
+
+from flask import Blueprint, Response, after_this_request, request, current_app, stream_with_context
+from werkzeug.wsgi import wrap_file
+from app.exceptions.custom_exceptions import APIError, FileNotFoundInStorageError
+from app.extensions import auth, limiter, blob_cache, metrics, access_tracker
+from app.models.blob import Blob
 
 from app.services.file_service import FileService
+from app.services.upload_session_service import UploadSessionService
+from app.utils.archive import ARCHIVE_WRITERS, TarStreamWriter
+from app.utils.compression import BlobCompressor
 
 
 files_bp = Blueprint('files', __name__, url_prefix='/files')
@@ -31,10 +39,139 @@ def upload():
 
     try:
         file_hash = FileService.upload_file(auth.current_user(), file)
-        current_app.logger.info(f"File uploaded successfully: {file_hash} by user {auth.current_user().username}")
+        current_app.logger.info("File uploaded successfully: %s by user %s", file_hash, auth.current_user().username)
         return {'hash': file_hash}, 200
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+    except Exception as e:
+        current_app.logger.error("Error during file upload: %s", e)
+        return {'error': str(e)}, 500
+
+
+@files_bp.route('', methods=['PUT'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['REQUESTS_PER_MINUTE'])
+def upload_raw():
+    """
+    Эндпоинт для загрузки файла сырым телом запроса, для программных клиентов.
+
+    Тело не разбирается как multipart и не копируется во временный файл Werkzeug: оно читается
+    из request.stream крупными блоками прямо во временный файл хранилища. Нужен Content-Length
+    (не больше UPLOAD_MAX_BYTES). Необязательные: заголовок X-Content-SHA256 — хэш, который
+    сверяется после приёма (если такое содержимое уже есть, тело не читается), Content-Type
+    и ?filename=. Возвращает хэш файла и статус.
+    Если тело осталось непрочитанным (пропущено или запрос отклонён), ответ закрывает соединение.
+    """
+    after_this_request(_close_if_body_unread)
+    size = request.content_length
+    if size is None:
+        return {'error': 'Content-Length is required'}, 411
+    max_size = current_app.config['UPLOAD_MAX_BYTES']
+    if max_size and size > max_size:
+        return {'error': f"File is too large, max {max_size} bytes"}, 413
+
+    try:
+        file_hash, status = FileService.upload_stream(
+            auth.current_user(), request.stream, size,
+            filename=request.args.get('filename'),
+            content_type=request.mimetype or None,
+            expected_hash=request.headers.get('X-Content-SHA256'),
+        )
+        current_app.logger.info("File uploaded as raw body: %s by user %s", file_hash, auth.current_user().username)
+        return {'hash': file_hash, 'status': status}, 200
+    except APIError as e:
+        current_app.logger.warning("Raw upload rejected: %s", e.message)
+        return {'error': e.message}, e.status_code
+    except Exception as e:
+        current_app.logger.error("Error during raw upload: %s", e)
+        return {'error': str(e)}, 500
+
+
+def _close_if_body_unread(response: Response) -> Response:
+    """
+    Добавляет Connection: close, если тело запроса прочитано не целиком: иначе на keep-alive
+    соединении его остаток был бы принят за следующий запрос. Сервер, который сам дочитывает
+    тело перед следующим запросом (gunicorn), просто потратит на это время.
+    """
+    if not getattr(request.stream, 'is_exhausted', True):
+        response.headers['Connection'] = 'close'
+    return response
+
+
+@files_bp.route('', methods=['GET'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['LIST_REQUESTS_PER_MINUTE'])
+def list_files():
+    """
+    Эндпоинт со списком файлов пользователя, постранично по курсору.
+
+    Параметры: limit — размер страницы, cursor — next_cursor предыдущей страницы,
+    since — сохранённый ранее next_cursor для получения только новых файлов.
+    Страницы запрашиваются, пока has_more; последний next_cursor годится как since.
+    """
+    if 'cursor' in request.args and 'since' in request.args:
+        return {'error': 'Use either cursor or since'}, 400
+    try:
+        return FileService.list_files(
+            auth.current_user(),
+            cursor=request.args.get('cursor') or request.args.get('since'),
+            limit=request.args.get('limit', type=int),
+        ), 200
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/batch', methods=['POST'])
+@auth.login_required
+@limiter.limit(
+    lambda: current_app.config['BATCH_ITEMS_PER_MINUTE'],
+    cost=lambda: max(len(request.files.getlist('file')), 1),
+)
+def upload_batch():
+    """
+    Эндпоинт для загрузки пачки файлов (несколько полей 'file' в multipart).
+
+    Одна проверка авторизации и один коммит на пачку, лимит считается по числу файлов.
+    Возвращает результат по каждому файлу.
+    """
+    files = [f for f in request.files.getlist('file') if f.filename != '']
+    if not files:
+        current_app.logger.warning("Batch upload attempt without files")
+        return {'error': 'No file part'}, 400
+    if len(files) > current_app.config['BATCH_MAX_ITEMS']:
+        return {'error': f"Too many files, max {current_app.config['BATCH_MAX_ITEMS']}"}, 400
+
+    try:
+        results = FileService.upload_files(auth.current_user(), files)
+        return {'results': results}, 200
     except Exception as e:
-        current_app.logger.error(f"Error during file upload: {e}")
+        current_app.logger.error("Error during batch upload: %s", e)
+        return {'error': str(e)}, 500
+
+
+@files_bp.route('/batch', methods=['DELETE'])
+@auth.login_required
+@limiter.limit(
+    lambda: current_app.config['BATCH_ITEMS_PER_MINUTE'],
+    cost=lambda: _hashes_cost(),
+)
+def delete_batch():
+    """
+    Эндпоинт для удаления пачки файлов по списку хэшей: JSON {"hashes": [...]} или просто массив хэшей.
+
+    Один коммит на пачку, возвращает результат по каждому хэшу.
+    """
+    hashes = _requested_hashes()
+    if not isinstance(hashes, list) or not hashes or not all(isinstance(h, str) for h in hashes):
+        return {'error': 'hashes must be a non-empty list of strings'}, 400
+    if len(hashes) > current_app.config['BATCH_MAX_ITEMS']:
+        return {'error': f"Too many hashes, max {current_app.config['BATCH_MAX_ITEMS']}"}, 400
+
+    try:
+        results = FileService.delete_files(auth.current_user(), hashes)
+        return {'results': results}, 200
+    except Exception as e:
+        current_app.logger.error("Error during batch deletion: %s", e)
         return {'error': str(e)}, 500
 
 
@@ -49,27 +186,360 @@ def delete(file_hash):
     """
     try:
         FileService.delete_file(auth.current_user(), file_hash)
-        current_app.logger.info(f"File deleted successfully: {file_hash} by user {auth.current_user().username}")
+        current_app.logger.info("File deleted successfully: %s by user %s", file_hash, auth.current_user().username)
         return '', 204
     except FileNotFoundInStorageError:
-        current_app.logger.warning(f"Delete attempt for non-existent file: {file_hash}")
+        current_app.logger.warning("Delete attempt for non-existent file: %s", file_hash)
         return {'error': 'File not found'}, 404
     except Exception as e:
-        current_app.logger.error(f"Error during file deletion: {e}")
+        current_app.logger.error("Error during file deletion: %s", e)
         return {'error': str(e)}, 500
 
 
-@files_bp.route('/<string:file_hash>', methods=['GET'])
+@files_bp.route('/<string:file_hash>', methods=['GET', 'HEAD'])
 def download(file_hash):
     """
     Эндпоинт для скачивания файла по его хэшу.
 
-    Возвращает файл, если он существует.
+    Содержимое адресуется хэшем и не меняется, поэтому хэш служит сильным ETag:
+    на совпавший If-None-Match отвечаем 304, не открывая файл.
+    Range/If-Range обрабатываются и дают 206.
+    Файл читается потоком, поэтому работает и с движком хранения по кускам.
+    Сжатый в хранилище файл отдаётся как есть с Content-Encoding, если клиент его принимает,
+    иначе распаковывается на лету. У сжатого представления свой ETag.
+    Небольшие горячие файлы отдаются из in-memory кэша без обращения к диску.
+    При DOWNLOAD_OFFLOAD ответ — пустое тело с X-Accel-Redirect/X-Sendfile, файл
+    и Range отдаёт фронтовой прокси; приложение только находит файл.
+    Наличие файла и Content-Type берутся из записи о содержимом в БД, без stat файла;
+    содержимое, на которое не осталось ссылок, отсутствует сразу, не дожидаясь сборщика мусора.
+    HEAD отвечает только по этой записи (наличие, размер, тип), не трогая файл:
+    клиент может проверить, есть ли содержимое, до отправки тела.
     """
+    blob = FileService.get_blob(file_hash)
+    if blob is None:
+        current_app.logger.warning("Download attempt for non-existent file: %s", file_hash)
+        return {'error': 'File not found'}, 404
+    if request.method == 'HEAD':
+        return _head(blob)
+
+    encodings = [e for e in BlobCompressor.SUFFIXES if request.accept_encodings[e]]
+    try:
+        offload = FileService.get_offload(file_hash, encodings)
+    except FileNotFoundInStorageError:
+        current_app.logger.warning("Download attempt for missing file: %s", file_hash)
+        return {'error': 'File not found'}, 404
+
+    for etag in [_etag(file_hash, e) for e in (None, *BlobCompressor.SUFFIXES)]:
+        if request.if_none_match.contains_weak(etag):
+            current_app.logger.debug("File not modified: %s", file_hash)
+            access_tracker.record(file_hash)
+            return _set_cache_headers(current_app.response_class(status=304), etag)
+
+    current_app.logger.info("File download requested: %s", file_hash, extra={'sample': 'download'})
+    access_tracker.record(file_hash)
+    if offload is not None:
+        return _offload_response(blob, *offload)
+    # Кэш смотрится после If-None-Match, чтобы ответы 304 не считались промахами
+    cached = FileService.get_cached_content(file_hash, encodings)
     try:
-        file_path = FileService.get_file_path(file_hash)
-        current_app.logger.info(f"File download requested: {file_hash}")
-        return send_file(file_path, as_attachment=True)
+        if cached is None:
+            cached = FileService.load_cacheable_content(file_hash, encodings)
+        if cached is not None:
+            content, encoding = cached
+            stream, size = io.BytesIO(content), len(content)
+        else:
+            stream, size, encoding = FileService.open_encoded_file(file_hash, encodings)
     except FileNotFoundInStorageError:
-        current_app.logger.warning(f"Download attempt for non-existent file: {file_hash}")
+        current_app.logger.warning("File vanished during download: %s", file_hash)
         return {'error': 'File not found'}, 404
+
+    response = current_app.response_class(
+        wrap_file(request.environ, stream), content_type=blob.content_type, direct_passthrough=True
+    )
+    response.content_length = size
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.headers.set('Content-Disposition', 'attachment', filename=file_hash)
+    response.set_etag(_etag(file_hash, encoding))
+    response = response.make_conditional(request, accept_ranges=True, complete_length=size)
+    metrics.inc('download_bytes_total', response.content_length or 0)
+    return _set_cache_headers(response, _etag(file_hash, encoding))
+
+
+@files_bp.route('/archive', methods=['POST'])
+@limiter.limit(lambda: current_app.config['ARCHIVE_REQUESTS_PER_MINUTE'])
+def archive():
+    """
+    Эндпоинт для скачивания многих файлов одним архивом: JSON {"hashes": [...]} или просто массив хэшей.
+
+    Формат задаётся ?format=tar (по умолчанию) или zip. Архив собирается на лету и отдаётся
+    сразу, члены называются хэшами. Отсутствующие файлы не прерывают архив, а перечисляются
+    в последнем члене manifest.json (поле missing).
+    """
+    try:
+        file_hashes = FileService.check_archive_hashes(_requested_hashes())
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+    return _archive_response(file_hashes)
+
+
+@files_bp.route('/archive/<string:manifest_hash>', methods=['GET'])
+@limiter.limit(lambda: current_app.config['ARCHIVE_REQUESTS_PER_MINUTE'])
+def archive_manifest(manifest_hash):
+    """
+    Эндпоинт для скачивания архива по сохранённому манифесту — загруженному ранее файлу
+    со списком хэшей (JSON-массив или по хэшу на строку). Формат — как у POST /files/archive.
+    """
+    try:
+        file_hashes = FileService.read_archive_manifest(manifest_hash)
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+    return _archive_response(file_hashes)
+
+
+def _requested_hashes() -> Any:
+    """
+    Достаёт список хэшей из JSON-тела: {"hashes": [...]} или массив целиком.
+    Тело разбирается один раз (request.get_json кэширует результат), проверку типов элементов делает вызывающий.
+
+    :return: Значение из тела или None, если тело не JSON-объект и не массив
+    """
+    body = request.get_json(silent=True)
+    if isinstance(body, list):
+        return body
+    if isinstance(body, dict):
+        return body.get('hashes')
+    return None
+
+
+def _hashes_cost() -> int:
+    """
+    Стоимость запроса со списком хэшей для лимитера: число хэшей, но не меньше 1.
+    Неверное тело стоит 1, ответ 400 на него даёт сама ручка.
+    """
+    hashes = _requested_hashes()
+    return max(len(hashes), 1) if isinstance(hashes, list) else 1
+
+
+def _archive_response(file_hashes: List[str]) -> Response:
+    """
+    Потоковый ответ с архивом, без Content-Length.
+    """
+    archive_format = request.args.get('format', TarStreamWriter.EXTENSION)
+    writer = ARCHIVE_WRITERS.get(archive_format)
+    if writer is None:
+        return {'error': f"format must be one of: {', '.join(ARCHIVE_WRITERS)}"}, 400
+    current_app.logger.info("Archive of %s files requested", len(file_hashes), extra={'sample': 'download'})
+    chunks = FileService.stream_archive(file_hashes, archive_format)
+    response = current_app.response_class(stream_with_context(_count_download_bytes(chunks)), mimetype=writer.MIMETYPE)
+    response.headers.set('Content-Disposition', 'attachment', filename=f"archive.{archive_format}")
+    return response
+
+
+def _count_download_bytes(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Учитывает отданные байты в метриках по мере отправки.
+    """
+    for chunk in chunks:
+        metrics.inc('download_bytes_total', len(chunk))
+        yield chunk
+
+
+@files_bp.route('/cache/stats', methods=['GET'])
+@auth.login_required
+def cache_stats():
+    """
+    Эндпоинт со счётчиками in-memory кэша текущего процесса.
+    """
+    return blob_cache.stats(), 200
+
+
+def _head(blob: Blob) -> Response:
+    """
+    Отвечает на HEAD по записи о содержимом в БД (только содержимому со ссылками, см. FileService.get_blob).
+    """
+    response = current_app.response_class(status=200, content_type=blob.content_type)
+    response.headers['Content-Length'] = str(blob.size)
+    response.accept_ranges = 'bytes'
+    return _set_cache_headers(response, blob.hash)
+
+
+def _offload_response(blob: Blob, header: str, value: str, encoding: Optional[str]) -> Response:
+    """
+    Ответ с внутренним перенаправлением на файл: заголовки содержимого, тело отдаёт прокси.
+    """
+    response = current_app.response_class(content_type=blob.content_type)
+    response.headers[header] = value
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.headers.set('Content-Disposition', 'attachment', filename=blob.hash)
+    response.accept_ranges = 'bytes'
+    metrics.inc('offloaded_downloads_total')
+    return _set_cache_headers(response, _etag(blob.hash, encoding))
+
+
+@files_bp.route('/<string:file_hash>/claim', methods=['POST'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['BATCH_ITEMS_PER_MINUTE'])
+def claim(file_hash):
+    """
+    Эндпоинт для привязки уже хранящегося содержимого к пользователю по хэшу,
+    без загрузки тела файла. Необязательный JSON {"filename": str} задаёт имя файла.
+    """
+    body = request.get_json(silent=True)
+    if body is not None and not isinstance(body, dict):
+        return {'error': 'Body must be a JSON object'}, 400
+    filename = (body or {}).get('filename')
+    if filename is not None and not isinstance(filename, str):
+        return {'error': 'filename must be a string'}, 400
+    try:
+        filename, _ = FileService.describe_upload(filename, None)
+        status = FileService.claim_file(auth.current_user(), file_hash, filename)
+        current_app.logger.info("File claimed: %s by user %s", file_hash, auth.current_user().username)
+        return {'hash': file_hash, 'status': status}, 200
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/<string:file_hash>/meta', methods=['GET'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['LIST_REQUESTS_PER_MINUTE'])
+def metadata(file_hash):
+    """
+    Эндпоинт со сведениями о файле пользователя: имя, размер, тип, время добавления.
+
+    Отвечает только по БД, не обращаясь к хранилищу.
+    """
+    try:
+        return FileService.get_metadata(auth.current_user(), file_hash), 200
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/usage', methods=['GET'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['LIST_REQUESTS_PER_MINUTE'])
+def usage():
+    """
+    Эндпоинт с использованием хранилища пользователем: used_bytes, file_count, quota_bytes.
+
+    Счётчики хранятся в строке пользователя и обновляются вместе с загрузкой и удалением.
+    """
+    return FileService.get_usage(auth.current_user()), 200
+
+
+def _etag(file_hash: str, encoding: Optional[str]) -> str:
+    """
+    ETag представления: хэш для исходного содержимого, хэш с кодеком для сжатого.
+    """
+    return file_hash if encoding is None else f"{file_hash}-{encoding}"
+
+
+def _set_cache_headers(response: Response, etag: str) -> Response:
+    """
+    Проставляет ETag и заголовки долгого кэширования неизменяемого содержимого.
+    """
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['DOWNLOAD_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+@files_bp.route('/uploads', methods=['POST'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['REQUESTS_PER_MINUTE'])
+def open_upload():
+    """
+    Эндпоинт для открытия сессии загрузки по частям.
+
+    Принимает JSON {"total_size": int, "chunk_size": int, "filename": str, "content_type": str},
+    все поля, кроме total_size, необязательны.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        total_size = int(payload['total_size'])
+        chunk_size = int(payload.get('chunk_size', current_app.config['UPLOAD_DEFAULT_CHUNK_SIZE']))
+    except (KeyError, TypeError, ValueError):
+        return {'error': 'total_size is required'}, 400
+    filename, content_type = payload.get('filename'), payload.get('content_type')
+    if not all(value is None or isinstance(value, str) for value in (filename, content_type)):
+        return {'error': 'filename and content_type must be strings'}, 400
+
+    try:
+        upload_session = UploadSessionService.open_session(
+            auth.current_user(), total_size, chunk_size, filename, content_type
+        )
+        return UploadSessionService.get_status(auth.current_user(), upload_session.id), 201
+    except APIError as e:
+        current_app.logger.warning("Failed to open upload session: %s", e.message)
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/uploads/<string:upload_id>/chunks/<int:index>', methods=['PUT'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['CHUNK_REQUESTS_PER_MINUTE'])
+def put_chunk(upload_id, index):
+    """
+    Эндпоинт для отправки части загрузки телом запроса.
+
+    Часть можно отправлять повторно. Необязательный заголовок X-Chunk-SHA256
+    сверяется с хэшем принятых байт.
+    """
+    try:
+        chunk = UploadSessionService.put_chunk(
+            auth.current_user(), upload_id, index, request.stream,
+            expected_sha256=request.headers.get('X-Chunk-SHA256'),
+        )
+        return {'index': chunk.index, 'size': chunk.size, 'sha256': chunk.sha256}, 200
+    except APIError as e:
+        current_app.logger.warning("Chunk %s rejected for upload %s: %s", index, upload_id, e.message)
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/uploads/<string:upload_id>', methods=['GET'])
+@auth.login_required
+def upload_status(upload_id):
+    """
+    Эндпоинт для получения прогресса загрузки: список принятых частей.
+    """
+    try:
+        return UploadSessionService.get_status(auth.current_user(), upload_id), 200
+    except APIError as e:
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/uploads/<string:upload_id>/commit', methods=['POST'])
+@auth.login_required
+@limiter.limit(lambda: current_app.config['REQUESTS_PER_MINUTE'])
+def commit_upload(upload_id):
+    """
+    Эндпоинт для завершения загрузки по частям. Возвращает статус сессии:
+    200 с хэшем файла, если он уже собран, иначе 202 — хэш появится в статусе сессии.
+    """
+    try:
+        upload_session = UploadSessionService.commit(auth.current_user(), upload_id)
+        status = UploadSessionService.get_status(auth.current_user(), upload_id)
+        if upload_session.file_hash is None:
+            return status, 202
+        current_app.logger.info(
+            "File uploaded in chunks: %s by user %s", upload_session.file_hash, auth.current_user().username
+        )
+        return status, 200
+    except APIError as e:
+        current_app.logger.warning("Failed to commit upload %s: %s", upload_id, e.message)
+        return {'error': e.message}, e.status_code
+
+
+@files_bp.route('/uploads/<string:upload_id>', methods=['DELETE'])
+@auth.login_required
+def abort_upload(upload_id):
+    """
+    Эндпоинт для отмены загрузки по частям.
+    """
+    try:
+        UploadSessionService.abort(auth.current_user(), upload_id)
+        return '', 204
+    except APIError as e:
+        return {'error': e.message}, e.status_code
@@ -0,0 +1,31 @@
+from flask import Blueprint, current_app
+
+from app.extensions import metrics
+from app.services.storage_service import StorageService
+
+
+metrics_bp = Blueprint('metrics', __name__)
+"""
+Blueprint с метриками для Prometheus.
+"""
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def export():
+    """
+    Эндпоинт с метриками всех процессов в текстовом формате Prometheus.
+
+    Счётчики и гистограммы собираются из METRICS_DIR, размеры хранилища считаются по БД
+    не чаще раза в METRICS_FLUSH_SECONDS на процесс. Доля дедупликации: uploads_total{status="deduplicated"} / uploads_total.
+    """
+    try:
+        stats = StorageService.get_stats(max_age=current_app.config['METRICS_FLUSH_SECONDS'])
+        gauges = {
+            'blobs': ('Distinct content items stored.', stats['blobs']),
+            'stored_bytes': ('Logical size of distinct stored content in bytes.', stats['stored_bytes']),
+            'gc_queue': ('Unreferenced content waiting for garbage collection.', stats['gc_queue']),
+        }
+    except Exception as e:
+        current_app.logger.error("Failed to collect storage stats for metrics: %s", e)
+        gauges = {}
+    return current_app.response_class(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
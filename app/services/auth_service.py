@@ -1,19 +1,33 @@
-from typing import Optional
+from typing import NamedTuple, Optional, Union
 
 from flask import current_app
 
-from app import auth
+from app.extensions import basic_auth, token_auth
 from app.repositories.user_repository import UserRepository
 from app.models.user import User
+from app.utils.tokens import TokenSigner
+
+
+class TokenUser(NamedTuple):
+    """
+    Пользователь, восстановленный из Bearer-токена без обращения к БД.
+
+    Attributes:
+        id: Идентификатор пользователя.
+        username: Логин пользователя.
+    """
+    id: int
+    username: str
 
 
 class AuthService:
     """
-    Сервис аутентификации пользователей, реализующий проверку логина и пароля.
+    Сервис аутентификации пользователей, реализующий проверку логина и пароля
+    и выпуск/проверку подписанных токенов.
     """
 
     @staticmethod
-    @auth.verify_password
+    @basic_auth.verify_password
     def verify_password(username: str, password: str) -> Optional[User]:
         """
         Проверяет имя пользователя и пароль.
@@ -22,16 +36,43 @@ class AuthService:
         :param password: Пароль из запроса
         :return: Объект User, если аутентификация успешна, иначе None
         """
-        current_app.logger.debug(f"Authentication attempt for user: {username}")
+        current_app.logger.debug("Authentication attempt for user: %s", username)
 
         user = UserRepository.get_by_username(username)
         if not user:
-            current_app.logger.warning(f"Authentication failed: user '{username}' not found")
+            current_app.logger.warning("Authentication failed: user '%s' not found", username)
             return None
 
         if not user.check_password(password):
-            current_app.logger.warning(f"Authentication failed: invalid password for user '{username}'")
+            current_app.logger.warning("Authentication failed: invalid password for user '%s'", username)
             return None
 
-        current_app.logger.info(f"User '{username}' authenticated successfully")
+        current_app.logger.info("User '%s' authenticated successfully", username, extra={'sample': 'auth'})
         return user
+
+    @staticmethod
+    @token_auth.verify_token
+    def verify_token(token: str) -> Optional[TokenUser]:
+        """
+        Проверяет Bearer-токен: только подпись и срок действия, без bcrypt и запросов в БД.
+
+        :param token: Токен из заголовка Authorization
+        :return: TokenUser, если токен валиден, иначе None
+        """
+        payload = TokenSigner.verify(token)
+        if payload is None:
+            current_app.logger.warning("Authentication failed: invalid or expired token")
+            return None
+        return TokenUser(id=payload['id'], username=payload['username'])
+
+    @staticmethod
+    def issue_token(user: Union[User, TokenUser]) -> str:
+        """
+        Выпускает короткоживущий токен для пользователя.
+
+        :param user: Аутентифицированный пользователь
+        :return: Подписанный токен
+        """
+        token = TokenSigner.issue(user.id, user.username, current_app.config['TOKEN_TTL_SECONDS'])
+        current_app.logger.info("Token issued for user '%s'", user.username)
+        return token
@@ -1,12 +1,25 @@
-from typing import IO
+import io
+import json
+import mimetypes
+import os
+from typing import IO, Any, Collection, Dict, Iterator, List, Optional, Tuple
 
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
 
 from app import db
-from app.exceptions.custom_exceptions import FileNotFoundInStorageError
+from app.exceptions.custom_exceptions import FileNotFoundInStorageError, InvalidRequestError, QuotaExceededError
+from app.extensions import blob_cache, metrics
+from app.models.blob import DEFAULT_CONTENT_TYPE, Blob
 from app.models.file import File
+from app.repositories.blob_repository import BlobRepository
 from app.repositories.file_repository import FileRepository
+from app.repositories.user_repository import UserRepository
+from app.utils.archive import ARCHIVE_WRITERS
+from app.utils.clock import utcnow
+from app.utils.compression import BlobCompressor
 from app.utils.hashing import FileHasher
+from app.utils.offload import DownloadOffload
 from app.utils.storage import FileStorage
 from app.models.user import User
 
@@ -16,69 +29,695 @@ class FileService:
     Сервис для работы с файлами: загрузка, удаление и получение пути к файлу.
     """
 
+    STATUS_CREATED: str = 'created'
+    STATUS_DEDUPLICATED: str = 'deduplicated'
+    STATUS_DELETED: str = 'deleted'
+    STATUS_NOT_FOUND: str = 'not_found'
+    STATUS_ERROR: str = 'error'
+    STATUS_QUOTA_EXCEEDED: str = 'quota_exceeded'
+    ARCHIVE_MANIFEST_NAME: str = 'manifest.json'  # Последний член архива: что отдано и чего не нашлось
+
     @staticmethod
     def upload_file(user: User, file_stream: IO) -> str:
         """
         Загружает файл в хранилище, если такого файла еще нет,
         связывает файл с пользователем в базе.
 
+        Поток читается один раз: хэш считается одновременно с записью на диск.
+        Ссылка коммитится до переноса файла на место, см. FileStorage.place_temp_file.
+        Имя файла и MIME-тип из запроса сохраняются в БД вместе со ссылкой.
+
         :param user: Пользователь, загружающий файл
         :param file_stream: Поток файла (werkzeug FileStorage или похожий)
         :return: Хэш файла
+        :raises QuotaExceededError: если файл не помещается в квоту пользователя
         """
-        file_hash = FileHasher.compute_hash(file_stream)
-        current_app.logger.debug(f"Uploading file with hash: {file_hash} for user id: {user.id}")
+        filename, content_type = FileService.describe_upload(
+            getattr(file_stream, 'filename', None), getattr(file_stream, 'mimetype', None)
+        )
+        tmp_path, file_hash, size = FileStorage.write_temp_file(file_stream)
+        current_app.logger.debug("Uploading file with hash: %s for user id: %s", file_hash, user.id)
+        try:
+            FileService.register_file(user, file_hash, size, filename, content_type)
+            FileStorage.place_temp_file(tmp_path, file_hash)
+        finally:
+            FileStorage.discard_temp_file(tmp_path)
+        return file_hash
 
-        existing_files = FileRepository.get_by_hash(file_hash)
-        if not existing_files:
-            current_app.logger.info(f"Saving new file to storage: {file_hash}")
-            FileStorage.save_file(file_stream, file_hash)
-        else:
-            current_app.logger.debug(f"File with hash {file_hash} already exists in storage")
+    @staticmethod
+    def upload_stream(user: User, stream: IO, size: int, filename: Optional[str] = None,
+                      content_type: Optional[str] = None, expected_hash: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Загружает файл из сырого тела запроса: без разбора multipart и промежуточных копий
+        байты из сокета за один проход пишутся во временный файл хранилища.
+
+        Если клиент заявил хэш и такое содержимое уже хранится, тело не читается вовсе
+        (как claim_file: знание хэша и так даёт доступ к содержимому). Если сборщик мусора
+        удалил содержимое между проверкой и ссылкой, тело читается и сохраняется как обычно.
+
+        :param user: Пользователь, загружающий файл
+        :param stream: Поток тела запроса
+        :param size: Размер тела (Content-Length)
+        :param filename: Имя файла (необязательно)
+        :param content_type: MIME-тип файла (необязательно, иначе угадывается по имени)
+        :param expected_hash: SHA-256, заявленный клиентом, сверяется после приёма тела
+        :return: Кортеж (хэш файла, STATUS_CREATED или STATUS_DEDUPLICATED)
+        :raises InvalidRequestError: если заявленный хэш некорректен или не совпал, либо тело короче size
+        :raises QuotaExceededError: если файл не помещается в квоту пользователя
+        """
+        filename, content_type = FileService.describe_upload(filename, content_type)
+        if expected_hash is not None:
+            expected_hash = expected_hash.lower()
+            if not FileHasher.is_valid_hash(expected_hash):
+                raise InvalidRequestError("Declared SHA-256 must be 64 hex characters")
+            blob = BlobRepository.get_live(expected_hash)
+            if blob is not None and blob.size == size and FileStorage.exists(expected_hash):
+                try:
+                    status = FileService.register_file(
+                        user, expected_hash, size, filename, blob.content_type, existing_only=True
+                    )
+                    current_app.logger.debug("Body of %s skipped for user %s: already stored", expected_hash, user.id)
+                    return expected_hash, status
+                except FileNotFoundInStorageError:
+                    current_app.logger.debug("Stored copy of %s collected, reading the body", expected_hash)
+        FileService.check_quota(user, size)
+
+        tmp_path, file_hash, received = FileStorage.write_temp_file(stream, limit=size, expected_hash=expected_hash)
+        try:
+            if received != size:
+                raise InvalidRequestError(f"Received {received} of {size} bytes")
+            if expected_hash is not None and file_hash != expected_hash:
+                current_app.logger.warning("Upload by user %s: declared %s, got %s", user.id, expected_hash, file_hash)
+                raise InvalidRequestError("SHA-256 mismatch")
+            status = FileService.register_file(user, file_hash, size, filename, content_type)
+            FileStorage.place_temp_file(tmp_path, file_hash)
+        finally:
+            FileStorage.discard_temp_file(tmp_path)
+        return file_hash, status
 
-        if not any(f.user_id == user.id for f in existing_files):
-            new_file = File(hash=file_hash, user_id=user.id)
-            db.session.add(new_file)
+    @staticmethod
+    def register_file(user: User, file_hash: str, size: int, filename: Optional[str] = None,
+                      content_type: str = DEFAULT_CONTENT_TYPE, existing_only: bool = False) -> str:
+        """
+        Связывает уже лежащее в хранилище содержимое с пользователем.
+
+        Общий путь дедупликации и учёта использования для всех способов загрузки.
+
+        :param user: Владелец файла
+        :param file_hash: Хэш файла
+        :param size: Размер содержимого в байтах
+        :param filename: Имя файла у владельца
+        :param content_type: MIME-тип, сохраняется, если содержимое новое
+        :param existing_only: Только сослаться на содержимое, на которое уже есть ссылки, без создания записи
+            (вызывающий не принёс файл, а сборщик мусора мог удалить содержимое после проверки)
+        :return: STATUS_CREATED, если содержимое новое, иначе STATUS_DEDUPLICATED
+        :raises QuotaExceededError: если файл не помещается в квоту пользователя
+        :raises FileNotFoundInStorageError: если при existing_only на содержимое не осталось ссылок
+        """
+        try:
+            status = FileService._link_file(user, file_hash, size, filename, content_type, existing_only)
+            db.session.commit()
+        except IntegrityError:
+            # Параллельная загрузка того же содержимого успела вставить строку раньше
+            db.session.rollback()
+            status = FileService._link_file(user, file_hash, size, filename, content_type, existing_only)
             db.session.commit()
-            current_app.logger.info(f"Linked file {file_hash} to user {user.id}")
+        except FileNotFoundInStorageError:
+            db.session.rollback()
+            current_app.logger.debug("File %s vanished before linking to user %s", file_hash, user.id)
+            raise
+        except QuotaExceededError:
+            db.session.rollback()
+            metrics.inc('uploads_total', status=FileService.STATUS_QUOTA_EXCEEDED)
+            current_app.logger.warning("File %s rejected for user %s: quota exceeded", file_hash, user.id)
+            raise
 
-        return file_hash
+        metrics.inc('uploads_total', status=status)
+        current_app.logger.info("Linked file %s to user %s: %s", file_hash, user.id, status)
+        return status
+
+    @staticmethod
+    def upload_files(user: User, file_streams: List[IO]) -> List[Dict[str, Any]]:
+        """
+        Загружает пачку файлов одной транзакцией.
+
+        Ошибка сохранения отдельного файла не прерывает пачку и попадает в его результат.
+
+        :param user: Пользователь, загружающий файлы
+        :param file_streams: Потоки файлов (werkzeug FileStorage или похожие)
+        :return: Результаты по каждому файлу: filename, hash,
+            status (created/deduplicated/quota_exceeded/error)
+        """
+        results: List[Dict[str, Any]] = []
+        stored: List[Tuple[Dict[str, Any], str, str, int, str]] = []
+        try:
+            for file_stream in file_streams:
+                filename, content_type = FileService.describe_upload(
+                    getattr(file_stream, 'filename', None), getattr(file_stream, 'mimetype', None)
+                )
+                result: Dict[str, Any] = {'filename': filename}
+                try:
+                    tmp_path, file_hash, size = FileStorage.write_temp_file(file_stream)
+                    result['hash'] = file_hash
+                    stored.append((result, tmp_path, file_hash, size, content_type))
+                except Exception as e:
+                    current_app.logger.error("Error saving file %s in batch: %s", result['filename'], e)
+                    result.update(status=FileService.STATUS_ERROR, error=str(e))
+                results.append(result)
+
+            for attempt in range(2):
+                try:
+                    for result, _, file_hash, size, content_type in stored:
+                        result.pop('error', None)  # Могла остаться от прошлой попытки
+                        try:
+                            result['status'] = FileService._link_file(
+                                user, file_hash, size, result['filename'], content_type
+                            )
+                        except QuotaExceededError as e:
+                            # Ничего не изменено, остальные файлы пачки ещё могут поместиться
+                            result.update(status=FileService.STATUS_QUOTA_EXCEEDED, error=e.message)
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    # Параллельная загрузка того же содержимого, повторяем пачку один раз
+                    db.session.rollback()
+                    if attempt:
+                        raise
+            for result, _, _, _, _ in stored:
+                metrics.inc('uploads_total', status=result['status'])
+
+            for result, tmp_path, file_hash, _, _ in stored:
+                if result['status'] == FileService.STATUS_QUOTA_EXCEEDED:
+                    continue
+                try:
+                    FileStorage.place_temp_file(tmp_path, file_hash)
+                except Exception as e:
+                    # Ссылка уже есть, повторная загрузка того же файла положит его на место
+                    current_app.logger.error("Error placing file %s in batch: %s", file_hash, e)
+                    result.update(status=FileService.STATUS_ERROR, error=str(e))
+        finally:
+            for _, tmp_path, _, _, _ in stored:
+                FileStorage.discard_temp_file(tmp_path)
+
+        current_app.logger.info("Batch of %s files uploaded by user %s", len(results), user.id)
+        return results
+
+    @staticmethod
+    def claim_file(user: User, file_hash: str, filename: Optional[str] = None) -> str:
+        """
+        Привязывает к пользователю уже имеющееся в хранилище содержимое по одному хэшу,
+        без передачи тела файла.
+
+        Скачивание по хэшу и так не требует авторизации, поэтому знание хэша
+        не даёт ничего сверх того, что уже доступно.
+
+        :param user: Пользователь, получающий файл
+        :param file_hash: Хэш файла
+        :param filename: Имя файла у пользователя
+        :return: STATUS_DEDUPLICATED
+        :raises FileNotFoundInStorageError: если такого содержимого в хранилище нет
+        :raises QuotaExceededError: если файл не помещается в квоту пользователя
+        """
+        blob = BlobRepository.get_live(file_hash)
+        if blob is None or not FileStorage.exists(file_hash):
+            current_app.logger.debug("Claim of unknown file %s by user %s", file_hash, user.id)
+            raise FileNotFoundInStorageError()
+        return FileService.register_file(user, file_hash, blob.size, filename, blob.content_type, existing_only=True)
+
+    @staticmethod
+    def _link_file(user: User, file_hash: str, size: int, filename: Optional[str] = None,
+                   content_type: str = DEFAULT_CONTENT_TYPE, existing_only: bool = False) -> str:
+        """
+        Добавляет в текущую транзакцию запись о владении, увеличивает счётчик ссылок
+        и счётчики использования владельца. Файл, который у владельца уже есть,
+        квоту повторно не расходует.
+
+        :param user: Владелец файла
+        :param file_hash: Хэш файла
+        :param size: Размер содержимого в байтах
+        :param filename: Имя файла у владельца
+        :param content_type: MIME-тип, сохраняется, если содержимое новое
+        :param existing_only: Не создавать запись о содержимом, см. register_file
+        :return: STATUS_CREATED, если содержимое новое, иначе STATUS_DEDUPLICATED
+        :raises QuotaExceededError: если файл не помещается в квоту (транзакция не изменена)
+        :raises FileNotFoundInStorageError: если при existing_only на содержимое не осталось ссылок
+            (транзакцию нужно откатить)
+        """
+        if FileRepository.get_by_hash_and_user(file_hash, user.id) is not None:
+            return FileService.STATUS_DEDUPLICATED
+        if not UserRepository.add_usage(user.id, size, current_app.config['USER_QUOTA_BYTES']):
+            raise QuotaExceededError()
+        if existing_only:
+            if not BlobRepository.add_reference(file_hash):
+                raise FileNotFoundInStorageError()
+            created = False
+        else:
+            created = BlobRepository.increment_refcount(file_hash, size, content_type)
+        db.session.add(File(hash=file_hash, user_id=user.id, filename=filename, created_at=utcnow()))
+        db.session.flush()
+        return FileService.STATUS_CREATED if created else FileService.STATUS_DEDUPLICATED
 
     @staticmethod
     def delete_file(user: User, file_hash: str) -> None:
         """
-        Удаляет файл у пользователя и, если файл больше не связан ни с кем,
-        удаляет его из хранилища.
+        Удаляет файл у пользователя. Если файл больше не связан ни с кем,
+        он ставится в очередь сборщика мусора, сам файл с диска здесь не удаляется,
+        но скачать его уже нельзя (см. get_blob).
 
         :param user: Пользователь, пытающийся удалить файл
         :param file_hash: Хэш файла для удаления
         :raises FileNotFoundInStorageError: если у пользователя нет файла с таким хэшем
         """
-        current_app.logger.debug(f"Deleting file with hash {file_hash} for user id: {user.id}")
+        current_app.logger.debug("Deleting file with hash %s for user id: %s", file_hash, user.id)
 
-        user_files = [f for f in FileRepository.get_by_hash(file_hash) if f.user_id == user.id]
-        if not user_files:
-            current_app.logger.warning(f"File {file_hash} not found for user {user.id}")
+        user_file = FileRepository.get_by_hash_and_user(file_hash, user.id)
+        if user_file is None:
+            current_app.logger.warning("File %s not found for user %s", file_hash, user.id)
             raise FileNotFoundInStorageError()
 
-        for file in user_files:
-            db.session.delete(file)
+        released = FileService._unlink_file(user_file)
         db.session.commit()
-        current_app.logger.info(f"Deleted file records {file_hash} for user {user.id}")
+        current_app.logger.info("Deleted file records %s for user %s", file_hash, user.id)
+        if released:
+            current_app.logger.info("No more references to file %s, queued for garbage collection", file_hash)
+
+    @staticmethod
+    def delete_files(user: User, file_hashes: List[str]) -> List[Dict[str, Any]]:
+        """
+        Удаляет пачку файлов пользователя одной транзакцией.
 
-        if FileRepository.count_by_hash(file_hash) == 0:
-            current_app.logger.info(f"No more references to file {file_hash}, deleting from storage")
-            FileStorage.delete_file(file_hash)
+        :param user: Пользователь, удаляющий файлы
+        :param file_hashes: Хэши файлов для удаления
+        :return: Результаты по каждому хэшу: hash, status (deleted/not_found)
+        """
+        results: List[Dict[str, Any]] = []
+        for file_hash in dict.fromkeys(file_hashes):
+            user_file = FileRepository.get_by_hash_and_user(file_hash, user.id)
+            if user_file is None:
+                results.append({'hash': file_hash, 'status': FileService.STATUS_NOT_FOUND})
+                continue
+            FileService._unlink_file(user_file)
+            results.append({'hash': file_hash, 'status': FileService.STATUS_DELETED})
+        db.session.commit()
+        current_app.logger.info("Batch of %s files deleted by user %s", len(results), user.id)
+        return results
+
+    @staticmethod
+    def _unlink_file(user_file: File) -> bool:
+        """
+        Добавляет в текущую транзакцию удаление записи о владении и уменьшает счётчик ссылок.
+        Содержимое без ссылок ставится в очередь сборщика мусора и убирается из кэша процесса.
+
+        :param user_file: Запись о владении
+        :return: True, если на содержимое больше никто не ссылается
+        """
+        file_hash = user_file.hash
+        UserRepository.remove_usage(user_file.user_id, BlobRepository.get(file_hash).size)
+        db.session.delete(user_file)
+        remaining = BlobRepository.decrement_refcount(file_hash)
+        if remaining <= 0:
+            BlobRepository.queue_for_gc(file_hash, utcnow())
+            blob_cache.invalidate(file_hash)
+        return remaining <= 0
 
     @staticmethod
-    def get_file_path(file_hash: str) -> str:
+    def list_files(user: User, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Возвращает страницу файлов пользователя в порядке добавления.
+
+        Курсор — позиция после последнего отданного файла. Его же можно сохранить
+        и позже передать как since, чтобы получить только файлы, добавленные с тех пор.
+
+        :param user: Владелец файлов
+        :param cursor: Курсор предыдущей страницы или None для первой
+        :param limit: Размер страницы (по умолчанию FILES_PAGE_SIZE, не больше FILES_MAX_PAGE_SIZE)
+        :return: files (hash, filename, size, content_type), next_cursor и has_more
+        :raises InvalidRequestError: если курсор или размер страницы некорректны
+        """
+        if limit is None:
+            limit = current_app.config['FILES_PAGE_SIZE']
+        if not 1 <= limit <= current_app.config['FILES_MAX_PAGE_SIZE']:
+            raise InvalidRequestError(f"limit must be between 1 and {current_app.config['FILES_MAX_PAGE_SIZE']}")
+        after_id = 0
+        if cursor:
+            if not cursor.isdigit():
+                raise InvalidRequestError("Invalid cursor")
+            after_id = int(cursor)
+
+        rows = FileRepository.get_page(user.id, after_id, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            after_id = rows[-1][0].id
+        return {
+            'files': [
+                {'hash': user_file.hash, 'filename': user_file.filename, 'size': size, 'content_type': content_type}
+                for user_file, size, content_type in rows
+            ],
+            'next_cursor': str(after_id),
+            'has_more': has_more,
+        }
+
+    @staticmethod
+    def describe_upload(filename: Optional[str], content_type: Optional[str]) -> Tuple[Optional[str], str]:
+        """
+        Приводит имя файла и MIME-тип загрузки из заголовков запроса к виду для БД.
+
+        Тип, заявленный клиентом, важнее угаданного по расширению имени;
+        application/octet-stream клиенты часто шлют по умолчанию, поэтому он тип не задаёт.
+
+        :param filename: Имя файла от клиента (может содержать путь)
+        :param content_type: MIME-тип от клиента, без параметров
+        :return: Кортеж (имя файла без пути или None, MIME-тип)
         """
-        Возвращает путь к файлу в локальном хранилище.
+        filename = os.path.basename((filename or '').replace('\\', '/'))[:255] or None
+        if not content_type or content_type == DEFAULT_CONTENT_TYPE:
+            content_type = (filename and mimetypes.guess_type(filename)[0]) or DEFAULT_CONTENT_TYPE
+        return filename, content_type[:255]
 
+    @staticmethod
+    def get_metadata(user: User, file_hash: str) -> Dict[str, Any]:
+        """
+        Возвращает сведения о файле пользователя только из БД, не обращаясь к хранилищу.
+
+        :param user: Владелец файла
         :param file_hash: Хэш файла
-        :return: Абсолютный путь к файлу
+        :return: hash, filename, size, content_type, created_at
+        :raises FileNotFoundInStorageError: если у пользователя нет файла с таким хэшем
+        """
+        row = FileRepository.get_with_blob(file_hash, user.id)
+        if row is None:
+            raise FileNotFoundInStorageError()
+        user_file, blob = row
+        return {
+            'hash': user_file.hash,
+            'filename': user_file.filename,
+            'size': blob.size,
+            'content_type': blob.content_type,
+            'created_at': user_file.created_at.isoformat() + 'Z' if user_file.created_at else None,
+        }
+
+    @staticmethod
+    def get_usage(user: User) -> Dict[str, Any]:
+        """
+        Возвращает счётчики использования хранилища пользователем: одна строка БД, без обхода файлов.
+
+        :param user: Пользователь
+        :return: used_bytes, file_count, quota_bytes (None — без ограничения)
         """
-        path = FileStorage.get_file_path(file_hash)
-        current_app.logger.debug(f"Getting file path for hash {file_hash}: {path}")
-        return path
+        record = UserRepository.get(user.id)
+        return {
+            'used_bytes': record.used_bytes,
+            'file_count': record.file_count,
+            'quota_bytes': FileService._effective_quota(record),
+        }
 
+    @staticmethod
+    def _effective_quota(record: User) -> Optional[int]:
+        """
+        Квота пользователя: своя или USER_QUOTA_BYTES, None — без ограничения.
+        """
+        quota = record.quota_bytes if record.quota_bytes is not None else current_app.config['USER_QUOTA_BYTES']
+        return quota or None
+
+    @staticmethod
+    def get_usage_report() -> List[Dict[str, Any]]:
+        """
+        Отчёт об использовании хранилища всеми пользователями по счётчикам, без обхода файлов.
+
+        :return: username, used_bytes, file_count, quota_bytes по убыванию used_bytes
+        """
+        return [
+            {
+                'username': record.username,
+                'used_bytes': record.used_bytes,
+                'file_count': record.file_count,
+                'quota_bytes': FileService._effective_quota(record),
+            }
+            for record in UserRepository.get_usage_report()
+        ]
+
+    @staticmethod
+    def recount_usage() -> int:
+        """
+        Пересчитывает счётчики использования всех пользователей по записям о владении.
+
+        :return: Количество пользователей, у которых счётчики разошлись с записями
+        """
+        changed = UserRepository.recount_usage()
+        db.session.commit()
+        current_app.logger.info("Usage counters recounted, %s users corrected", changed)
+        return changed
+
+    @staticmethod
+    def check_quota(user: User, size: int) -> None:
+        """
+        Заранее проверяет, поместится ли файл такого размера в квоту, до приёма его байт.
+        Окончательная проверка — при регистрации файла, см. UserRepository.add_usage.
+
+        :param user: Пользователь
+        :param size: Размер будущего файла в байтах
+        :raises QuotaExceededError: если файл не помещается в квоту
+        """
+        usage = FileService.get_usage(user)
+        if usage['quota_bytes'] is not None and usage['used_bytes'] + size > usage['quota_bytes']:
+            raise QuotaExceededError()
+
+    @staticmethod
+    def get_blob(file_hash: str) -> Optional[Blob]:
+        """
+        Возвращает запись о содержимом из БД без обращения к диску.
+
+        :param file_hash: Хэш файла
+        :return: Blob или None, если такого содержимого нет или все ссылки на него удалены
+            (файл ждёт сборщика мусора)
+        """
+        blob = BlobRepository.get_live(file_hash)
+        if blob is None:
+            # Содержимое могли удалить в другом процессе: его копия в кэше этого процесса больше не нужна
+            blob_cache.invalidate(file_hash)
+        return blob
+
+    @staticmethod
+    def get_file_path(file_hash: str, encodings: Collection[str] = ()) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Возвращает путь к файлу в локальном хранилище, который можно отдать клиенту как есть.
+
+        :param file_hash: Хэш файла
+        :param encodings: Кодеки, которые принимает клиент (Accept-Encoding)
+        :return: Кортеж (абсолютный путь, Content-Encoding или None) или None, если целого файла
+            нет (движок 'chunked') либо он сжат кодеком, который клиент не принимает
+        :raises FileNotFoundInStorageError: если файла нет в хранилище
+        """
+        if FileStorage.is_chunked():
+            if not FileStorage.exists(file_hash):
+                raise FileNotFoundInStorageError()
+            return None
+        located = FileStorage.locate_file(file_hash)
+        if located is None:
+            raise FileNotFoundInStorageError()
+        path, encoding = located
+        if encoding is not None and encoding not in encodings:
+            return None
+        current_app.logger.debug("Getting file path for hash %s: %s", file_hash, path)
+        return os.path.abspath(path), encoding
+
+    @staticmethod
+    def get_offload(file_hash: str, encodings: Collection[str] = ()) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        Готовит отдачу файла фронтовым прокси (DOWNLOAD_OFFLOAD): Python не читает и не шлёт байты.
+
+        :param file_hash: Хэш файла
+        :param encodings: Кодеки, которые принимает клиент (Accept-Encoding)
+        :return: Кортеж (имя заголовка, значение, Content-Encoding или None) или None,
+            если передача выключена или файл отдаёт приложение (см. get_file_path)
+        :raises FileNotFoundInStorageError: если файла нет в хранилище или на него не осталось ссылок
+        """
+        if not DownloadOffload.enabled():
+            return None
+        if FileService.get_blob(file_hash) is None:
+            # Файл без ссылок лежит до сборки мусора, но отдавать его прокси уже нельзя
+            raise FileNotFoundInStorageError()
+        located = FileService.get_file_path(file_hash, encodings)
+        if located is None:
+            return None
+        path, encoding = located
+        header = DownloadOffload.get_header(path)
+        if header is None:
+            return None
+        return header[0], header[1], encoding
+
+    @staticmethod
+    def open_file(file_hash: str) -> Tuple[IO[bytes], int]:
+        """
+        Открывает файл из хранилища на чтение независимо от движка хранения.
+
+        Содержимое, на которое не осталось ссылок, не открывается, хотя файл ждёт сборщика мусора.
+
+        :param file_hash: Хэш файла
+        :return: Кортеж (поток с поддержкой seek, размер в байтах)
+        :raises FileNotFoundInStorageError: если файла нет в хранилище или на него не осталось ссылок
+        """
+        if FileService.get_blob(file_hash) is None:
+            raise FileNotFoundInStorageError()
+        return FileService._open_decoded(file_hash)
+
+    @staticmethod
+    def _open_decoded(file_hash: str) -> Tuple[IO[bytes], int]:
+        """
+        Открывает файл с распаковкой, без проверки ссылок (её уже сделал вызывающий).
+        """
+        size = FileStorage.get_size(file_hash)
+        return FileStorage.open_file(file_hash), size
+
+    @staticmethod
+    def open_encoded_file(file_hash: str, encodings: Collection[str] = ()) -> Tuple[IO[bytes], int, Optional[str]]:
+        """
+        Открывает файл для отдачи клиенту: сжатый файл отдаётся как есть,
+        если клиент принимает его кодек, иначе распаковывается на лету.
+        Наличие ссылок на содержимое проверяет вызывающий (get_blob).
+
+        :param file_hash: Хэш файла
+        :param encodings: Кодеки, которые принимает клиент (Accept-Encoding)
+        :return: Кортеж (поток с поддержкой seek, размер отдаваемых байт, Content-Encoding или None)
+        :raises FileNotFoundInStorageError: если файла нет в хранилище
+        """
+        if FileStorage.get_encoding(file_hash) in encodings:
+            return FileStorage.open_stored_file(file_hash)
+        stream, size = FileService._open_decoded(file_hash)
+        return stream, size, None
+
+    @staticmethod
+    def check_archive_hashes(file_hashes: Any) -> List[str]:
+        """
+        Проверяет список хэшей для архива и убирает повторы, сохраняя порядок.
+
+        :param file_hashes: Список из запроса или манифеста
+        :return: Уникальные хэши
+        :raises InvalidRequestError: если это не непустой список хэшей или он длиннее ARCHIVE_MAX_ITEMS
+        """
+        if not isinstance(file_hashes, list) or not file_hashes \
+                or not all(isinstance(h, str) and FileHasher.is_valid_hash(h) for h in file_hashes):
+            raise InvalidRequestError("hashes must be a non-empty list of SHA-256 hex strings")
+        max_items = current_app.config['ARCHIVE_MAX_ITEMS']
+        if len(file_hashes) > max_items:
+            raise InvalidRequestError(f"Too many hashes, max {max_items}")
+        return list(dict.fromkeys(file_hashes))
+
+    @staticmethod
+    def read_archive_manifest(manifest_hash: str) -> List[str]:
+        """
+        Читает сохранённый манифест архива: загруженный ранее файл со списком хэшей
+        (JSON-массив, JSON {"hashes": [...]} или по хэшу на строку).
+
+        :param manifest_hash: Хэш файла манифеста
+        :return: Уникальные хэши в порядке манифеста
+        :raises FileNotFoundInStorageError: если манифеста нет в хранилище
+        :raises InvalidRequestError: если манифест слишком велик или в нём не список хэшей
+        """
+        if not FileHasher.is_valid_hash(manifest_hash):
+            raise FileNotFoundInStorageError()
+        stream, size = FileService.open_file(manifest_hash)
+        with stream:
+            if size > current_app.config['ARCHIVE_MANIFEST_MAX_BYTES']:
+                raise InvalidRequestError("Manifest is too large")
+            data = stream.read()
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidRequestError("Manifest must be UTF-8 text")
+        try:
+            file_hashes = json.loads(text)
+        except ValueError:
+            file_hashes = text.split()
+        if isinstance(file_hashes, dict):
+            file_hashes = file_hashes.get('hashes')
+        return FileService.check_archive_hashes(file_hashes)
+
+    @staticmethod
+    def stream_archive(file_hashes: List[str], archive_format: str) -> Iterator[bytes]:
+        """
+        Собирает архив из файлов на лету: байты отдаются по мере чтения, без временных файлов,
+        в памяти — один блок чтения.
+
+        Члены называются хэшами. Файлы, которых нет, не прерывают архив: последним членом
+        идёт manifest.json с отданными файлами (hash, size) и списком missing.
+
+        :param file_hashes: Хэши файлов (см. check_archive_hashes)
+        :param archive_format: 'tar' или 'zip'
+        :return: Итератор по байтам архива
+        """
+        writer = ARCHIVE_WRITERS[archive_format]()
+        files: List[Dict[str, Any]] = []
+        missing: List[str] = []
+        for file_hash in file_hashes:
+            try:
+                stream, size = FileService.open_file(file_hash)
+            except FileNotFoundInStorageError:
+                missing.append(file_hash)
+                continue
+            finally:
+                db.session.rollback()  # Архив отдаётся долго, снимок БД между файлами не держим
+            with stream:
+                yield from writer.add(file_hash, stream, size)
+            files.append({'hash': file_hash, 'size': size})
+
+        manifest = json.dumps({'files': files, 'missing': missing}).encode('utf-8')
+        yield from writer.add(FileService.ARCHIVE_MANIFEST_NAME, io.BytesIO(manifest), len(manifest))
+        yield from writer.close()
+        if missing:
+            current_app.logger.warning("Archive of %s files sent, %s missing", len(file_hashes), len(missing))
+
+    @staticmethod
+    def get_cached_content(file_hash: str, encodings: Collection[str] = ()) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Возвращает содержимое файла из in-memory кэша без обращения к диску.
+        Кэш не знает об удалениях в других процессах: вызывать после проверки get_blob.
+
+        :param file_hash: Хэш файла
+        :param encodings: Кодеки, которые принимает клиент (Accept-Encoding)
+        :return: Кортеж (содержимое, Content-Encoding или None) или None, если файла в кэше нет
+        """
+        entry = blob_cache.get(file_hash)
+        if entry is None:
+            return None
+        return FileService._encode_for_client(entry.data, entry.encoding, encodings)
+
+    @staticmethod
+    def load_cacheable_content(file_hash: str, encodings: Collection[str] = ()) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Читает небольшой файл из хранилища и кладёт его в кэш в хранимом (возможно, сжатом) виде.
+
+        В кэш попадает только файл, исходный размер которого укладывается в BLOB_CACHE_MAX_OBJECT_BYTES:
+        клиенту без gzip кэшированные байты распаковываются в память, и хорошо сжатый большой файл
+        иначе разворачивался бы целиком на каждый запрос.
+
+        :param file_hash: Хэш файла
+        :param encodings: Кодеки, которые принимает клиент (Accept-Encoding)
+        :return: Кортеж (содержимое, Content-Encoding или None) или None, если файл слишком велик для кэша
+        :raises FileNotFoundInStorageError: если файла нет в хранилище
+        """
+        stream, size, encoding = FileStorage.open_stored_file(file_hash)
+        with stream:
+            if not blob_cache.accepts(size):
+                return None
+            if encoding is not None:
+                blob = BlobRepository.get(file_hash)
+                if blob is None:
+                    raise FileNotFoundInStorageError()
+                if not blob_cache.accepts(blob.size):
+                    return None
+            data = stream.read()
+        blob_cache.put(file_hash, data, encoding)
+        current_app.logger.debug("File %s cached in memory", file_hash)
+        return FileService._encode_for_client(data, encoding, encodings)
+
+    @staticmethod
+    def _encode_for_client(data: bytes, encoding: Optional[str],
+                           encodings: Collection[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        Отдаёт хранимые байты как есть, если клиент принимает их кодек, иначе распаковывает.
+        """
+        if encoding is None or encoding in encodings:
+            return data, encoding
+        return BlobCompressor.decode(data, encoding), None
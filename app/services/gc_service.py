@@ -0,0 +1,137 @@
+import os
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+from flask import current_app
+
+from app import db
+from app.exceptions.custom_exceptions import FileNotFoundInStorageError
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.chunk_repository import ChunkRepository
+from app.utils.chunk_storage import ChunkStore
+from app.utils.clock import utcnow
+from app.utils.storage import FileStorage
+from app.utils.volumes import StorageVolumes
+
+
+class GarbageCollectionService:
+    """
+    Отложенная сборка мусора: удаление содержимого без ссылок и сверка диска с БД.
+
+    Удаление файла пользователем только уменьшает счётчик ссылок и ставит содержимое
+    в очередь. Сборщик пачками перепроверяет счётчики и удаляет то, что пролежало
+    без ссылок дольше GC_GRACE_SECONDS. Файл удаляется до коммита удаления записи,
+    а загрузки коммитят ссылку до того, как кладут файл на место, поэтому
+    параллельная загрузка того же содержимого его не теряет.
+    """
+
+    _last_reconcile: Optional[float] = None  # Время последней сверки в фоновом сборщике этого процесса
+
+    @staticmethod
+    def run_scheduled() -> None:
+        """
+        Один запуск фонового сборщика: сборка мусора и, раз в GC_RECONCILE_INTERVAL_SECONDS, сверка.
+        """
+        GarbageCollectionService.collect()
+        interval = current_app.config['GC_RECONCILE_INTERVAL_SECONDS']
+        now = time.monotonic()
+        if GarbageCollectionService._last_reconcile is None:
+            # Первую сверку откладываем на интервал, чтобы рестарт не запускал обход всего диска
+            GarbageCollectionService._last_reconcile = now
+        elif interval > 0 and now - GarbageCollectionService._last_reconcile >= interval:
+            GarbageCollectionService.reconcile()
+            GarbageCollectionService._last_reconcile = now
+
+    @staticmethod
+    def collect(grace_seconds: Optional[int] = None) -> Dict[str, int]:
+        """
+        Удаляет содержимое из очереди, на которое так и не появилось ссылок.
+
+        :param grace_seconds: Сколько кандидат должен пролежать в очереди (по умолчанию GC_GRACE_SECONDS)
+        :return: Количество удалённого содержимого и кандидатов, которые снова используются
+        """
+        grace = current_app.config['GC_GRACE_SECONDS'] if grace_seconds is None else grace_seconds
+        queued_before = utcnow() - timedelta(seconds=grace)
+        stats = {'deleted': 0, 'revived': 0}
+        while candidates := BlobRepository.get_gc_candidates(queued_before, current_app.config['GC_BATCH_SIZE']):
+            for candidate in candidates:
+                file_hash = candidate.hash
+                BlobRepository.delete_gc_candidate(file_hash)
+                if not BlobRepository.delete_if_unreferenced(file_hash):
+                    stats['revived'] += 1
+                    continue
+                try:
+                    FileStorage.delete_file(file_hash)
+                except FileNotFoundInStorageError:
+                    current_app.logger.warning("GC: file %s was already missing from storage", file_hash)
+                stats['deleted'] += 1
+            db.session.commit()
+
+        if stats['deleted'] or stats['revived']:
+            current_app.logger.info("GC: deleted %s blobs, %s revived", stats['deleted'], stats['revived'])
+        return stats
+
+    @staticmethod
+    def reconcile(grace_seconds: Optional[int] = None) -> Dict[str, int]:
+        """
+        Сверяет хранилище с БД.
+
+        - содержимое с нулевым счётчиком, которого нет в очереди, ставится в очередь;
+        - файлы и куски без записей в БД старше grace period удаляются;
+        - брошенные временные файлы старше grace period удаляются;
+        - записи со ссылками, для которых нет файла, только логируются: восстановить их нечем.
+
+        :param grace_seconds: Минимальный возраст файла-сироты (по умолчанию GC_GRACE_SECONDS)
+        :return: Счётчики по каждому виду расхождений
+        """
+        grace = current_app.config['GC_GRACE_SECONDS'] if grace_seconds is None else grace_seconds
+        older_than = time.time() - grace
+        stats = {'queued': 0, 'orphan_files': 0, 'orphan_chunks': 0, 'temp_files': 0, 'missing_files': 0}
+
+        stats['queued'] = BlobRepository.queue_unreferenced(utcnow())
+        db.session.commit()
+
+        for path, file_hash, _ in FileStorage.iter_stored_files():
+            if BlobRepository.get(file_hash) is None and GarbageCollectionService._remove_if_older(path, older_than):
+                current_app.logger.warning("GC: removed orphan file %s", path)
+                stats['orphan_files'] += 1
+
+        if FileStorage.is_chunked():
+            while orphans := ChunkRepository.get_orphan_manifests(current_app.config['GC_BATCH_SIZE']):
+                for blob_hash in orphans:
+                    if BlobRepository.get(blob_hash) is None:
+                        ChunkStore.delete(blob_hash)
+                db.session.commit()
+                stats['orphan_files'] += len(orphans)
+            for volume, _ in StorageVolumes.get_volumes():
+                for path, chunk_hash in ChunkStore.iter_chunk_files(volume):
+                    if ChunkRepository.get_chunk(chunk_hash) is None \
+                            and GarbageCollectionService._remove_if_older(path, older_than):
+                        stats['orphan_chunks'] += 1
+
+        for path in FileStorage.iter_temp_files():
+            if GarbageCollectionService._remove_if_older(path, older_than):
+                stats['temp_files'] += 1
+
+        after = ''
+        while blobs := BlobRepository.get_page(after, current_app.config['GC_BATCH_SIZE']):
+            for blob in blobs:
+                if blob.refcount > 0 and not FileStorage.exists(blob.hash):
+                    current_app.logger.error("GC: blob %s is referenced but missing from storage", blob.hash)
+                    stats['missing_files'] += 1
+            after = blobs[-1].hash
+            db.session.expunge_all()
+
+        current_app.logger.info("GC reconcile: %s", stats)
+        return stats
+
+    @staticmethod
+    def _remove_if_older(path: str, older_than: float) -> bool:
+        try:
+            if os.path.getmtime(path) > older_than:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
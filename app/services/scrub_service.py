@@ -0,0 +1,314 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app import db
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.chunk_repository import ChunkRepository
+from app.utils.chunk_storage import ChunkStore
+from app.utils.clock import utcnow
+from app.utils.compression import BlobCompressor
+from app.utils.hashing import FileHasher
+from app.utils.storage import FileStorage
+from app.utils.throttle import IoThrottle
+from app.utils.volumes import StorageVolumes
+
+# Объект на диске: (вид, путь, ожидаемый хэш, позиция обхода, сжат ли файл)
+ScrubItem = Tuple[str, str, str, Tuple[str, str], bool]
+
+
+class ScrubCheckpoint:
+    """
+    Прогресс проверки в файле SCRUB_CHECKPOINT_PATH: позиции обхода и накопленные счётчики.
+
+    Позиция сдвигается только за объектом, перед которым всё уже проверено, поэтому
+    после прерывания проверка продолжается без пропусков (последние объекты могут быть проверены повторно).
+    """
+
+    def __init__(self, path: str, state: Dict[str, Any], save_interval: float) -> None:
+        self.path = path
+        self.state = state
+        self.save_interval = save_interval
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Запись файла — по одной, чтобы старый снимок не затёр новый
+
+    @staticmethod
+    def load(path: str, save_interval: float, restart: bool = False) -> 'ScrubCheckpoint':
+        """
+        Читает сохранённый прогресс или начинает новую проверку.
+
+        :param path: Путь к файлу прогресса
+        :param save_interval: Как часто сохранять прогресс, в секундах
+        :param restart: Не продолжать сохранённую проверку
+        :return: Прогресс проверки
+        """
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                return ScrubCheckpoint(path, json.load(f), save_interval)
+        state = {'started_at': utcnow().isoformat(), 'positions': {}, 'stats': dict.fromkeys(ScrubService.STATS, 0)}
+        return ScrubCheckpoint(path, state, save_interval)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Счётчики с начала проверки, включая прерванные запуски."""
+        with self._lock:
+            return dict(self.state['stats'])
+
+    def position(self, key: str) -> Optional[List[str]]:
+        """
+        Возвращает позицию, после которой продолжить обход.
+
+        :param key: Что обходится: том с видом объектов или таблица БД
+        :return: Позиция или None, если обход не начинался
+        """
+        with self._lock:
+            return self.state['positions'].get(key)
+
+    def advance(self, key: str, position: List[str], **counts: int) -> None:
+        """
+        Отмечает, что всё до position включительно проверено, и добавляет счётчики.
+
+        :param key: Что обходится
+        :param position: Последний проверенный объект
+        :param counts: Приращения счётчиков
+        """
+        with self._lock:
+            self.state['positions'][key] = list(position)
+            for name, value in counts.items():
+                self.state['stats'][name] += value
+
+    def save(self, force: bool = False) -> None:
+        """
+        Атомарно сохраняет прогресс, но не чаще раза в save_interval.
+
+        :param force: Сохранить сразу
+        """
+        with self._save_lock:
+            with self._lock:
+                now = time.monotonic()
+                if not force and now - self._saved_at < self.save_interval:
+                    return
+                self._saved_at = now
+                payload = json.dumps(self.state)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def remove(self) -> None:
+        """
+        Удаляет файл прогресса после полного прохода.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ScrubService:
+    """
+    Проверка целостности хранилища (flask scrub).
+
+    Каждый файл и кусок на дисках перечитывается: SHA-256 содержимого (у сжатых — распакованного)
+    должен совпадать с именем, а в БД должна быть запись о нём. Затем по БД ищется содержимое,
+    на которое есть ссылки, но нет файла. Тома обходятся параллельно, у каждого свой пул потоков
+    чтения и свой лимит скорости, чтобы проверка не мешала живому узлу.
+    Найденное пишется в лог; с quarantine повреждённые файлы и файлы без записей
+    переносятся в <том>/.quarantine с сохранением пути.
+    """
+
+    QUARANTINE_DIR: str = '.quarantine'
+    FILES: str = 'files'
+    CHUNKS: str = 'chunks'
+    STATS: Tuple[str, ...] = ('scanned', 'bytes', 'corrupt', 'unreferenced', 'missing', 'quarantined')
+
+    @staticmethod
+    def scrub(workers_per_volume: Optional[int] = None, bytes_per_second: Optional[int] = None,
+              quarantine: bool = False, restart: bool = False) -> Dict[str, int]:
+        """
+        Проверяет хранилище, продолжая прерванную проверку из SCRUB_CHECKPOINT_PATH.
+
+        При прерывании (Ctrl+C) потоки дочитывают начатые файлы, прогресс сохраняется,
+        исключение пробрасывается дальше.
+
+        :param workers_per_volume: Потоков чтения на том (по умолчанию SCRUB_WORKERS_PER_VOLUME)
+        :param bytes_per_second: Лимит чтения на том, 0 — без лимита (по умолчанию SCRUB_MAX_BYTES_PER_SECOND)
+        :param quarantine: Переносить повреждённые файлы и файлы без записей в карантин
+        :param restart: Начать проверку заново
+        :return: Счётчики с начала проверки
+        """
+        config = current_app.config
+        workers = workers_per_volume or config['SCRUB_WORKERS_PER_VOLUME']
+        rate = config['SCRUB_MAX_BYTES_PER_SECOND'] if bytes_per_second is None else bytes_per_second
+        checkpoint = ScrubCheckpoint.load(config['SCRUB_CHECKPOINT_PATH'], config['SCRUB_CHECKPOINT_SECONDS'], restart)
+        if checkpoint.state['positions']:
+            current_app.logger.info("Scrub: resuming check started at %s", checkpoint.state['started_at'])
+
+        app = current_app._get_current_object()
+        volumes = [path for path, _ in StorageVolumes.get_volumes()]
+        stop = threading.Event()
+        try:
+            with ThreadPoolExecutor(max_workers=len(volumes), thread_name_prefix='scrub') as pool:
+                futures = [
+                    pool.submit(ScrubService._scrub_volume, app, volume, workers, IoThrottle(rate), quarantine,
+                                checkpoint, stop)
+                    for volume in volumes
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    stop.set()
+                    raise
+            ScrubService._find_missing(checkpoint)
+        finally:
+            checkpoint.save(force=True)
+        checkpoint.remove()
+        stats = checkpoint.stats
+        current_app.logger.info("Scrub finished: %s", stats)
+        return stats
+
+    @staticmethod
+    def _scrub_volume(app: Flask, volume: str, workers: int, throttle: IoThrottle, quarantine: bool,
+                      checkpoint: ScrubCheckpoint, stop: threading.Event) -> None:
+        """
+        Обходит том по порядку, хэширует объекты в пуле потоков и разбирает результаты в том же порядке.
+        """
+        with app.app_context():
+            grace_before = time.time() - app.config['GC_GRACE_SECONDS']
+            window: Deque[Tuple[ScrubItem, Future]] = deque()
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scrub-read') as pool:
+                for item in ScrubService._iter_volume(volume, checkpoint):
+                    if stop.is_set():
+                        break
+                    window.append((item, pool.submit(ScrubService._hash_object, item[1], item[4], throttle)))
+                    if len(window) >= workers * 2:
+                        ScrubService._check(volume, *window.popleft(), quarantine, grace_before, checkpoint)
+                while window:
+                    item, future = window.popleft()
+                    if stop.is_set() and future.cancel():
+                        break  # Позиция не сдвигается дальше непрочитанного объекта
+                    ScrubService._check(volume, item, future, quarantine, grace_before, checkpoint)
+                for _, future in window:
+                    future.cancel()
+
+    @staticmethod
+    def _iter_volume(volume: str, checkpoint: ScrubCheckpoint) -> Iterator[ScrubItem]:
+        """
+        Перечисляет файлы и куски тома после сохранённых позиций.
+        """
+        after = checkpoint.position(f"{ScrubService.FILES}:{volume}")
+        for path, file_hash, position in FileStorage.iter_volume_files(volume, tuple(after) if after else None):
+            yield ScrubService.FILES, path, file_hash, position, position[1] != file_hash
+        after = checkpoint.position(f"{ScrubService.CHUNKS}:{volume}")
+        for path, chunk_hash in ChunkStore.iter_chunk_files(volume, tuple(after) if after else None):
+            yield ScrubService.CHUNKS, path, chunk_hash, (chunk_hash[:2], chunk_hash), False
+
+    @staticmethod
+    def _hash_object(path: str, compressed: bool, throttle: IoThrottle) -> Tuple[str, int]:
+        """
+        Хэширует содержимое файла в потоке чтения с учётом лимита скорости.
+        """
+        with BlobCompressor.open_decoded(path) if compressed else open(path, 'rb') as f:
+            return FileHasher.hash_stream(f, throttle.consume)
+
+    @staticmethod
+    def _check(volume: str, item: ScrubItem, future: Future, quarantine: bool, grace_before: float,
+               checkpoint: ScrubCheckpoint) -> None:
+        """
+        Сверяет хэш объекта с именем и БД, сдвигает позицию обхода.
+        """
+        kind, path, expected_hash, position, _ = item
+        key = f"{kind}:{volume}"
+        try:
+            actual_hash, size = future.result()
+        except FileNotFoundError:
+            # Удалён сборщиком мусора или перенесён ребалансировкой, пока ждал очереди
+            checkpoint.advance(key, list(position))
+            return
+        except (OSError, EOFError, zlib.error) as e:
+            current_app.logger.error("Scrub: failed to read %s: %s", path, e)
+            actual_hash, size = None, 0
+
+        counts = {'scanned': 1, 'bytes': size}
+        if actual_hash != expected_hash:
+            current_app.logger.error("Scrub: %s is corrupt, content hash %s", path, actual_hash or 'unreadable')
+            counts['corrupt'] = 1
+        elif not ScrubService._is_referenced(kind, expected_hash) and ScrubService._is_older(path, grace_before):
+            current_app.logger.warning("Scrub: %s has no record in the database", path)
+            counts['unreferenced'] = 1
+        damaged = 'corrupt' in counts or 'unreferenced' in counts
+        if quarantine and damaged and ScrubService._quarantine(volume, path):
+            counts['quarantined'] = 1
+        checkpoint.advance(key, list(position), **counts)
+        checkpoint.save()
+
+    @staticmethod
+    def _is_referenced(kind: str, object_hash: str) -> bool:
+        try:
+            if kind == ScrubService.CHUNKS:
+                return ChunkRepository.get_chunk(object_hash) is not None
+            return BlobRepository.get(object_hash) is not None
+        finally:
+            db.session.rollback()  # Не держим снимок БД открытым всю проверку
+
+    @staticmethod
+    def _is_older(path: str, before: float) -> bool:
+        try:
+            return os.path.getmtime(path) <= before
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _quarantine(volume: str, path: str) -> bool:
+        """
+        Переносит файл в карантин тома с сохранением относительного пути.
+        """
+        target = os.path.join(volume, ScrubService.QUARANTINE_DIR, os.path.relpath(path, volume))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            return False
+        current_app.logger.warning("Scrub: %s moved to quarantine", path)
+        return True
+
+    @staticmethod
+    def _find_missing(checkpoint: ScrubCheckpoint) -> None:
+        """
+        Ищет содержимое и куски, на которые есть ссылки в БД, но нет файла ни на одном томе.
+        """
+        batch_size = current_app.config['GC_BATCH_SIZE']
+        after = (checkpoint.position('db:blobs') or [''])[0]
+        while blobs := BlobRepository.get_page(after, batch_size):
+            missing = [blob.hash for blob in blobs if blob.refcount > 0 and not FileStorage.exists(blob.hash)]
+            for file_hash in missing:
+                current_app.logger.error("Scrub: blob %s is referenced but missing from storage", file_hash)
+            after = blobs[-1].hash
+            db.session.rollback()
+            checkpoint.advance('db:blobs', [after], missing=len(missing))
+            checkpoint.save()
+
+        after = (checkpoint.position('db:chunks') or [''])[0]
+        while chunks := ChunkRepository.get_chunk_page(after, batch_size):
+            missing = [chunk.hash for chunk in chunks if ChunkStore.find_chunk_path(chunk.hash) is None]
+            for chunk_hash in missing:
+                current_app.logger.error("Scrub: chunk %s is referenced but missing from storage", chunk_hash)
+            after = chunks[-1].hash
+            db.session.rollback()
+            checkpoint.advance('db:chunks', [after], missing=len(missing))
+            checkpoint.save()
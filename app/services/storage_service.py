@@ -0,0 +1,100 @@
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+
+from app.extensions import db
+from app.repositories.blob_repository import BlobRepository
+from app.utils.storage import FileStorage
+from app.utils.volumes import StorageVolumes
+
+
+class StorageService:
+    """
+    Сервис обслуживания хранилища: перенос файлов между томами (полный обход и очередь
+    свежих загрузок) и сводка для метрик.
+    """
+
+    _stats: Optional[Tuple[float, Dict[str, int]]] = None  # Последняя сводка этого процесса и время её подсчёта
+
+    @staticmethod
+    def rebalance(dry_run: bool = False) -> Dict[str, int]:
+        """
+        Переносит файлы и куски на тома, которые им назначены текущей конфигурацией STORAGE_VOLUMES.
+
+        Работает на живом хранилище: файл сначала появляется на новом томе,
+        потом удаляется со старого, а читатели ищут его на всех томах.
+
+        :param dry_run: Только посчитать, ничего не переносить
+        :return: Количество перенесённых объектов и байт
+        """
+        stats = {'moved': 0, 'bytes': 0}
+        for source, target in FileStorage.iter_misplaced():
+            StorageService._move(source, target, dry_run, stats)
+
+        current_app.logger.info(
+            "Rebalance %s: %s objects, %s bytes", 'planned' if dry_run else 'finished', stats['moved'], stats['bytes']
+        )
+        return stats
+
+    @staticmethod
+    def relocate_queued() -> Dict[str, int]:
+        """
+        Переносит на свои тома файлы из очереди BlobRelocation — загрузки, оставшиеся на томе,
+        куда их записали до того, как стал известен хэш (см. FileStorage.place_temp_file).
+
+        Файл сравнивается с томами его текущего уровня: перенос между уровнями — дело TieringService.
+
+        :return: Количество перенесённых файлов и байт
+        """
+        stats = {'moved': 0, 'bytes': 0}
+        batch_size = current_app.config['RELOCATE_BATCH_SIZE']
+        while queued := BlobRepository.get_relocations(batch_size):
+            for file_hash in queued:
+                located = FileStorage.locate_file(file_hash)
+                if located is not None:
+                    source, encoding = located
+                    tier = StorageVolumes.get_tier_of(os.path.dirname(os.path.dirname(source)))
+                    target = FileStorage.get_file_path(file_hash, encoding, StorageVolumes.locate(file_hash, tier))
+                    if target != source:
+                        StorageService._move(source, target, False, stats)
+                BlobRepository.delete_relocation(file_hash)
+            db.session.commit()
+        if stats['moved']:
+            current_app.logger.info("Relocated %s queued files, %s bytes", stats['moved'], stats['bytes'])
+        return stats
+
+    @staticmethod
+    def _move(source: str, target: str, dry_run: bool, stats: Dict[str, int]) -> None:
+        try:
+            size = os.path.getsize(source)
+            if not dry_run:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                FileStorage.move_file(source, target)
+        except FileNotFoundError:
+            # Файл удалили, пока шёл перенос
+            return
+        stats['moved'] += 1
+        stats['bytes'] += size
+        current_app.logger.debug("Rebalance: %s -> %s", source, target)
+
+    @staticmethod
+    def get_stats(max_age: float = 0) -> Dict[str, int]:
+        """
+        Сводка по хранилищу из БД, без обхода диска.
+
+        get_totals проходит всю таблицу Blob, поэтому частые вызовы (/metrics) переиспользуют
+        сводку, посчитанную этим процессом не раньше max_age секунд назад.
+
+        :param max_age: Сколько секунд сводка считается свежей, 0 — всегда считать заново
+        :return: Количество содержимого, его исходный размер в байтах и длина очереди сборщика мусора
+        """
+        now = time.monotonic()
+        cached = StorageService._stats
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
+        blobs, stored_bytes, gc_queue = BlobRepository.get_totals()
+        stats = {'blobs': blobs, 'stored_bytes': stored_bytes, 'gc_queue': gc_queue}
+        StorageService._stats = (now, stats)
+        return stats
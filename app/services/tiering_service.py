@@ -0,0 +1,273 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app
+
+from app.extensions import access_tracker, db, metrics
+from app.models.blob import Blob
+from app.repositories.blob_repository import BlobRepository
+from app.utils.clock import utcnow
+from app.utils.storage import FileStorage
+from app.utils.throttle import IoThrottle
+from app.utils.volumes import StorageVolumes
+
+
+class TieringService:
+    """
+    Перенос файлов между уровнями хранилища STORAGE_TIERS (flask migrate-tiers и фоновая задача).
+
+    Файл, который не скачивали дольше TIER_DEMOTE_AFTER_SECONDS * (i + 1), переезжает с уровня i
+    на следующий; пока диски первого уровня заполнены больше TIER_HOT_MAX_USAGE, вниз уходят
+    и более свежие файлы, начиная с давно не читанных. Файл, который на нижнем уровне скачали
+    TIER_PROMOTE_HITS раз за окно учёта, возвращается на первый уровень.
+
+    Перенос не прячет файл от читателей: копия атомарно появляется на новом уровне,
+    в БД отмечается уровень, и только через TIER_UNLINK_GRACE_SECONDS удаляется старая копия,
+    так что уже найденный путь (в том числе отданный прокси) успевают открыть.
+    Удаление сборщиком мусора во время переноса убирает обе копии: он ищет файл на всех уровнях.
+    Переносятся только файлы движка 'file', куски движка 'chunked' остаются на первом уровне.
+    """
+
+    PROMOTE: str = 'promote'
+    DEMOTE: str = 'demote'
+    STATS: Dict[str, str] = {PROMOTE: 'promoted', DEMOTE: 'demoted'}
+
+    @staticmethod
+    def flush_access() -> None:
+        """
+        Записывает в БД скачивания, накопленные процессом в access_tracker.
+        """
+        counts = access_tracker.drain()
+        if not counts:
+            return
+        now = utcnow()
+        window_start = now - timedelta(seconds=current_app.config['TIER_DEMOTE_AFTER_SECONDS'])
+        BlobRepository.record_access(counts, now, window_start)
+        db.session.commit()
+
+    @staticmethod
+    def migrate(dry_run: bool = False, bytes_per_second: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Переносит файлы между уровнями по давности и частоте скачиваний.
+
+        Уровни обходятся снизу вверх, чтобы файл за один запуск не копировался дважды;
+        повышение пропускается, пока первый уровень переполнен.
+
+        :param dry_run: Только посчитать, ничего не переносить
+        :param bytes_per_second: Лимит копирования, 0 — без лимита (по умолчанию TIER_MAX_BYTES_PER_SECOND)
+        :return: Количество повышенных и пониженных файлов, скопированных байт, ошибок, длительность и скорость
+        """
+        config = current_app.config
+        stats: Dict[str, Any] = {'promoted': 0, 'demoted': 0, 'bytes': 0, 'failed': 0}
+        tiers = StorageVolumes.get_tier_names()
+        if len(tiers) < 2 or FileStorage.is_chunked():
+            current_app.logger.debug("Tier migration skipped: single tier or chunked engine")
+            return stats
+
+        rate = config['TIER_MAX_BYTES_PER_SECOND'] if bytes_per_second is None else bytes_per_second
+        throttle = IoThrottle(rate)
+        batch_size = config['TIER_MIGRATION_BATCH_SIZE']
+        now = utcnow()
+        started = time.monotonic()
+        excess = TieringService._excess_bytes(tiers[0])
+        if excess:
+            current_app.logger.info("Tier %s is over TIER_HOT_MAX_USAGE by %s bytes", tiers[0], excess)
+
+        for i in reversed(range(len(tiers) - 1)):
+            idle_before = now - timedelta(seconds=config['TIER_DEMOTE_AFTER_SECONDS'] * (i + 1))
+            budget = excess if i == 0 else 0
+            selected = 0
+            for page in TieringService._iter_idle(tiers[i], i == 0, now if budget else idle_before, batch_size):
+                batch = []
+                for blob in page:
+                    if blob.last_accessed_at >= idle_before and selected >= budget:
+                        break
+                    selected += blob.size
+                    batch.append(blob)
+                TieringService._move_batch(batch, tiers[i + 1], TieringService.DEMOTE, throttle, dry_run, stats)
+                if len(batch) < len(page):
+                    break
+
+        min_hits = config['TIER_PROMOTE_HITS']
+        if not excess and min_hits > 0:
+            window_start = now - timedelta(seconds=config['TIER_DEMOTE_AFTER_SECONDS'])
+            for tier in tiers[1:]:
+                for page in TieringService._iter_popular(tier, min_hits, window_start, batch_size):
+                    TieringService._move_batch(page, tiers[0], TieringService.PROMOTE, throttle, dry_run, stats)
+
+        elapsed = time.monotonic() - started
+        stats['seconds'] = round(elapsed, 3)
+        stats['bytes_per_second'] = int(stats['bytes'] / elapsed) if elapsed > 0 else 0
+        current_app.logger.info("Tier migration %s: %s", 'planned' if dry_run else 'finished', stats)
+        if not dry_run:
+            TieringService._save_report(dict(stats, finished_at=utcnow().isoformat()))
+        return stats
+
+    @staticmethod
+    def report() -> Dict[str, Any]:
+        """
+        Сводка по уровням: тома, количество и объём содержимого из БД, заполненность дисков,
+        и статистика последнего переноса из TIER_REPORT_PATH.
+
+        :return: {'tiers': [...], 'last_migration': {...} или None}
+        """
+        tiers = StorageVolumes.get_tiers()
+        totals: Dict[str, Tuple[int, int]] = {}
+        for tier, count, size in BlobRepository.get_tier_totals():
+            name = tier or tiers[0][0]
+            blobs, stored = totals.get(name, (0, 0))
+            totals[name] = (blobs + count, stored + size)
+
+        rows = []
+        for name, volumes in tiers:
+            used, total = TieringService._disk_usage(name)
+            blobs, stored = totals.pop(name, (0, 0))
+            rows.append({
+                'name': name, 'volumes': [path for path, _ in volumes], 'blobs': blobs, 'bytes': stored,
+                'disk_used': used, 'disk_total': total,
+            })
+        for name, (blobs, stored) in totals.items():
+            # Уровень убран из STORAGE_TIERS, а записи о переносе на него остались
+            rows.append({'name': name, 'volumes': [], 'blobs': blobs, 'bytes': stored, 'disk_used': 0, 'disk_total': 0})
+
+        last_migration = None
+        try:
+            with open(current_app.config['TIER_REPORT_PATH']) as f:
+                last_migration = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return {'tiers': rows, 'last_migration': last_migration}
+
+    @staticmethod
+    def _iter_idle(tier: str, is_default: bool, accessed_before: datetime, limit: int) -> Iterator[List[Blob]]:
+        after = None
+        while True:
+            page = BlobRepository.get_idle(tier, is_default, accessed_before, after, limit)
+            if not page:
+                return
+            after = (page[-1].last_accessed_at, page[-1].hash)
+            yield page
+
+    @staticmethod
+    def _iter_popular(tier: str, min_hits: int, accessed_after: datetime, limit: int) -> Iterator[List[Blob]]:
+        after_hash = ''
+        while True:
+            page = BlobRepository.get_popular(tier, min_hits, accessed_after, after_hash, limit)
+            if not page:
+                return
+            after_hash = page[-1].hash
+            yield page
+
+    @staticmethod
+    def _move_batch(blobs: List[Blob], target_tier: str, direction: str, throttle: IoThrottle,
+                    dry_run: bool, stats: Dict[str, Any]) -> None:
+        """
+        Переносит пачку файлов на уровень: копирование, коммит уровней в БД, пауза, удаление старых копий.
+        """
+        copies: List[Tuple[str, Optional[str], Optional[str], int]] = []
+        for blob in blobs:
+            located = FileStorage.locate_file(blob.hash)
+            if located is None:
+                current_app.logger.warning("Tier migration: file %s not found in storage", blob.hash)
+                continue
+            source = located[0]
+            volume = os.path.dirname(os.path.dirname(source))
+            if StorageVolumes.get_tier_of(volume) == target_tier:
+                # Файл уже скопирован прошлым запуском, не дошедшим до коммита
+                copies.append((blob.hash, None, None, 0))
+                continue
+            target = os.path.join(StorageVolumes.locate(blob.hash, target_tier), os.path.relpath(source, volume))
+            try:
+                size = os.path.getsize(source) if dry_run else FileStorage.copy_file(source, target, throttle.consume)
+            except FileNotFoundError:
+                continue  # Удалён сборщиком мусора или переехал
+            except OSError as e:
+                current_app.logger.error("Tier migration: failed to copy %s to %s: %s", source, target, e)
+                stats['failed'] += 1
+                continue
+            copies.append((blob.hash, source, target, size))
+
+        if dry_run:
+            stats[TieringService.STATS[direction]] += len(copies)
+            stats['bytes'] += sum(size for _, _, _, size in copies)
+            return
+
+        done = []
+        for file_hash, source, target, size in copies:
+            if BlobRepository.set_tier(file_hash, target_tier):
+                done.append((source, target, size))
+            elif target is not None:
+                TieringService._remove_quietly(target)  # Запись удалил сборщик мусора
+        db.session.commit()
+        if any(source is not None for source, _, _ in done):
+            time.sleep(current_app.config['TIER_UNLINK_GRACE_SECONDS'])
+        for source, target, size in done:
+            if source is not None:
+                try:
+                    os.remove(source)
+                except FileNotFoundError:
+                    # Источник удалил сборщик мусора, пока шёл перенос: копия тоже не нужна
+                    TieringService._remove_quietly(target)
+                    continue
+                current_app.logger.debug("Tier migration: %s -> %s", source, target)
+            metrics.inc('tier_migrations_total', direction=direction)
+            metrics.inc('tier_migrated_bytes_total', size, direction=direction)
+            stats[TieringService.STATS[direction]] += 1
+            stats['bytes'] += size
+
+    @staticmethod
+    def _disk_usage(tier: str) -> Tuple[int, int]:
+        """
+        Занятое и общее место на дисках уровня; том на уже учтённом устройстве не считается повторно.
+        """
+        used = total = 0
+        devices = set()
+        for volume, _ in StorageVolumes.get_tier_volumes(tier):
+            if not os.path.isdir(volume):
+                continue
+            device = os.stat(volume).st_dev
+            if device in devices:
+                continue
+            devices.add(device)
+            usage = shutil.disk_usage(volume)
+            used += usage.used
+            total += usage.total
+        return used, total
+
+    @staticmethod
+    def _excess_bytes(tier: str) -> int:
+        """
+        Сколько байт нужно убрать с уровня, чтобы заполненность опустилась до TIER_HOT_MAX_USAGE.
+        """
+        max_usage = current_app.config['TIER_HOT_MAX_USAGE']
+        if max_usage <= 0:
+            return 0
+        used, total = TieringService._disk_usage(tier)
+        return max(0, int(used - max_usage * total))
+
+    @staticmethod
+    def _save_report(stats: Dict[str, Any]) -> None:
+        path = current_app.config['TIER_REPORT_PATH']
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove_quietly(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
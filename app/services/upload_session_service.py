@@ -0,0 +1,288 @@
+import uuid
+from datetime import timedelta
+from typing import IO, Any, Dict, Optional
+
+from flask import current_app
+
+from app import db
+from app.exceptions.custom_exceptions import APIError, InvalidRequestError, UploadSessionNotFoundError
+from app.models.upload_session import UploadChunk, UploadSession
+from app.models.user import User
+from app.repositories.upload_session_repository import UploadSessionRepository
+from app.repositories.user_repository import UserRepository
+from app.services.file_service import FileService
+from app.utils.clock import utcnow
+from app.utils.storage import FileStorage
+
+
+class UploadSessionService:
+    """
+    Сервис возобновляемой загрузки по частям: открытие сессии, приём частей,
+    проверка прогресса, сборка файла и очистка брошенных сессий.
+
+    Части пишутся сразу по своему смещению в один файл сессии на томе хранилища,
+    так что при завершении файл только переименовывается на место по хэшу.
+    Хэш всего файла считается после запроса на завершение фоновой задачей
+    (или сразу, если UPLOAD_FINALIZE_INTERVAL_SECONDS = 0): клиент получает 202
+    и опрашивает статус сессии, пока в нём не появится хэш.
+    """
+
+    STATUS_OPEN = 'open'
+    STATUS_COMMITTING = 'committing'
+    STATUS_COMMITTED = 'committed'
+    STATUS_FAILED = 'failed'
+
+    @staticmethod
+    def open_session(user: User, total_size: int, chunk_size: int, filename: Optional[str] = None,
+                     content_type: Optional[str] = None) -> UploadSession:
+        """
+        Открывает новую сессию загрузки.
+
+        :param user: Пользователь, загружающий файл
+        :param total_size: Итоговый размер файла в байтах
+        :param chunk_size: Размер одной части в байтах
+        :param filename: Имя файла (необязательно)
+        :param content_type: MIME-тип файла (необязательно, иначе угадывается по имени)
+        :return: Созданная сессия
+        :raises InvalidRequestError: если размеры некорректны
+        :raises QuotaExceededError: если файл заявленного размера не помещается в квоту
+        """
+        if total_size < 0:
+            raise InvalidRequestError("total_size must be non-negative")
+        if not 0 < chunk_size <= current_app.config['UPLOAD_MAX_CHUNK_SIZE']:
+            raise InvalidRequestError(
+                f"chunk_size must be between 1 and {current_app.config['UPLOAD_MAX_CHUNK_SIZE']}"
+            )
+
+        FileService.check_quota(user, total_size)
+        filename, content_type = FileService.describe_upload(filename, content_type)
+        UploadSessionService.purge_expired()
+
+        now = utcnow()
+        upload_session = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            filename=filename,
+            content_type=content_type,
+            created_at=now,
+            expires_at=now + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL_SECONDS']),
+        )
+        FileStorage.create_upload_file(upload_session.id, total_size)
+        db.session.add(upload_session)
+        db.session.commit()
+        current_app.logger.info("Upload session %s opened by user %s", upload_session.id, user.id)
+        return upload_session
+
+    @staticmethod
+    def put_chunk(user: User, session_id: str, index: int, file_stream: IO,
+                  expected_sha256: Optional[str] = None) -> UploadChunk:
+        """
+        Принимает часть загрузки. Повторная отправка той же части перезаписывает её.
+
+        :param user: Владелец сессии
+        :param session_id: Идентификатор сессии
+        :param index: Номер части, начиная с 0
+        :param file_stream: Поток с содержимым части
+        :param expected_sha256: Хэш части, заявленный клиентом (необязательно)
+        :return: Запись о принятой части
+        :raises UploadSessionNotFoundError: если сессии нет
+        :raises InvalidRequestError: если номер, размер или хэш части не сходятся
+        """
+        upload_session = UploadSessionService._get_session(user, session_id)
+        if upload_session.committed_at is not None:
+            raise InvalidRequestError("Upload is already committed")
+        if not 0 <= index < upload_session.chunk_count:
+            raise InvalidRequestError(f"Chunk index must be between 0 and {upload_session.chunk_count - 1}")
+
+        # Пока часть перезаписывается, она не должна числиться принятой
+        existing = UploadSessionRepository.get_chunk(session_id, index)
+        if existing is not None:
+            db.session.delete(existing)
+            db.session.commit()
+
+        expected_size = upload_session.expected_chunk_size(index)
+        chunk_hash, size = FileStorage.write_upload_chunk(
+            session_id, index * upload_session.chunk_size, file_stream, limit=expected_size
+        )
+        if size != expected_size or file_stream.read(1):
+            raise InvalidRequestError(f"Chunk {index} must be exactly {expected_size} bytes")
+        if expected_sha256 is not None and expected_sha256.lower() != chunk_hash:
+            raise InvalidRequestError(f"Chunk {index} checksum mismatch")
+
+        chunk = UploadChunk(session_id=session_id, index=index, size=size, sha256=chunk_hash)
+        db.session.add(chunk)
+        upload_session.expires_at = utcnow() + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL_SECONDS'])
+        db.session.commit()
+        current_app.logger.debug("Chunk %s of session %s received: %s", index, session_id, chunk_hash)
+        return chunk
+
+    @staticmethod
+    def get_status(user: User, session_id: str) -> Dict[str, Any]:
+        """
+        Возвращает прогресс сессии: какие части уже приняты и чем закончилось завершение.
+
+        :param user: Владелец сессии
+        :param session_id: Идентификатор сессии
+        :return: Словарь с параметрами сессии, списком принятых частей, статусом
+            (open/committing/committed/failed), хэшем файла и ошибкой сборки
+        :raises UploadSessionNotFoundError: если сессии нет
+        """
+        upload_session = UploadSessionService._get_session(user, session_id)
+        chunks = UploadSessionRepository.get_chunks(session_id)
+        return {
+            'upload_id': upload_session.id,
+            'total_size': upload_session.total_size,
+            'chunk_size': upload_session.chunk_size,
+            'chunk_count': upload_session.chunk_count,
+            'expires_at': upload_session.expires_at.isoformat() + 'Z',
+            'received': [{'index': c.index, 'size': c.size, 'sha256': c.sha256} for c in chunks],
+            'status': UploadSessionService.get_state(upload_session),
+            'hash': upload_session.file_hash,
+            'error': upload_session.error,
+        }
+
+    @staticmethod
+    def get_state(upload_session: UploadSession) -> str:
+        """
+        Определяет, на каком этапе сессия.
+
+        :param upload_session: Сессия загрузки
+        :return: STATUS_OPEN, STATUS_COMMITTING, STATUS_COMMITTED или STATUS_FAILED
+        """
+        if upload_session.file_hash is not None:
+            return UploadSessionService.STATUS_COMMITTED
+        if upload_session.error is not None:
+            return UploadSessionService.STATUS_FAILED
+        if upload_session.committed_at is not None:
+            return UploadSessionService.STATUS_COMMITTING
+        return UploadSessionService.STATUS_OPEN
+
+    @staticmethod
+    def commit(user: User, session_id: str) -> UploadSession:
+        """
+        Завершает приём частей: проверяет, что все части приняты, и ставит сессию в очередь на сборку.
+
+        Хэш собранного файла требует его полного чтения, поэтому в запросе он не считается
+        (если только UPLOAD_FINALIZE_INTERVAL_SECONDS не 0): файл регистрирует finalize_committed.
+        Повторный вызов возвращает ту же сессию.
+
+        :param user: Владелец сессии
+        :param session_id: Идентификатор сессии
+        :return: Сессия; file_hash заполнен, если файл уже зарегистрирован
+        :raises UploadSessionNotFoundError: если сессии нет
+        :raises InvalidRequestError: если приняты не все части
+        :raises QuotaExceededError: если сборка выполнялась сразу и файл не поместился в квоту
+        """
+        upload_session = UploadSessionService._get_session(user, session_id)
+        if upload_session.committed_at is None:
+            received = UploadSessionRepository.count_chunks(session_id)
+            if received != upload_session.chunk_count:
+                raise InvalidRequestError(f"Received {received} of {upload_session.chunk_count} chunks")
+
+            now = utcnow()
+            upload_session.committed_at = now
+            upload_session.expires_at = now + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL_SECONDS'])
+            db.session.commit()
+            current_app.logger.info("Upload session %s queued for finalizing", session_id)
+
+        if current_app.config['UPLOAD_FINALIZE_INTERVAL_SECONDS'] <= 0 \
+                and UploadSessionService.get_state(upload_session) == UploadSessionService.STATUS_COMMITTING:
+            UploadSessionService._finalize(user, upload_session)
+        return upload_session
+
+    @staticmethod
+    def finalize_committed() -> int:
+        """
+        Собирает файлы завершённых клиентом сессий: считает хэш и регистрирует файл.
+        Вызывается фоновой задачей.
+
+        :return: Количество обработанных сессий
+        """
+        finalized = 0
+        while pending := UploadSessionRepository.get_committing():
+            for upload_session in pending:
+                user = UserRepository.get(upload_session.user_id)
+                try:
+                    UploadSessionService._finalize(user, upload_session)
+                except APIError as e:
+                    current_app.logger.warning("Upload session %s failed: %s", upload_session.id, e.message)
+            finalized += len(pending)
+        return finalized
+
+    @staticmethod
+    def _finalize(user: User, upload_session: UploadSession) -> None:
+        """
+        Считает хэш собранного файла, регистрирует его и переносит на место.
+        Ошибка регистрации (например, квота) запоминается в сессии, файл сессии удаляется.
+
+        :param user: Владелец сессии
+        :param upload_session: Сессия, завершённая клиентом
+        :raises APIError: если файл не удалось зарегистрировать
+        """
+        session_id = upload_session.id
+        # Состояние SHA-256 нельзя сохранить между запросами разных воркеров,
+        # поэтому собранный файл читается один раз; копирования нет — только rename.
+        file_hash = FileStorage.hash_upload_file(session_id)
+        try:
+            # Хэш в сессии коммитится вместе со ссылкой на файл
+            upload_session.file_hash = file_hash
+            FileService.register_file(
+                user, file_hash, upload_session.total_size, upload_session.filename, upload_session.content_type
+            )
+        except APIError as e:
+            upload_session.file_hash = None
+            upload_session.error = e.message[:255]
+            FileStorage.delete_upload_file(session_id)
+            db.session.commit()
+            raise
+
+        FileStorage.place_temp_file(FileStorage.get_upload_path(session_id), file_hash)
+        db.session.commit()
+        current_app.logger.info("Upload session %s committed as %s", session_id, file_hash)
+
+    @staticmethod
+    def abort(user: User, session_id: str) -> None:
+        """
+        Отменяет сессию и удаляет принятые части.
+
+        :param user: Владелец сессии
+        :param session_id: Идентификатор сессии
+        :raises UploadSessionNotFoundError: если сессии нет
+        """
+        upload_session = UploadSessionService._get_session(user, session_id)
+        if UploadSessionService.get_state(upload_session) == UploadSessionService.STATUS_COMMITTING:
+            raise InvalidRequestError("Upload is being finalized")
+        UploadSessionService._drop(upload_session)
+        db.session.commit()
+        current_app.logger.info("Upload session %s aborted", session_id)
+
+    @staticmethod
+    def purge_expired() -> int:
+        """
+        Удаляет просроченные (брошенные) сессии вместе с их файлами.
+
+        :return: Количество удалённых сессий
+        """
+        purged = 0
+        while expired := UploadSessionRepository.get_expired(utcnow()):
+            for upload_session in expired:
+                UploadSessionService._drop(upload_session)
+            db.session.commit()
+            purged += len(expired)
+        if purged:
+            current_app.logger.info("Purged %s expired upload sessions", purged)
+        return purged
+
+    @staticmethod
+    def _get_session(user: User, session_id: str) -> UploadSession:
+        upload_session = UploadSessionRepository.get(session_id, user.id)
+        if upload_session is None or upload_session.expires_at < utcnow():
+            raise UploadSessionNotFoundError()
+        return upload_session
+
+    @staticmethod
+    def _drop(upload_session: UploadSession) -> None:
+        FileStorage.delete_upload_file(upload_session.id)
+        UploadSessionRepository.delete(upload_session)
@@ -0,0 +1,50 @@
+import threading
+from typing import Dict
+
+from flask import Flask
+
+
+class AccessTracker:
+    """
+    Учёт скачиваний для переноса файлов между уровнями хранилища.
+
+    Запрос только увеличивает счётчик в памяти процесса; накопленное периодически
+    записывает в БД одним пакетом фоновая задача (drain + BlobRepository.record_access),
+    так что скачивание не делает лишних запросов на запись.
+    Учёт включён, только если уровней больше одного и ACCESS_FLUSH_SECONDS > 0.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask, tiers: int) -> None:
+        """
+        Включает учёт по конфигурации приложения.
+
+        :param app: Flask приложение
+        :param tiers: Количество настроенных уровней хранилища
+        """
+        self.enabled = tiers > 1 and app.config['ACCESS_FLUSH_SECONDS'] > 0
+
+    def record(self, key: str) -> None:
+        """
+        Отмечает скачивание файла.
+
+        :param key: Хэш файла
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def drain(self) -> Dict[str, int]:
+        """
+        Забирает накопленные счётчики и обнуляет их.
+
+        :return: Количество скачиваний по хэшу с прошлого вызова
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
@@ -0,0 +1,133 @@
+import tarfile
+import time
+import zipfile
+from typing import IO, Dict, Iterator, List
+
+from app.utils.hashing import FileHasher
+
+
+class TarStreamWriter:
+    """
+    Потоковая сборка tar: заголовок члена, его байты блоками и выравнивание до 512.
+
+    tarfile.addfile копирует член целиком за один вызов, поэтому заголовки формируются
+    через TarInfo.tobuf, а содержимое отдаётся по мере чтения. Память — один блок чтения.
+    """
+
+    MIMETYPE: str = 'application/x-tar'
+    EXTENSION: str = 'tar'
+
+    def __init__(self) -> None:
+        self._written = 0
+
+    def add(self, name: str, stream: IO[bytes], size: int) -> Iterator[bytes]:
+        """
+        Добавляет член архива.
+
+        :param name: Имя члена
+        :param stream: Поток содержимого
+        :param size: Размер содержимого, записывается в заголовок до чтения
+        :return: Итератор по готовым байтам архива
+        :raises IOError: если поток закончился раньше size байт (архив дальше собирать нельзя)
+        """
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = size, int(time.time()), 0o644
+        yield self._emit(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+        remaining = size
+        while remaining > 0:
+            chunk = stream.read(min(FileHasher.CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"{name}: content is shorter than {size} bytes")
+            remaining -= len(chunk)
+            yield self._emit(chunk)
+        padding = -size % tarfile.BLOCKSIZE
+        if padding:
+            yield self._emit(tarfile.NUL * padding)
+
+    def close(self) -> Iterator[bytes]:
+        """
+        Завершает архив двумя пустыми блоками и дополняет до размера записи tar.
+        """
+        end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        self._written += len(end)
+        yield end + tarfile.NUL * (-self._written % tarfile.RECORDSIZE)
+
+    def _emit(self, data: bytes) -> bytes:
+        self._written += len(data)
+        return data
+
+
+class _Sink:
+    """
+    Файл только на запись без seek: zipfile пишет в него, готовые байты забираются drain.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class ZipStreamWriter:
+    """
+    Потоковая сборка zip без сжатия. В поток без seek zipfile пишет размеры и CRC
+    после содержимого члена (data descriptor), центральный каталог — при close.
+    """
+
+    MIMETYPE: str = 'application/zip'
+    EXTENSION: str = 'zip'
+
+    def __init__(self) -> None:
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def add(self, name: str, stream: IO[bytes], size: int) -> Iterator[bytes]:
+        """
+        Добавляет член архива.
+
+        :param name: Имя члена
+        :param stream: Поток содержимого
+        :param size: Размер содержимого (по нему выбирается zip64)
+        :return: Итератор по готовым байтам архива
+        :raises IOError: если поток закончился раньше size байт
+        """
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.file_size = size
+        with self._zip.open(info, 'w') as member:
+            remaining = size
+            while remaining > 0:
+                chunk = stream.read(min(FileHasher.CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{name}: content is shorter than {size} bytes")
+                remaining -= len(chunk)
+                member.write(chunk)
+                yield from self._drain()
+        yield from self._drain()
+
+    def close(self) -> Iterator[bytes]:
+        """
+        Дописывает центральный каталог.
+        """
+        self._zip.close()
+        yield from self._drain()
+
+    def _drain(self) -> Iterator[bytes]:
+        data = self._sink.drain()
+        if data:
+            yield data
+
+
+ARCHIVE_WRITERS: Dict[str, type] = {
+    TarStreamWriter.EXTENSION: TarStreamWriter,
+    ZipStreamWriter.EXTENSION: ZipStreamWriter,
+}
@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import sys
+import tempfile
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask
+
+
+class _ReceiveStream:
+    """
+    wsgi.input, читающий тело запроса прямо из ASGI receive: поток с WSGI-приложением
+    ждёт очередной кусок тела от event loop, без промежуточного файла.
+    """
+
+    def __init__(self, receive: Callable, loop: asyncio.AbstractEventLoop) -> None:
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._more_body = True
+
+    def read(self, size: int = -1) -> bytes:
+        while self._more_body and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        limit = size if size is not None and size >= 0 else None
+        while self._more_body and b'\n' not in self._buffer and (limit is None or len(self._buffer) < limit):
+            self._fill()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        return self.read(end if limit is None else min(end, limit))
+
+    def close(self) -> None:
+        self._buffer.clear()
+
+    def _fill(self) -> None:
+        # Отключившийся клиент — конец тела; короткое тело Werkzeug сам сочтёт разрывом
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.disconnect':
+            self._more_body = False
+            return
+        self._buffer += message.get('body', b'')
+        self._more_body = message.get('more_body', False)
+
+
+class WsgiBridge:
+    """
+    Минимальный адаптер, запускающий WSGI (Flask) приложение под ASGI-сервером.
+
+    Тело запроса принимается асинхронно в SpooledTemporaryFile и только потом
+    передаётся в поток с WSGI-приложением, поэтому медленный клиент не держит поток,
+    пока досылает тело. Для запросов, отобранных stream_body (загрузка сырым телом),
+    тело не копируется во временный файл, а читается приложением прямо из receive:
+    поток занят на всё время загрузки, зато каждый байт пишется на диск один раз.
+    Ответ отдаётся по кускам: поток занят только на время
+    получения очередного куска, ожидание сокета идёт в event loop.
+    """
+
+    SPOOL_MAX_SIZE: int = 1024 * 1024  # Тела больше этого размера уходят из памяти на диск
+
+    def __init__(self, app: Flask, stream_body: Optional[Callable[[Dict[str, Any]], bool]] = None) -> None:
+        self.app = app
+        self.stream_body = stream_body
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if self.stream_body is not None and self.stream_body(scope):
+            body = _ReceiveStream(receive, asyncio.get_running_loop())
+        else:
+            body = await self._spool_body(receive)
+            if body is None:
+                return
+        try:
+            environ = self._build_environ(scope, body)
+            # Все вызовы в поток идут в одном контексте: генератор ответа со stream_with_context
+            # держит контекст запроса Flask в contextvars между кусками
+            context = contextvars.copy_context()
+            status, headers, iterable = await asyncio.to_thread(context.run, self._start, environ)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            iterator = iter(iterable)
+            try:
+                while (chunk := await asyncio.to_thread(context.run, next, iterator, None)) is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                close = getattr(iterable, 'close', None)
+                if close is not None:
+                    await asyncio.to_thread(context.run, close)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            body.close()
+
+    @staticmethod
+    async def _spool_body(receive: Callable) -> Optional[Any]:
+        """
+        Принимает тело запроса целиком в SpooledTemporaryFile; None, если клиент отключился.
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=WsgiBridge.SPOOL_MAX_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            if chunk:
+                await asyncio.to_thread(body.write, chunk)
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    def _start(self, environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], Iterable[bytes]]:
+        response: Dict[str, Any] = {}
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Optional[Any] = None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        iterable = self.app(environ, start_response)
+        return response['status'], response['headers'], iterable
+
+    @staticmethod
+    def _build_environ(scope: Dict[str, Any], body: Any) -> Dict[str, Any]:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ: Dict[str, Any] = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
@@ -0,0 +1,53 @@
+import fcntl
+import os
+import threading
+from typing import Callable, Optional
+
+from flask import Flask
+
+
+class PeriodicTask:
+    """
+    Фоновый поток, который периодически выполняет функцию в контексте приложения.
+
+    Если задан lock_path, запуск берёт flock на этот файл без ожидания:
+    из нескольких процессов gunicorn задачу в каждый момент выполняет только один,
+    остальные пропускают свой запуск.
+    """
+
+    def __init__(self, app: Flask, name: str, interval: float, func: Callable[[], None],
+                 lock_path: Optional[str] = None) -> None:
+        self.app = app
+        self.interval = interval
+        self.func = func
+        self.lock_path = lock_path
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self._run_once()
+            except Exception as e:
+                self.app.logger.error("Background task %s failed: %s", self._thread.name, e)
+
+    def _run_once(self) -> None:
+        if self.lock_path is None:
+            with self.app.app_context():
+                self.func()
+            return
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            with self.app.app_context():
+                self.func()
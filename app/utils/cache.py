@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from flask import Flask
+
+
+class CachedBlob(NamedTuple):
+    """Запись кэша: байты в том виде, как они лежат в хранилище, и их кодек."""
+    data: bytes
+    encoding: Optional[str] = None
+
+
+class BlobCache:
+    """
+    Кэш содержимого небольших часто запрашиваемых файлов в памяти процесса.
+
+    Ограничен общим бюджетом в байтах и максимальным размером одного объекта,
+    при переполнении вытесняет давно не использованные записи (LRU).
+    Кэш свой у каждого процесса gunicorn, поэтому удаление содержимого в другом процессе
+    его не сбрасывает: попадание отдаётся только после проверки ссылок по БД (FileService.get_blob),
+    а запись о содержимом без ссылок из кэша процесса убирается при этой проверке.
+    """
+
+    def __init__(self, max_bytes: int = 0, max_object_bytes: int = 0) -> None:
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._entries: 'OrderedDict[str, CachedBlob]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Читает лимиты кэша из конфигурации приложения.
+
+        :param app: Flask приложение
+        """
+        self.max_bytes = app.config['BLOB_CACHE_MAX_BYTES']
+        self.max_object_bytes = app.config['BLOB_CACHE_MAX_OBJECT_BYTES']
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_object_bytes > 0
+
+    def accepts(self, size: int) -> bool:
+        """
+        Проверяет, можно ли положить в кэш объект такого размера.
+
+        :param size: Размер объекта в байтах
+        :return: True, если объект укладывается в лимиты
+        """
+        return self.enabled and size <= min(self.max_object_bytes, self.max_bytes)
+
+    def get(self, key: str) -> Optional[CachedBlob]:
+        """
+        Возвращает содержимое из кэша и отмечает его как недавно использованное.
+
+        :param key: Хэш файла
+        :return: Запись кэша или None при промахе
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, data: bytes, encoding: Optional[str] = None) -> None:
+        """
+        Кладёт содержимое в кэш, вытесняя старые записи при нехватке бюджета.
+
+        :param key: Хэш файла
+        :param data: Содержимое файла (сжатое, если указан encoding)
+        :param encoding: Кодек, которым сжато содержимое, или None
+        """
+        if not self.accepts(len(data)):
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.data)
+            while self._entries and self._size + len(data) > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+                self.evictions += 1
+            self._entries[key] = CachedBlob(data, encoding)
+            self._size += len(data)
+
+    def invalidate(self, key: str) -> None:
+        """
+        Удаляет запись из кэша.
+
+        :param key: Хэш файла
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry.data)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает счётчики кэша для подбора его размера.
+
+        :return: Словарь с попаданиями, промахами, вытеснениями и заполненностью
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'items': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'max_object_bytes': self.max_object_bytes,
+            }
@@ -0,0 +1,365 @@
+import bisect
+import hashlib
+import io
+import os
+import tempfile
+from typing import IO, Iterator, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.config import Config
+from app.exceptions.custom_exceptions import FileNotFoundInStorageError
+from app.extensions import db
+from app.repositories.chunk_repository import ChunkRepository
+from app.utils.hashing import FileHasher
+from app.utils.volumes import StorageVolumes
+
+try:
+    import numpy
+except ImportError:  # Необязательная зависимость: без неё отпечатки считаются циклом на Python
+    numpy = None
+
+
+class ContentDefinedChunker:
+    """
+    Нарезка потока на куски по содержимому (Gear rolling hash, как в FastCDC).
+
+    Граница ставится там, где старшие биты отпечатка последних ~64 байт равны нулю,
+    поэтому вставка нескольких байт сдвигает только соседние границы,
+    а остальные куски совпадают с предыдущей версией файла.
+
+    С numpy отпечатки считаются для блока байт сразу (порядка 100 МБ/с), без него —
+    побайтовым циклом на Python (5–10 МБ/с, поток загрузки всё это время занимает GIL).
+    Границы в обоих случаях одинаковые.
+    """
+
+    _MASK64 = (1 << 64) - 1
+    _GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+    _GEAR_TABLE = numpy.array(_GEAR, dtype=numpy.uint64) if numpy is not None else None
+    _WINDOW = 64  # Отпечаток Gear зависит только от последних 64 байт
+    _BLOCK = 64 * 1024  # Сколько позиций проверяется за один проход numpy (блок помещается в кэш)
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int) -> None:
+        self.min_size = min_size
+        self.max_size = max_size
+        bits = max((avg_size - min_size).bit_length() - 1, 1)
+        self.mask = ((1 << bits) - 1) << (64 - bits)
+
+    def split(self, stream: IO) -> Iterator[bytes]:
+        """
+        Разбивает поток на куски.
+
+        :param stream: Поток для чтения
+        :return: Итератор по кускам
+        """
+        buffer = bytearray()
+        eof = False
+        while True:
+            while not eof and len(buffer) < self.max_size:
+                data = stream.read(FileHasher.CHUNK_SIZE)
+                if not data:
+                    eof = True
+                buffer += data
+            if not buffer:
+                return
+            cut = self._find_cut(buffer)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+
+    def _find_cut(self, buffer: bytearray) -> int:
+        end = min(len(buffer), self.max_size)
+        if end <= self.min_size:
+            return end
+        if numpy is not None:
+            return self._find_cut_vectorized(buffer, end)
+        gear, mask, mask64 = self._GEAR, self.mask, self._MASK64
+        fingerprint = 0
+        for i in range(max(self.min_size - self._WINDOW, 0), end):
+            fingerprint = ((fingerprint << 1) + gear[buffer[i]]) & mask64
+            if i >= self.min_size and not fingerprint & mask:
+                return i + 1
+        return end
+
+    def _find_cut_vectorized(self, buffer: bytearray, end: int) -> int:
+        """
+        То же, что цикл в _find_cut, поблочно на numpy.
+
+        Отпечаток в позиции i — сумма gear[b[i - k]] << k по k < 64 по модулю 2^64 (старшие слагаемые
+        выходят за 64 бита). Она собирается удвоением окна: 1, 2, 4, ... 64 байт за 6 сдвигов массива,
+        переполнение uint64 и есть взятие по модулю.
+        """
+        mask = numpy.uint64(self.mask)
+        position = self.min_size  # Первый байт, после которого цикл уже может резать
+        while position < end:
+            stop = min(position + self._BLOCK, end)
+            start = max(position - self._WINDOW + 1, 0)
+            fingerprints = self._GEAR_TABLE[numpy.frombuffer(buffer, numpy.uint8, stop - start, start)]
+            shift = 1
+            while shift < self._WINDOW:
+                fingerprints[shift:] += fingerprints[:-shift] << numpy.uint64(shift)
+                shift <<= 1
+            hits = numpy.flatnonzero((fingerprints[position - start:] & mask) == 0)
+            if len(hits):
+                return position + int(hits[0]) + 1
+            position = stop
+        return end
+
+
+class ChunkedBlobReader(io.RawIOBase):
+    """
+    Поток для чтения файла, собранного из кусков, с поддержкой seek (нужен для Range).
+    """
+
+    def __init__(self, chunks: List[Tuple[int, int, str]], size: int) -> None:
+        super().__init__()
+        self._offsets = [offset for offset, _, _ in chunks]
+        self._chunks = chunks
+        self._size = size
+        self._pos = 0
+        self._current: Optional[Tuple[int, IO]] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= self._size:
+            return 0
+        index = bisect.bisect_right(self._offsets, self._pos) - 1
+        offset, size, path = self._chunks[index]
+        if self._current is None or self._current[0] != index:
+            self._close_current()
+            self._current = (index, open(path, 'rb'))
+        chunk_file = self._current[1]
+        chunk_file.seek(self._pos - offset)
+        view = memoryview(buffer)[:offset + size - self._pos]
+        read = chunk_file.readinto(view)
+        self._pos += read
+        return read
+
+    def close(self) -> None:
+        self._close_current()
+        super().close()
+
+    def _close_current(self) -> None:
+        if self._current is not None:
+            self._current[1].close()
+            self._current = None
+
+
+class ChunkStore:
+    """
+    Движок хранения с дедупликацией по кускам (STORAGE_ENGINE = 'chunked').
+
+    Каждый уникальный кусок хранится один раз в <том>/.chunks/<hh>/<hash>,
+    том выбирается по хэшу куска, файл описывается манифестом в БД. Снаружи файлы по-прежнему адресуются SHA-256
+    всего содержимого.
+    """
+
+    CHUNKS_DIR: str = '.chunks'
+
+    @staticmethod
+    def get_chunk_path(chunk_hash: str, volume: Optional[str] = None) -> str:
+        """
+        Формирует путь к куску по его хэшу.
+
+        :param chunk_hash: Хэш куска
+        :param volume: Том (по умолчанию — том, на котором кусок должен лежать)
+        :return: Полный путь к куску
+        """
+        volume = volume or StorageVolumes.locate(chunk_hash)
+        return os.path.join(volume, ChunkStore.CHUNKS_DIR, chunk_hash[:2], chunk_hash)
+
+    @staticmethod
+    def find_chunk_path(chunk_hash: str) -> Optional[str]:
+        """
+        Ищет кусок на томах, начиная с того, где он должен лежать.
+
+        :param chunk_hash: Хэш куска
+        :return: Путь к куску или None, если его нет ни на одном томе
+        """
+        for volume in StorageVolumes.rank(chunk_hash):
+            path = ChunkStore.get_chunk_path(chunk_hash, volume)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    @staticmethod
+    def iter_chunk_files(volume: str, after: Optional[Tuple[str, str]] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Перечисляет куски, лежащие на томе, по возрастанию хэша.
+
+        :param volume: Путь к тому
+        :param after: Позиция (каталог, хэш), после которой продолжить обход
+        :return: Итератор по парам (путь, хэш куска)
+        """
+        root = os.path.join(volume, ChunkStore.CHUNKS_DIR)
+        if not os.path.isdir(root):
+            return
+        for prefix in sorted(os.listdir(root)):
+            directory = os.path.join(root, prefix)
+            if not os.path.isdir(directory) or (after and prefix < after[0]):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.startswith('.') and not (after and (prefix, name) <= after):
+                    yield os.path.join(directory, name), name
+
+    @staticmethod
+    def store(tmp_path: str, blob_hash: str) -> bool:
+        """
+        Нарезает дописанный временный файл на куски, сохраняет манифест и новые куски.
+        Временный файл удаляется.
+
+        Файл читается дважды: при нарезке и при записи кусков, которых ещё нет на диске.
+        Если манифест уже есть, недостающие на диске куски (запись прервалась после коммита манифеста)
+        дописываются из временного файла: у того же хэша те же байты по тем же смещениям.
+
+        :param tmp_path: Путь к временному файлу
+        :param blob_hash: Хэш всего файла
+        :return: True, если файл сохранён, False если такой уже был
+        """
+        try:
+            if ChunkRepository.get_manifest(blob_hash) is not None:
+                ChunkStore._restore_missing(tmp_path, blob_hash)
+                current_app.logger.debug("File %s already in chunk storage, temp file discarded", blob_hash)
+                return False
+
+            chunker = ContentDefinedChunker(Config.CDC_MIN_SIZE, Config.CDC_AVG_SIZE, Config.CDC_MAX_SIZE)
+            chunks: List[Tuple[str, int]] = []
+            with open(tmp_path, 'rb') as f:
+                for data in chunker.split(f):
+                    chunks.append((hashlib.sha256(data).hexdigest(), len(data)))
+            size = sum(chunk_size for _, chunk_size in chunks)
+
+            for attempt in range(2):
+                try:
+                    ChunkRepository.add_manifest(blob_hash, size, chunks)
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    # Параллельно сохраняли тот же файл или новый кусок
+                    db.session.rollback()
+                    if ChunkRepository.get_manifest(blob_hash) is not None:
+                        ChunkStore._restore_missing(tmp_path, blob_hash)
+                        return False
+                    if attempt:
+                        raise
+
+            # Куски пишутся после коммита ссылок на них: сборщик мусора удаляет файлы кусков
+            # до коммита удаления их записей, так что недостающий кусок будет записан здесь.
+            offset = 0
+            with open(tmp_path, 'rb') as f:
+                for chunk_hash, chunk_size in chunks:
+                    f.seek(offset)
+                    ChunkStore._write_chunk(chunk_hash, f.read(chunk_size))
+                    offset += chunk_size
+
+            unique = len(set(chunk_hash for chunk_hash, _ in chunks))
+            current_app.logger.info("File %s saved as %s chunks (%s unique)", blob_hash, len(chunks), unique)
+            return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def exists(blob_hash: str) -> bool:
+        return ChunkRepository.get_manifest(blob_hash) is not None
+
+    @staticmethod
+    def get_size(blob_hash: str) -> int:
+        manifest = ChunkRepository.get_manifest(blob_hash)
+        if manifest is None:
+            raise FileNotFoundInStorageError()
+        return manifest.size
+
+    @staticmethod
+    def open(blob_hash: str) -> ChunkedBlobReader:
+        """
+        Открывает файл на чтение как поток, собираемый из кусков.
+
+        :param blob_hash: Хэш файла
+        :return: Поток для чтения
+        :raises FileNotFoundInStorageError: если манифеста нет
+        """
+        manifest = ChunkRepository.get_manifest(blob_hash)
+        if manifest is None:
+            raise FileNotFoundInStorageError()
+        chunks = [
+            (c.offset, c.size, ChunkStore.find_chunk_path(c.chunk_hash) or ChunkStore.get_chunk_path(c.chunk_hash))
+            for c in ChunkRepository.get_manifest_chunks(blob_hash)
+        ]
+        return ChunkedBlobReader(chunks, manifest.size)
+
+    @staticmethod
+    def delete(blob_hash: str) -> None:
+        """
+        Удаляет манифест файла и куски, на которые больше никто не ссылается.
+
+        Не коммитит: файлы кусков удаляются до коммита вызывающего кода,
+        чтобы параллельная загрузка, сославшаяся на тот же кусок после коммита, записала его заново.
+
+        :param blob_hash: Хэш файла
+        :raises FileNotFoundInStorageError: если манифеста нет
+        """
+        if ChunkRepository.get_manifest(blob_hash) is None:
+            raise FileNotFoundInStorageError(f"File not found: {blob_hash}")
+        released = ChunkRepository.delete_manifest(blob_hash)
+        for chunk_hash in released:
+            for volume in StorageVolumes.rank(chunk_hash):
+                path = ChunkStore.get_chunk_path(chunk_hash, volume)
+                if os.path.exists(path):
+                    os.remove(path)
+        current_app.logger.info("File %s deleted from chunk storage, %s chunks released", blob_hash, len(released))
+
+    @staticmethod
+    def _restore_missing(tmp_path: str, blob_hash: str) -> None:
+        """
+        Дописывает куски уже сохранённого файла, которых нет ни на одном томе.
+        """
+        restored = 0
+        with open(tmp_path, 'rb') as f:
+            for chunk in ChunkRepository.get_manifest_chunks(blob_hash):
+                if ChunkStore.find_chunk_path(chunk.chunk_hash) is not None:
+                    continue
+                f.seek(chunk.offset)
+                ChunkStore._write_chunk(chunk.chunk_hash, f.read(chunk.size))
+                restored += 1
+        if restored:
+            current_app.logger.warning("File %s: restored %s missing chunks", blob_hash, restored)
+
+    @staticmethod
+    def _write_chunk(chunk_hash: str, data: bytes) -> None:
+        existing = ChunkStore.find_chunk_path(chunk_hash)
+        if existing is not None:
+            try:
+                os.utime(existing)
+                return
+            except FileNotFoundError:
+                pass
+        path = ChunkStore.get_chunk_path(chunk_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
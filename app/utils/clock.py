@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """
+    Текущее время UTC без tzinfo — в таком виде время хранится в БД.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
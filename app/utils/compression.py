@@ -0,0 +1,99 @@
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+from typing import IO, Optional
+
+from app.config import Config
+from app.utils.hashing import FileHasher
+
+
+class BlobCompressor:
+    """
+    Сжатие содержимого в хранилище (STORAGE_COMPRESSION = 'gzip').
+
+    Решение принимается по каждому файлу: сжимается начало файла (COMPRESSION_SAMPLE_SIZE),
+    и если оно ужимается меньше чем на COMPRESSION_MIN_SAVING, файл хранится как есть.
+    Сжатый файл лежит рядом с обычным путём с суффиксом кодека и отдаётся клиентам
+    с подходящим Accept-Encoding без распаковки.
+    """
+
+    GZIP: str = 'gzip'
+    SUFFIXES = {GZIP: '.gz'}  # Кодек Content-Encoding -> суффикс файла в хранилище
+
+    @staticmethod
+    def enabled() -> bool:
+        """
+        Проверяет, включено ли сжатие новых файлов.
+        """
+        return Config.STORAGE_COMPRESSION == BlobCompressor.GZIP
+
+    @staticmethod
+    def should_compress(path: str) -> bool:
+        """
+        Оценивает по началу файла, окупится ли сжатие.
+
+        :param path: Путь к файлу
+        :return: True, если файл стоит хранить сжатым
+        """
+        if not BlobCompressor.enabled():
+            return False
+        with open(path, 'rb') as f:
+            sample = f.read(Config.COMPRESSION_SAMPLE_SIZE)
+        if not sample:
+            return False
+        compressed = zlib.compress(sample, Config.COMPRESSION_LEVEL)
+        return len(compressed) <= len(sample) * (1 - Config.COMPRESSION_MIN_SAVING)
+
+    @staticmethod
+    def compress_file(path: str, target_dir: str) -> str:
+        """
+        Сжимает файл во временный файл в target_dir.
+
+        Заголовок gzip не содержит имени и времени, поэтому одинаковое содержимое
+        всегда сжимается в одинаковые байты.
+
+        :param path: Путь к исходному файлу
+        :param target_dir: Каталог для временного файла (та же ФС, что и хранилище)
+        :return: Путь к сжатому временному файлу
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=target_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with open(path, 'rb') as source, \
+                        gzip.GzipFile(filename='', mode='wb', fileobj=f,
+                                      compresslevel=Config.COMPRESSION_LEVEL, mtime=0) as gz:
+                    shutil.copyfileobj(source, gz, FileHasher.CHUNK_SIZE)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    @staticmethod
+    def open_decoded(path: str) -> IO[bytes]:
+        """
+        Открывает сжатый файл как поток исходного содержимого.
+
+        GzipFile поддерживает seek (распаковывая до нужного места), поэтому Range работает.
+
+        :param path: Путь к сжатому файлу
+        :return: Поток исходного содержимого
+        """
+        return gzip.open(path, 'rb')
+
+    @staticmethod
+    def decode(data: bytes, encoding: Optional[str]) -> bytes:
+        """
+        Распаковывает содержимое в памяти.
+
+        :param data: Байты в том виде, как они лежат в хранилище
+        :param encoding: Кодек или None для несжатого файла
+        :return: Исходное содержимое
+        """
+        if encoding is None:
+            return data
+        return gzip.decompress(data)
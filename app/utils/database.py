@@ -0,0 +1,130 @@
+import functools
+from typing import Any, Dict, Optional
+
+from flask import Flask
+from flask.globals import app_ctx
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, scoped_session
+
+
+class DatabaseProfile:
+    """
+    Настройки движка БД под несколько процессов gunicorn.
+
+    SQLite: WAL (читатели не блокируют писателя), synchronous, busy timeout вместо
+    мгновенного "database is locked" и mmap. Серверные БД: размер пула, pre-ping,
+    пересоздание соединений и кэш скомпилированных запросов.
+    Чтения, которым не нужна запись в той же транзакции, идут через bind READ_BIND:
+    реплику из DATABASE_READ_URL или, для файла SQLite, отдельные read-only соединения.
+    """
+
+    READ_BIND: str = 'read'
+
+    @staticmethod
+    def init_app(app: Flask) -> None:
+        """
+        Дописывает в конфигурацию приложения параметры движков. Вызывается до db.init_app.
+
+        :param app: Flask приложение
+        """
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **DatabaseProfile.engine_options(app.config, uri),
+            **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        }
+        read_uri = app.config['DATABASE_READ_URL'] or (uri if DatabaseProfile._is_sqlite_file(uri) else None)
+        if read_uri:
+            binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+            binds[DatabaseProfile.READ_BIND] = {'url': read_uri, **DatabaseProfile.engine_options(app.config, read_uri)}
+            app.config['SQLALCHEMY_BINDS'] = binds
+
+    @staticmethod
+    def install(app: Flask, db: SQLAlchemy) -> None:
+        """
+        Вешает настройку соединений SQLite на созданные движки. Вызывается после db.init_app.
+
+        :param app: Flask приложение
+        :param db: Расширение SQLAlchemy
+        """
+        with app.app_context():
+            for key, engine in db.engines.items():
+                if engine.dialect.name == 'sqlite':
+                    read_only = key == DatabaseProfile.READ_BIND
+                    event.listen(engine, 'connect', functools.partial(
+                        DatabaseProfile._configure_sqlite, config=app.config, read_only=read_only,
+                    ))
+
+    @staticmethod
+    def engine_options(config: Dict[str, Any], uri: str) -> Dict[str, Any]:
+        """
+        Параметры create_engine для URI.
+
+        :param config: Конфигурация приложения
+        :param uri: URI базы данных
+        :return: Параметры движка
+        """
+        options: Dict[str, Any] = {'query_cache_size': config['DB_STATEMENT_CACHE_SIZE']}
+        if make_url(uri).get_backend_name() == 'sqlite':
+            # Таймаут ожидания блокировки pysqlite, в секундах
+            options['connect_args'] = {'timeout': config['DB_SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+            return options
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_pre_ping=config['DB_POOL_PRE_PING'],
+        )
+        return options
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection: Any, _record: Any, config: Dict[str, Any], read_only: bool) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            if not read_only:
+                cursor.execute(f"PRAGMA journal_mode={config['DB_SQLITE_JOURNAL_MODE']}")
+            cursor.execute(f"PRAGMA synchronous={config['DB_SQLITE_SYNCHRONOUS']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(config['DB_SQLITE_BUSY_TIMEOUT_MS'])}")
+            cursor.execute(f"PRAGMA mmap_size={int(config['DB_SQLITE_MMAP_SIZE'])}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _is_sqlite_file(uri: str) -> bool:
+        url = make_url(uri)
+        return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+class ReadSession:
+    """
+    Сессия только для чтения, своя на каждый контекст приложения (как db.session).
+
+    Идёт в bind DatabaseProfile.READ_BIND, а без него — в основную БД отдельным соединением.
+    Объекты из неё не добавляются в db.session и не меняются: для чтения внутри
+    пишущей транзакции нужен db.session, иначе реплика может отстать.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        self.db = db
+        self._registry = scoped_session(self._create_session, scopefunc=lambda: id(app_ctx._get_current_object()))
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Закрывает сессию чтения вместе с контекстом приложения.
+
+        :param app: Flask приложение
+        """
+        app.teardown_appcontext(self._remove)
+
+    def __call__(self) -> Session:
+        return self._registry()
+
+    def _create_session(self) -> Session:
+        engine = self.db.engines.get(DatabaseProfile.READ_BIND) or self.db.engine
+        return Session(bind=engine, expire_on_commit=False, autoflush=False)
+
+    def _remove(self, _exc: Optional[BaseException] = None) -> None:
+        self._registry.remove()
@@ -1,12 +1,30 @@
 import hashlib
-from typing import IO
+import re
+from typing import IO, Callable, Optional, Tuple
+
+from app.extensions import metrics
+
 
 class FileHasher:
     """
     Утилита для вычисления SHA-256 хэша файла из потока.
     """
 
+    CHUNK_SIZE: int = 1024 * 1024  # Читаем крупными блоками, память на одну загрузку ограничена этим размером
+    HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
     @staticmethod
+    def is_valid_hash(value: str) -> bool:
+        """
+        Проверяет, что строка — SHA-256 в шестнадцатеричном виде (и её можно подставлять в путь).
+
+        :param value: Проверяемая строка
+        :return: True, если это 64 шестнадцатеричных символа в нижнем регистре
+        """
+        return FileHasher.HASH_PATTERN.fullmatch(value) is not None
+
+    @staticmethod
+    @metrics.timed('operation_duration_seconds', operation='compute_hash')
     def compute_hash(file_stream: IO) -> str:
         """
         Вычисляет SHA-256 хэш для переданного файлового потока.
@@ -15,7 +33,50 @@ class FileHasher:
         :return: Хэш в виде строки шестнадцатеричных символов
         """
         sha256 = hashlib.sha256()
-        while chunk := file_stream.read(4096):
+        while chunk := file_stream.read(FileHasher.CHUNK_SIZE):
             sha256.update(chunk)
         file_stream.seek(0)
-        return sha256.hexdigest()
\ No newline at end of file
+        return sha256.hexdigest()
+
+    @staticmethod
+    @metrics.timed('operation_duration_seconds', operation='hash_and_copy')
+    def hash_and_copy(file_stream: IO, target: IO, limit: Optional[int] = None) -> Tuple[str, int]:
+        """
+        За один проход читает поток, считает SHA-256 и пишет те же байты в target.
+
+        :param file_stream: Исходный поток
+        :param target: Открытый на запись файл, куда копируются данные
+        :param limit: Сколько байт прочитать максимум (None — до конца потока)
+        :return: Кортеж (хэш, количество скопированных байт)
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        while True:
+            to_read = FileHasher.CHUNK_SIZE if limit is None else min(FileHasher.CHUNK_SIZE, limit - size)
+            if to_read <= 0:
+                break
+            chunk = file_stream.read(to_read)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            target.write(chunk)
+            size += len(chunk)
+        return sha256.hexdigest(), size
+
+    @staticmethod
+    def hash_stream(file_stream: IO, on_read: Optional[Callable[[int], None]] = None) -> Tuple[str, int]:
+        """
+        Считает SHA-256 потока до конца, не возвращаясь в начало.
+
+        :param file_stream: Поток для хэширования
+        :param on_read: Вызывается с размером каждого прочитанного блока (например, для ограничения скорости)
+        :return: Кортеж (хэш, количество прочитанных байт)
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        while chunk := file_stream.read(FileHasher.CHUNK_SIZE):
+            sha256.update(chunk)
+            size += len(chunk)
+            if on_read is not None:
+                on_read(len(chunk))
+        return sha256.hexdigest(), size
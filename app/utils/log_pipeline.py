@@ -0,0 +1,175 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись — одна строка JSON: время, уровень, логгер, сообщение, место вызова и pid.
+    Доля сэмплирования попадает в поле sample_rate, чтобы при подсчёте событий её можно было учесть.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'pid': record.process,
+        }
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is not None:
+            entry['sample_rate'] = sample_rate
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю массовых событий: запись с extra={'sample': key}
+    проходит с вероятностью rates[key]. Записи без ключа проходят всегда.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'sample', None)
+        if key is None:
+            return True
+        rate = self.rates.get(key, 1.0)
+        if rate >= 1.0:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+    @staticmethod
+    def parse_rates(spec: str) -> Dict[str, float]:
+        """
+        Разбирает LOG_SAMPLE_RATES вида "download=0.1,auth=0.01".
+
+        :param spec: Строка из конфигурации
+        :return: Ключ события -> доля пропускаемых записей
+        """
+        rates = {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            key, _, rate = item.partition('=')
+            rates[key.strip()] = float(rate)
+        return rates
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь как есть: сообщение форматируется уже в потоке QueueListener.
+    При переполнении очереди (диск не успевает) запись отбрасывается, поток запроса не ждёт.
+    """
+
+    def __init__(self, log_queue: 'queue.Queue[logging.LogRecord]') -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler, в который безопасно пишут несколько процессов gunicorn.
+
+    Ротацию выполняет один процесс под flock на файле рядом с логом; остальные
+    замечают, что файл заменён (другой inode), и переоткрывают его вместо повторной ротации.
+    """
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is not None and self._rotated_elsewhere():
+            self._reopen()
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        with open(f"{self.baseFilename}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._rotated_elsewhere():
+                self._reopen()
+                return
+            super().doRollover()
+
+    def _rotated_elsewhere(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen(self) -> None:
+        self.stream.close()
+        self.stream = self._open()
+
+
+class LogPipeline:
+    """
+    Логирование без записи на диск в потоке запроса.
+
+    Логгер приложения пишет только в очередь (NonBlockingQueueHandler), файл, stderr
+    и ротацию обслуживает поток QueueListener. Массовые события сэмплируются до очереди,
+    так что отброшенные записи ничего не стоят.
+    """
+
+    def __init__(self) -> None:
+        self.listener: Optional[QueueListener] = None
+        self.queue_handler: Optional[NonBlockingQueueHandler] = None
+        self._stop_registered = False
+
+    def start(self, logger: logging.Logger, handlers: List[logging.Handler], queue_size: int,
+              sample_rates: Dict[str, float]) -> None:
+        """
+        Переключает логгер на очередь и запускает поток записи.
+
+        :param logger: Логгер приложения; его текущие обработчики заменяются, всплытие к корневому отключается
+        :param handlers: Обработчики, которые будут вызываться в потоке записи
+        :param queue_size: Сколько записей очередь держит, пока поток записи не успевает
+        :param sample_rates: Доли сэмплирования по ключу события
+        """
+        self.stop()
+        log_queue: 'queue.Queue[logging.LogRecord]' = queue.Queue(maxsize=queue_size)
+        self.queue_handler = NonBlockingQueueHandler(log_queue)
+        self.queue_handler.addFilter(SamplingFilter(sample_rates))
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(self.queue_handler)
+        logger.propagate = False  # Обработчики корневого логгера писали бы синхронно в потоке запроса
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        if not self._stop_registered:
+            atexit.register(self.stop)
+            self._stop_registered = True
+
+    @property
+    def dropped(self) -> int:
+        """Сколько записей отброшено из-за переполненной очереди."""
+        return self.queue_handler.dropped if self.queue_handler is not None else 0
+
+    def stop(self) -> None:
+        """
+        Дописывает оставшиеся в очереди записи и останавливает поток записи.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
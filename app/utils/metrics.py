@@ -0,0 +1,366 @@
+import atexit
+import bisect
+import functools
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, g, request
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Счётчики и гистограммы в формате Prometheus (text exposition 0.0.4).
+
+    Запись в горячем пути — обновление словаря под блокировкой, без ввода-вывода.
+    Каждый процесс gunicorn раз в METRICS_FLUSH_SECONDS и при выходе сбрасывает свои значения
+    в METRICS_DIR/<pid>-<id>.json (id случайный на процесс, поэтому процесс с тем же pid
+    не затирает файл предшественника), а /metrics в любом процессе складывает файлы всех процессов
+    со своими текущими значениями. Файлы завершившихся процессов (перезапущенных воркеров,
+    запусков flask gc/scrub/...) compact складывает в archive.json, чтобы счётчики не убывали,
+    а каталог не рос. Без METRICS_DIR отдаются значения только текущего процесса.
+    """
+
+    COUNTER: str = 'counter'
+    HISTOGRAM: str = 'histogram'
+    GAUGE: str = 'gauge'
+    LATENCY_BUCKETS: Tuple[float, ...] = (
+        0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    )
+
+    ARCHIVE: str = 'archive.json'
+    MERGED_RETENTION_SECONDS: int = 3600
+
+    def __init__(self, prefix: str = '') -> None:
+        self.prefix = prefix
+        self.directory: Optional[str] = None
+        self._file_pid = 0
+        self._file_name = ''
+        self._definitions: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._counters: Dict[Tuple[str, LabelSet], float] = {}
+        self._histograms: Dict[Tuple[str, LabelSet], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> None:
+        """
+        Объявляет счётчик.
+
+        :param name: Имя метрики без префикса
+        :param documentation: Текст для # HELP
+        """
+        self._definitions[name] = (MetricsRegistry.COUNTER, documentation, ())
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """
+        Объявляет гистограмму.
+
+        :param name: Имя метрики без префикса
+        :param documentation: Текст для # HELP
+        :param buckets: Верхние границы корзин по возрастанию (+Inf добавляется сам)
+        """
+        self._definitions[name] = (MetricsRegistry.HISTOGRAM, documentation, buckets)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Читает каталог метрик из конфигурации и вешает замер длительности на все запросы Flask.
+
+        :param app: Flask приложение
+        """
+        self.directory = app.config['METRICS_DIR'] or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Увеличивает счётчик.
+
+        :param name: Имя объявленного счётчика
+        :param value: Прирост
+        :param labels: Значения меток
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Добавляет наблюдение в гистограмму.
+
+        :param name: Имя объявленной гистограммы
+        :param value: Наблюдаемое значение (для длительностей — секунды)
+        :param labels: Значения меток
+        """
+        buckets = self._definitions[name][2]
+        index = bisect.bisect_left(buckets, value)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                # Счётчики по корзинам (последняя — +Inf) и сумма наблюдений
+                series = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Замеряет длительность блока в гистограмму, в том числе завершившегося исключением.
+
+        :param name: Имя объявленной гистограммы
+        :param labels: Значения меток
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels: str) -> Callable[[Callable], Callable]:
+        """
+        Декоратор: замеряет длительность каждого вызова функции.
+
+        :param name: Имя объявленной гистограммы
+        :param labels: Значения меток
+        """
+        def decorate(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.time(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def timed_methods(self, name: str, label: str) -> Callable[[type], type]:
+        """
+        Декоратор класса: замеряет все публичные staticmethod класса,
+        метка label получает значение "Класс.метод".
+
+        :param name: Имя объявленной гистограммы
+        :param label: Имя метки с названием метода
+        """
+        def decorate(cls: type) -> type:
+            for attr, value in list(vars(cls).items()):
+                if isinstance(value, staticmethod) and not attr.startswith('_'):
+                    timed = self.timed(name, **{label: f"{cls.__name__}.{attr}"})(value.__func__)
+                    setattr(cls, attr, staticmethod(timed))
+            return cls
+        return decorate
+
+    def record_request(self, endpoint: str, method: str, status: int, duration: float) -> None:
+        """
+        Учитывает обработанный HTTP-запрос (используется и нативными ручками ASGI).
+
+        :param endpoint: Имя эндпоинта Flask, например files.download
+        :param method: HTTP-метод
+        :param status: Код ответа
+        :param duration: Длительность обработки в секундах
+        """
+        self.inc('http_requests_total', endpoint=endpoint, method=method, status=str(status))
+        self.observe('http_request_duration_seconds', duration, endpoint=endpoint, method=method)
+
+    def flush(self) -> None:
+        """
+        Атомарно сбрасывает значения текущего процесса в METRICS_DIR/<pid>-<id>.json.
+        """
+        if not self.directory:
+            return
+        self._write(self._own_file(), self._snapshot())
+
+    def compact(self) -> None:
+        """
+        Складывает файлы завершившихся процессов в METRICS_DIR/archive.json и удаляет их.
+
+        Выполняется одним процессом (фоновая задача под flock). Сначала атомарно заменяется архив
+        со списком вошедших в него файлов, потом файлы удаляются: /metrics читает архив последним
+        и пропускает перечисленные в нём файлы, поэтому ни один процесс не учитывается дважды.
+        """
+        if not self.directory:
+            return
+        archive = self._read(self.ARCHIVE) or {'counters': [], 'histograms': [], 'merged': {}}
+        stale = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            name = os.path.basename(path)
+            if name == self.ARCHIVE or name in archive['merged'] or self._is_running(name):
+                continue
+            snapshot = self._read(name)
+            if snapshot is not None:
+                stale.append((name, snapshot))
+        if not stale:
+            return
+
+        counters, histograms = self._merge([archive] + [snapshot for _, snapshot in stale])
+        now = time.time()
+        merged = {name: at for name, at in archive['merged'].items()
+                  if now - at < self.MERGED_RETENTION_SECONDS}
+        merged.update((name, now) for name, _ in stale)
+        self._write(self.ARCHIVE, {
+            'counters': [[name, labels, value] for name, series in counters.items()
+                         for labels, value in series.items()],
+            'histograms': [[name, labels, values] for name, series in histograms.items()
+                           for labels, values in series.items()],
+            'merged': merged,
+        })
+        for name, _ in stale:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """
+        Собирает значения всех процессов в текстовый формат Prometheus.
+
+        :param gauges: Мгновенные значения, посчитанные на момент запроса: имя -> (описание, значение)
+        :return: Тело ответа /metrics
+        """
+        counters, histograms = self._collect()
+        lines: List[str] = []
+        for name in sorted(self._definitions):
+            kind, documentation, buckets = self._definitions[name]
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {documentation}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == MetricsRegistry.COUNTER:
+                for labels, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{full_name}{self._format_labels(labels)} {self._format_value(value)}")
+                continue
+            for labels, series in sorted(histograms.get(name, {}).items()):
+                cumulative = 0.0
+                for bound, count in zip((*buckets, math.inf), series):
+                    cumulative += count
+                    le = (('le', '+Inf' if bound == math.inf else repr(bound)),)
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels + le)} {self._format_value(cumulative)}")
+                lines.append(f"{full_name}_sum{self._format_labels(labels)} {self._format_value(series[-1])}")
+                lines.append(f"{full_name}_count{self._format_labels(labels)} {self._format_value(cumulative)}")
+        for name, (documentation, value) in sorted((gauges or {}).items()):
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {documentation}")
+            lines.append(f"# TYPE {full_name} {MetricsRegistry.GAUGE}")
+            lines.append(f"{full_name} {self._format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(series)] for (name, labels), series in self._histograms.items()],
+            }
+
+    def _collect(self) -> Tuple[Dict[str, Dict[LabelSet, float]], Dict[str, Dict[LabelSet, List[float]]]]:
+        snapshots = [self._snapshot()]
+        if self.directory:
+            own = self._own_file()
+            others = {}
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                name = os.path.basename(path)
+                if name in (own, self.ARCHIVE):
+                    continue
+                snapshot = self._read(name)
+                if snapshot is not None:
+                    others[name] = snapshot
+            # Архив читается последним: файл, удалённый compact после glob, в нём уже учтён
+            archive = self._read(self.ARCHIVE)
+            if archive is not None:
+                snapshots.append(archive)
+                snapshots.extend(snapshot for name, snapshot in others.items() if name not in archive['merged'])
+            else:
+                snapshots.extend(others.values())
+        return self._merge(snapshots)
+
+    def _merge(self, snapshots: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[LabelSet, float]],
+                                                               Dict[str, Dict[LabelSet, List[float]]]]:
+        counters: Dict[str, Dict[LabelSet, float]] = {}
+        histograms: Dict[str, Dict[LabelSet, List[float]]] = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                if name not in self._definitions:
+                    continue
+                series = counters.setdefault(name, {})
+                key = tuple(tuple(pair) for pair in labels)
+                series[key] = series.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                definition = self._definitions.get(name)
+                if definition is None or len(values) != len(definition[2]) + 2:
+                    continue  # Метрику убрали или поменяли корзины, старые значения несовместимы
+                series = histograms.setdefault(name, {})
+                key = tuple(tuple(pair) for pair in labels)
+                total = series.setdefault(key, [0.0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+        return counters, histograms
+
+    def _own_file(self) -> str:
+        pid = os.getpid()
+        if self._file_pid != pid:
+            # Имя выбирается заново и в процессе, созданном fork после init_app
+            self._file_pid, self._file_name = pid, f"{pid}-{uuid.uuid4().hex[:12]}.json"
+        return self._file_name
+
+    @staticmethod
+    def _is_running(name: str) -> bool:
+        try:
+            pid = int(name[:-len('.json')].split('-', 1)[0])
+        except ValueError:
+            return True  # Чужой файл, не трогаем
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _read(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # Процесс как раз перезаписывает или файл удалён compact
+
+    def _write(self, name: str, data: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _format_labels(labels: LabelSet) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{MetricsRegistry._escape(value)}"' for key, value in labels) + '}'
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    @staticmethod
+    def _start_request() -> None:
+        g.metrics_start = time.perf_counter()
+
+    def _finish_request(self, response: Any) -> Any:
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            self.record_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                time.perf_counter() - start)
+        return response
@@ -0,0 +1,44 @@
+import os
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from app.config import Config
+
+
+class DownloadOffload:
+    """
+    Передача отдачи файла фронтовому прокси (DOWNLOAD_OFFLOAD).
+
+    Приложение отвечает пустым телом с заголовком X-Accel-Redirect (nginx) или X-Sendfile
+    (Apache mod_xsendfile, lighttpd), а байты файла отдаёт прокси через sendfile.
+    Для X-Accel-Redirect путь файла относительно DOWNLOAD_OFFLOAD_ROOT дописывается
+    к DOWNLOAD_OFFLOAD_PREFIX — internal location прокси с alias на этот каталог.
+    """
+
+    ACCEL_REDIRECT: str = 'x-accel-redirect'
+    SENDFILE: str = 'x-sendfile'
+
+    @staticmethod
+    def enabled() -> bool:
+        """
+        Проверяет, включена ли передача отдачи прокси.
+        """
+        return Config.DOWNLOAD_OFFLOAD in (DownloadOffload.ACCEL_REDIRECT, DownloadOffload.SENDFILE)
+
+    @staticmethod
+    def get_header(path: str) -> Optional[Tuple[str, str]]:
+        """
+        Формирует заголовок внутреннего перенаправления на файл.
+
+        :param path: Путь к файлу в хранилище
+        :return: Пара (имя заголовка, значение) или None, если прокси этот файл не отдаст
+        """
+        path = os.path.abspath(path)
+        if Config.DOWNLOAD_OFFLOAD == DownloadOffload.SENDFILE:
+            return 'X-Sendfile', path
+        if Config.DOWNLOAD_OFFLOAD != DownloadOffload.ACCEL_REDIRECT:
+            return None
+        relative = os.path.relpath(path, os.path.abspath(Config.DOWNLOAD_OFFLOAD_ROOT or Config.STORAGE_PATH))
+        if relative.startswith(os.pardir):
+            return None  # Том вне каталога, на который смотрит location прокси
+        return 'X-Accel-Redirect', quote(Config.DOWNLOAD_OFFLOAD_PREFIX.rstrip('/') + '/' + relative)
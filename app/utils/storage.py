@@ -1,67 +1,502 @@
+import errno
 import os
-from typing import IO
+import tempfile
+from typing import IO, Callable, Iterator, Optional, Tuple
 
 from flask import current_app
 
 from app.config import Config
 from app.exceptions.custom_exceptions import FileNotFoundInStorageError
+from app.extensions import blob_cache, db, metrics
+from app.repositories.blob_repository import BlobRepository
+from app.utils.chunk_storage import ChunkStore
+from app.utils.clock import utcnow
+from app.utils.compression import BlobCompressor
+from app.utils.hashing import FileHasher
+from app.utils.volumes import StorageVolumes
 
 class FileStorage:
     """
     Класс для работы с файловым хранилищем: формирование путей, сохранение и удаление файлов.
+
+    Файлы раскладываются по томам STORAGE_VOLUMES (по умолчанию один том STORAGE_PATH):
+    <том>/<hh>/<hash>. Читатели ищут файл на всех томах в порядке предпочтения,
+    поэтому после добавления тома хранилище работает и до окончания ребалансировки.
+    Загруженный без заранее известного хэша файл остаётся на томе, куда был записан,
+    и ставится в очередь фонового переноса на свой том (StorageService.relocate_queued).
+    Тома сгруппированы в уровни STORAGE_TIERS: новые файлы ложатся на первый (быстрый),
+    между уровнями их переносит TieringService, а поиск идёт по всем уровням.
+    При STORAGE_ENGINE = 'chunked' содержимое хранится кусками через ChunkStore,
+    а файла по get_file_path нет: читать нужно через open_file.
+    При STORAGE_COMPRESSION = 'gzip' сжимаемые файлы лежат по get_file_path(hash, 'gzip').
     """
 
+    TMP_PREFIX: str = '.tmp-'  # Префикс недописанных файлов, под финальным именем они не появляются
+    UPLOADS_DIR: str = '.uploads'  # Файлы незавершённых загрузок по частям, <том>/.uploads
+
     @staticmethod
-    def get_file_path(file_hash: str) -> str:
+    def get_file_path(file_hash: str, encoding: Optional[str] = None, volume: Optional[str] = None) -> str:
         """
         Формирует полный путь к файлу по его хэшу.
 
         :param file_hash: Хэш файла
+        :param encoding: Кодек, которым сжат файл, или None для несжатого
+        :param volume: Том (по умолчанию — том, на котором файл должен лежать)
         :return: Полный путь к файлу в файловой системе
         """
         return os.path.join(
-            Config.STORAGE_PATH,
+            volume or StorageVolumes.locate(file_hash),
             file_hash[:2],
-            file_hash
+            file_hash + BlobCompressor.SUFFIXES.get(encoding, '')
         )
 
     @staticmethod
-    def save_file(file_stream: IO, file_hash: str) -> str:
+    def locate_file(file_hash: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Ищет файл на томах, начиная с того, где он должен лежать.
+
+        :param file_hash: Хэш файла
+        :return: Кортеж (путь, кодек или None) или None, если файла нет
+        """
+        for volume in StorageVolumes.rank(file_hash):
+            for encoding in (None, *BlobCompressor.SUFFIXES):
+                path = FileStorage.get_file_path(file_hash, encoding, volume)
+                if os.path.isfile(path):
+                    return path, encoding
+        return None
+
+    @staticmethod
+    @metrics.timed('operation_duration_seconds', operation='write_temp_file')
+    def write_temp_file(file_stream: IO, limit: Optional[int] = None,
+                        expected_hash: Optional[str] = None) -> Tuple[str, str, int]:
         """
-        Сохраняет файл из потока в хранилище по пути, основанному на хэше.
+        Записывает поток во временный файл в хранилище за один проход, параллельно считая хэш.
+
+        Временный файл создаётся на случайном томе; под имя по хэшу на том же томе его переименовывает
+        place_temp_file после того, как файл зарегистрирован в БД. Если хэш известен заранее,
+        файл пишется сразу на свой том.
 
         :param file_stream: Поток файла для сохранения
-        :param file_hash: Хэш файла для имени и пути
-        :return: Путь к сохранённому файлу
+        :param limit: Сколько байт прочитать максимум (None — до конца потока)
+        :param expected_hash: Хэш, заявленный клиентом (только выбирает том, не проверяется)
+        :return: Кортеж (путь к временному файлу, хэш файла, размер в байтах)
         """
-        path = FileStorage.get_file_path(file_hash)
+        if expected_hash is not None and not FileStorage.is_chunked():
+            volume = StorageVolumes.locate(expected_hash)
+        else:
+            volume = StorageVolumes.pick_temp_volume()
+        os.makedirs(volume, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=FileStorage.TMP_PREFIX, dir=volume)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                file_hash, size = FileHasher.hash_and_copy(file_stream, f, limit=limit)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            current_app.logger.error("Failed to save file via %s: %s", tmp_path, e)
+            FileStorage.discard_temp_file(tmp_path)
+            raise
+        metrics.inc('upload_bytes_total', size)
+        return tmp_path, file_hash, size
+
+    @staticmethod
+    def discard_temp_file(tmp_path: str) -> None:
+        """
+        Удаляет временный файл, если он ещё не перенесён на место.
+
+        :param tmp_path: Путь к временному файлу
+        """
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    @staticmethod
+    @metrics.timed('operation_duration_seconds', operation='place_temp_file')
+    def place_temp_file(tmp_path: str, file_hash: str) -> bool:
+        """
+        Переносит дописанный временный файл на место по хэшу.
+
+        Вызывается после того, как ссылка на содержимое закоммичена в БД: сборщик мусора
+        удаляет файл до коммита удаления записи, поэтому здесь файл либо ещё на месте
+        и нужен, либо уже удалён и будет положен заново.
+        Временный файл в корне тома первого уровня или в его <том>/.uploads остаётся на этом томе:
+        перенос — переименование. Если том не совпал с тем, что назначен хэшу, файл ставится
+        в очередь фонового переноса (читатели до него ищут на всех томах). Иначе файл переносится на свой том.
+
+        :param tmp_path: Путь к временному файлу в каталоге хранилища
+        :param file_hash: Хэш содержимого
+        :return: True, если файл положен в хранилище, False если такой уже был
+        """
+        if FileStorage.is_chunked():
+            return ChunkStore.store(tmp_path, file_hash)
+
+        located = FileStorage.locate_file(file_hash)
+        if located is not None:
+            try:
+                # Свежий mtime не даёт сверке хранилища принять файл за сироту
+                os.utime(located[0])
+                os.remove(tmp_path)
+                current_app.logger.debug("File %s already in storage, temp file discarded", file_hash)
+                return False
+            except FileNotFoundError:
+                pass
+
+        directory = os.path.dirname(tmp_path)
+        if os.path.basename(directory) == FileStorage.UPLOADS_DIR:
+            directory = os.path.dirname(directory)
+        target_volume = StorageVolumes.locate(file_hash)
+        volume = next((path for path, _ in StorageVolumes.get_tier_volumes()
+                       if os.path.normpath(path) == os.path.normpath(directory)), target_volume)
+        path = FileStorage.get_file_path(file_hash, volume=volume)
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        if BlobCompressor.should_compress(tmp_path):
+            compressed_path = BlobCompressor.compress_file(tmp_path, os.path.dirname(path))
+            os.remove(tmp_path)
+            tmp_path, path = compressed_path, FileStorage.get_file_path(file_hash, BlobCompressor.GZIP, volume)
+        FileStorage.move_file(tmp_path, path)
+        current_app.logger.info("File saved successfully at %s", path)
+        if volume != target_volume:
+            FileStorage._queue_relocation(file_hash)
+        return True
+
+    @staticmethod
+    def _queue_relocation(file_hash: str) -> None:
+        """
+        Ставит файл в очередь переноса на свой том. Ошибка только логируется:
+        файл уже на месте и читается, а flask rebalance-storage найдёт его и без очереди.
+        """
         try:
-            with open(path, 'wb') as f:
-                file_stream.seek(0)
-                f.write(file_stream.read())
-            current_app.logger.info(f"File saved successfully at {path}")
+            BlobRepository.queue_relocation(file_hash, utcnow())
+            db.session.commit()
         except Exception as e:
-            current_app.logger.error(f"Failed to save file {file_hash} at {path}: {e}")
+            db.session.rollback()
+            current_app.logger.warning("Failed to queue %s for relocation: %s", file_hash, e)
+
+    @staticmethod
+    def move_file(source: str, target: str) -> None:
+        """
+        Атомарно переносит файл, в том числе на другой том.
+
+        Между томами файл копируется через copy_file и только потом удаляется источник.
+        Если источник за это время удалили (удаление файла параллельно с ребалансировкой),
+        копия тоже удаляется.
+
+        :param source: Путь к исходному файлу
+        :param target: Путь назначения
+        """
+        try:
+            os.replace(source, target)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+        FileStorage.copy_file(source, target)
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            os.remove(target)
+
+    @staticmethod
+    def copy_file(source: str, target: str, on_read: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Атомарно копирует файл: во временный файл рядом с целью, fsync и переименование.
+
+        Под именем target файл появляется только целиком, источник остаётся на месте.
+
+        :param source: Путь к исходному файлу
+        :param target: Путь назначения
+        :param on_read: Вызывается с размером каждого прочитанного блока (например, IoThrottle.consume)
+        :return: Размер скопированного файла в байтах
+        :raises FileNotFoundError: если источника нет
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=FileStorage.TMP_PREFIX, dir=os.path.dirname(target))
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f, open(source, 'rb') as src:
+                while True:
+                    chunk = src.read(FileHasher.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if on_read is not None:
+                        on_read(len(chunk))
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise
-        return path
+        return size
+
+    @staticmethod
+    def iter_stored_files() -> Iterator[Tuple[str, str, str]]:
+        """
+        Перечисляет файлы, лежащие на всех томах (без кусков движка 'chunked').
+
+        :return: Итератор по (путь, хэш файла, том)
+        """
+        for volume, _ in StorageVolumes.get_volumes():
+            for path, file_hash, _ in FileStorage.iter_volume_files(volume):
+                yield path, file_hash, volume
+
+    @staticmethod
+    def iter_volume_files(volume: str,
+                          after: Optional[Tuple[str, str]] = None) -> Iterator[Tuple[str, str, Tuple[str, str]]]:
+        """
+        Перечисляет файлы тома по возрастанию (каталог, имя), без кусков движка 'chunked'.
+
+        :param volume: Путь к тому
+        :param after: Позиция (каталог, имя), после которой продолжить обход
+        :return: Итератор по (путь, хэш файла, позиция)
+        """
+        if not os.path.isdir(volume):
+            return
+        for prefix in sorted(os.listdir(volume)):
+            directory = os.path.join(volume, prefix)
+            if prefix.startswith('.') or not os.path.isdir(directory) or (after and prefix < after[0]):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.startswith('.') and not (after and (prefix, name) <= after):
+                    yield os.path.join(directory, name), name[:64], (prefix, name)
+
+    @staticmethod
+    def iter_temp_files() -> Iterator[str]:
+        """
+        Перечисляет временные файлы на всех томах: недописанные и брошенные после сбоя.
+
+        :return: Итератор по путям
+        """
+        for volume, _ in StorageVolumes.get_volumes():
+            for root, _, names in os.walk(volume):
+                if os.path.basename(root) == FileStorage.UPLOADS_DIR:
+                    continue
+                for name in names:
+                    if name.startswith(FileStorage.TMP_PREFIX):
+                        yield os.path.join(root, name)
+
+    @staticmethod
+    def iter_misplaced() -> Iterator[Tuple[str, str]]:
+        """
+        Перечисляет файлы и куски, лежащие не на своём томе.
+
+        Файл сравнивается с томами своего текущего уровня: перенос между уровнями — дело TieringService.
+
+        :return: Итератор по парам (текущий путь, путь на нужном томе)
+        """
+        for path, file_hash, volume in FileStorage.iter_stored_files():
+            target_volume = StorageVolumes.locate(file_hash, StorageVolumes.get_tier_of(volume))
+            if target_volume != volume:
+                yield path, os.path.join(target_volume, os.path.relpath(path, volume))
+        for volume, _ in StorageVolumes.get_volumes():
+            for path, chunk_hash in ChunkStore.iter_chunk_files(volume):
+                target = ChunkStore.get_chunk_path(chunk_hash)
+                if target != path:
+                    yield path, target
+
+    @staticmethod
+    def is_chunked() -> bool:
+        """
+        Проверяет, включён ли движок хранения с дедупликацией по кускам.
+        """
+        return Config.STORAGE_ENGINE == 'chunked'
+
+    @staticmethod
+    def exists(file_hash: str) -> bool:
+        """
+        Проверяет наличие файла в хранилище.
+
+        :param file_hash: Хэш файла
+        :return: True, если файл есть
+        """
+        if FileStorage.is_chunked():
+            return ChunkStore.exists(file_hash)
+        return FileStorage.locate_file(file_hash) is not None
+
+    @staticmethod
+    def get_encoding(file_hash: str) -> Optional[str]:
+        """
+        Определяет, каким кодеком сжат файл в хранилище.
+
+        :param file_hash: Хэш файла
+        :return: Кодек ('gzip') или None, если файл хранится как есть или его нет
+        """
+        if FileStorage.is_chunked():
+            return None
+        located = FileStorage.locate_file(file_hash)
+        return located[1] if located else None
+
+    @staticmethod
+    def get_size(file_hash: str) -> int:
+        """
+        Возвращает размер исходного (несжатого) содержимого файла.
+
+        :param file_hash: Хэш файла
+        :return: Размер в байтах
+        :raises FileNotFoundInStorageError: если файла нет
+        """
+        if FileStorage.is_chunked():
+            return ChunkStore.get_size(file_hash)
+        located = FileStorage.locate_file(file_hash)
+        if located is None:
+            raise FileNotFoundInStorageError()
+        path, encoding = located
+        if encoding is not None:
+            # Размер сжатого файла на диске другой, исходный записан в БД
+            blob = BlobRepository.get(file_hash)
+            if blob is None:
+                raise FileNotFoundInStorageError()
+            return blob.size
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            raise FileNotFoundInStorageError()
+
+    @staticmethod
+    def open_file(file_hash: str) -> IO[bytes]:
+        """
+        Открывает файл из хранилища на чтение, сжатый файл распаковывается на лету.
+
+        :param file_hash: Хэш файла
+        :return: Поток исходного содержимого с поддержкой seek
+        :raises FileNotFoundInStorageError: если файла нет
+        """
+        if FileStorage.is_chunked():
+            return ChunkStore.open(file_hash)
+        stream, _ = FileStorage._open_located(
+            file_hash, lambda path, encoding: BlobCompressor.open_decoded(path) if encoding else open(path, 'rb')
+        )
+        return stream
+
+    @staticmethod
+    def open_stored_file(file_hash: str) -> Tuple[IO[bytes], int, Optional[str]]:
+        """
+        Открывает файл в том виде, как он лежит в хранилище, без распаковки.
+
+        :param file_hash: Хэш файла
+        :return: Кортеж (поток, размер хранимых байт, кодек или None)
+        :raises FileNotFoundInStorageError: если файла нет
+        """
+        if FileStorage.is_chunked():
+            return ChunkStore.open(file_hash), ChunkStore.get_size(file_hash), None
+        stream, encoding = FileStorage._open_located(file_hash, lambda path, _: open(path, 'rb'))
+        return stream, os.fstat(stream.fileno()).st_size, encoding
+
+    @staticmethod
+    def _open_located(file_hash: str,
+                      opener: Callable[[str, Optional[str]], IO[bytes]]) -> Tuple[IO[bytes], Optional[str]]:
+        """
+        Находит файл на томах и открывает его, повторяя поиск, если файл успел переехать.
+        """
+        for _ in range(2):
+            located = FileStorage.locate_file(file_hash)
+            if located is None:
+                break
+            path, encoding = located
+            try:
+                return opener(path, encoding), encoding
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundInStorageError()
+
+    @staticmethod
+    def get_upload_path(session_id: str) -> str:
+        """
+        Формирует путь к файлу незавершённой загрузки по частям.
+
+        Том выбирается по идентификатору сессии так же, как для хэша: части, пришедшие в разные
+        процессы, пишутся в один файл, а сессии распределяются по дискам первого уровня.
+
+        :param session_id: Идентификатор сессии загрузки
+        :return: Полный путь к файлу сессии
+        """
+        return os.path.join(StorageVolumes.locate(session_id), FileStorage.UPLOADS_DIR, f"{session_id}.part")
+
+    @staticmethod
+    def create_upload_file(session_id: str, size: int) -> None:
+        """
+        Создаёт (разреженный) файл сессии загрузки итогового размера.
+
+        :param session_id: Идентификатор сессии загрузки
+        :param size: Итоговый размер файла в байтах
+        """
+        path = FileStorage.get_upload_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.truncate(size)
+
+    @staticmethod
+    def write_upload_chunk(session_id: str, offset: int, file_stream: IO, limit: int) -> Tuple[str, int]:
+        """
+        Пишет часть загрузки в файл сессии по смещению, считая её хэш за тот же проход.
+
+        :param session_id: Идентификатор сессии загрузки
+        :param offset: Смещение части в файле
+        :param file_stream: Поток с содержимым части
+        :param limit: Максимальный размер части в байтах
+        :return: Кортеж (хэш части, количество записанных байт)
+        """
+        with open(FileStorage.get_upload_path(session_id), 'r+b') as f:
+            f.seek(offset)
+            chunk_hash, size = FileHasher.hash_and_copy(file_stream, f, limit=limit)
+            f.flush()
+            os.fsync(f.fileno())
+        metrics.inc('upload_bytes_total', size)
+        return chunk_hash, size
+
+    @staticmethod
+    def hash_upload_file(session_id: str) -> str:
+        """
+        Считает SHA-256 собранного файла сессии.
+
+        :param session_id: Идентификатор сессии загрузки
+        :return: Хэш файла
+        """
+        with open(FileStorage.get_upload_path(session_id), 'rb') as f:
+            return FileHasher.compute_hash(f)
+
+    @staticmethod
+    def delete_upload_file(session_id: str) -> None:
+        """
+        Удаляет файл сессии загрузки, если он есть.
+
+        :param session_id: Идентификатор сессии загрузки
+        """
+        path = FileStorage.get_upload_path(session_id)
+        if os.path.exists(path):
+            os.remove(path)
 
     @staticmethod
     def delete_file(file_hash: str) -> None:
         """
         Удаляет файл из хранилища по хэшу.
 
+        Вызывается сборщиком мусора до коммита удаления записи о содержимом.
+
         :param file_hash: Хэш файла для удаления
         :raises FileNotFoundInStorageError: Если файл не найден для удаления
         """
-        path = FileStorage.get_file_path(file_hash)
-        if os.path.exists(path):
+        blob_cache.invalidate(file_hash)
+        if FileStorage.is_chunked():
+            ChunkStore.delete(file_hash)
+            return
+
+        located = FileStorage.locate_file(file_hash)
+        if located is None:
+            current_app.logger.warning("File %s not found in storage", file_hash)
+            raise FileNotFoundInStorageError(f"File not found: {file_hash}")
+
+        while located is not None:
+            path, _ = located
             try:
                 os.remove(path)
-                current_app.logger.info(f"File {file_hash} deleted from storage.")
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                current_app.logger.error(f"Failed to delete file {file_hash} at {path}: {e}")
+                current_app.logger.error("Failed to delete file %s at %s: %s", file_hash, path, e)
                 raise
-        else:
-            current_app.logger.warning(f"File {file_hash} not found in storage at {path}")
-            raise FileNotFoundInStorageError(f"File not found: {file_hash}")
+            # Копия могла остаться на другом томе после прерванной ребалансировки
+            located = FileStorage.locate_file(file_hash)
+        current_app.logger.info("File %s deleted from storage.", file_hash)
@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class IoThrottle:
+    """
+    Ограничение скорости чтения: потоки делят один бюджет байт в секунду.
+
+    Каждый вызов consume бронирует время на свои байты вслед за предыдущими
+    и спит до начала своего окна, так что суммарный поток не превышает лимит.
+    """
+
+    def __init__(self, bytes_per_second: int) -> None:
+        self.bytes_per_second = bytes_per_second
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        """
+        Ждёт, пока бюджет позволит прочитать ещё size байт.
+
+        :param size: Сколько байт прочитано или будет прочитано
+        """
+        if self.bytes_per_second <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + size / self.bytes_per_second
+        if start > now:
+            time.sleep(start - now)
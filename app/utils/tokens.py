@@ -0,0 +1,49 @@
+import time
+from typing import Any, Dict, Optional
+
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.config import Config
+
+
+class TokenSigner:
+    """
+    Утилита для выпуска и проверки HMAC-подписанных токенов доступа.
+
+    Токен содержит id и имя пользователя и время истечения, подписан Config.SECRET_KEY.
+    """
+
+    SALT: str = 'auth-token'
+
+    @staticmethod
+    def _serializer() -> URLSafeSerializer:
+        return URLSafeSerializer(Config.SECRET_KEY, salt=TokenSigner.SALT)
+
+    @staticmethod
+    def issue(user_id: int, username: str, ttl: int) -> str:
+        """
+        Выпускает токен для пользователя.
+
+        :param user_id: Идентификатор пользователя
+        :param username: Имя пользователя
+        :param ttl: Время жизни токена в секундах
+        :return: Подписанный токен
+        """
+        payload = {'id': user_id, 'username': username, 'exp': int(time.time()) + ttl}
+        return TokenSigner._serializer().dumps(payload)
+
+    @staticmethod
+    def verify(token: str) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет подпись и срок действия токена.
+
+        :param token: Токен из заголовка Authorization
+        :return: Полезная нагрузка токена или None, если токен невалиден или истёк
+        """
+        try:
+            payload = TokenSigner._serializer().loads(token)
+        except BadSignature:
+            return None
+        if payload.get('exp', 0) < time.time():
+            return None
+        return payload
@@ -0,0 +1,151 @@
+import functools
+import hashlib
+import math
+import random
+from typing import List, Optional, Tuple
+
+from app.config import Config
+
+
+class StorageVolumes:
+    """
+    Раскладка содержимого по нескольким томам (дискам) хранилища.
+
+    Тома задаются в STORAGE_VOLUMES как "path[:weight],path[:weight]", вес — доля ёмкости.
+    Том с весом 0 выводится из работы: новые объекты на него не попадают,
+    старые читаются, пока ребалансировка их не перенесёт.
+    Том для хэша выбирается взвешенным rendezvous hashing: у каждого тома своя оценка
+    weight / -ln(u), где u — хэш пары (том, ключ), побеждает максимальная.
+    При добавлении тома переезжают только ключи, для которых он стал победителем
+    (примерно его доля веса), остальные остаются на месте.
+
+    Тома могут быть сгруппированы в уровни STORAGE_TIERS — от быстрого к ёмким:
+    "hot=path[:weight],...;cold=path[:weight],...". Новые объекты ложатся на первый уровень,
+    между уровнями их переносит TieringService, внутри уровня том выбирается как выше.
+    Без STORAGE_TIERS все тома STORAGE_VOLUMES образуют один уровень DEFAULT_TIER.
+    """
+
+    DEFAULT_TIER: str = 'default'
+
+    @staticmethod
+    def get_tiers() -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """
+        Возвращает уровни хранилища от быстрого к ёмким.
+
+        :return: Список (имя уровня, тома уровня)
+        """
+        return StorageVolumes._parse_tiers(Config.STORAGE_TIERS, Config.STORAGE_VOLUMES, Config.STORAGE_PATH)
+
+    @staticmethod
+    def get_tier_names() -> List[str]:
+        """
+        Возвращает имена уровней от быстрого к ёмким.
+        """
+        return [name for name, _ in StorageVolumes.get_tiers()]
+
+    @staticmethod
+    def get_tier_volumes(tier: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Возвращает тома уровня.
+
+        :param tier: Имя уровня (по умолчанию первый, быстрый)
+        :return: Список (путь, вес)
+        :raises KeyError: если такого уровня нет
+        """
+        tiers = StorageVolumes.get_tiers()
+        if tier is None:
+            return tiers[0][1]
+        return dict(tiers)[tier]
+
+    @staticmethod
+    def get_tier_of(volume: str) -> str:
+        """
+        Определяет уровень, к которому относится том.
+
+        :param volume: Путь к тому
+        :return: Имя уровня
+        """
+        for name, volumes in StorageVolumes.get_tiers():
+            if any(path == volume for path, _ in volumes):
+                return name
+        return StorageVolumes.get_tiers()[0][0]
+
+    @staticmethod
+    def get_volumes() -> List[Tuple[str, float]]:
+        """
+        Возвращает настроенные тома всех уровней.
+
+        :return: Список (путь, вес); без STORAGE_VOLUMES и STORAGE_TIERS — один том STORAGE_PATH
+        """
+        return [volume for _, volumes in StorageVolumes.get_tiers() for volume in volumes]
+
+    @staticmethod
+    def locate(key: str, tier: Optional[str] = None) -> str:
+        """
+        Определяет том, на котором должен лежать объект.
+
+        :param key: Хэш объекта
+        :param tier: Уровень (по умолчанию первый — туда попадают новые объекты)
+        :return: Путь к тому
+        """
+        return max(StorageVolumes.get_tier_volumes(tier), key=lambda v: StorageVolumes._score(v, key))[0]
+
+    @staticmethod
+    def rank(key: str) -> List[str]:
+        """
+        Упорядочивает тома по предпочтению для объекта.
+
+        Уровни идут от быстрого к ёмким, внутри уровня первый — текущее место объекта,
+        следующие — где он мог остаться до добавления томов и ребалансировки.
+        Во время переноса между уровнями объект лежит на обоих и находится на любом.
+
+        :param key: Хэш объекта
+        :return: Пути к томам
+        """
+        return [
+            path
+            for _, volumes in StorageVolumes.get_tiers()
+            for path, _ in sorted(volumes, key=lambda v: StorageVolumes._score(v, key), reverse=True)
+        ]
+
+    @staticmethod
+    def pick_temp_volume() -> str:
+        """
+        Выбирает том первого уровня для временного файла загрузки, пока хэш ещё неизвестен.
+
+        Выбор случайный с учётом весов, чтобы запись распределялась по дискам.
+
+        :return: Путь к тому
+        """
+        volumes = StorageVolumes.get_tier_volumes()
+        return random.choices([path for path, _ in volumes], weights=[weight for _, weight in volumes])[0]
+
+    @staticmethod
+    def _score(volume: Tuple[str, float], key: str) -> float:
+        path, weight = volume
+        digest = hashlib.blake2b(f"{path}\0{key}".encode(), digest_size=8).digest()
+        u = (int.from_bytes(digest, 'big') + 1) / (2 ** 64 + 1)
+        return weight / -math.log(u)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _parse_tiers(spec: str, volumes_spec: str,
+                     default_path: str) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        tiers = []
+        for item in filter(None, (part.strip() for part in spec.split(';'))):
+            name, sep, volumes = item.partition('=')
+            if not sep or not name.strip():
+                raise ValueError(f"STORAGE_TIERS item must look like name=path[:weight],...: {item!r}")
+            tiers.append((name.strip(), StorageVolumes._parse(volumes, default_path)))
+        return tiers or [(StorageVolumes.DEFAULT_TIER, StorageVolumes._parse(volumes_spec, default_path))]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _parse(spec: str, default_path: str) -> List[Tuple[str, float]]:
+        volumes = []
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            path, sep, weight = item.rpartition(':')
+            if not sep or not weight.replace('.', '', 1).isdigit():
+                path, weight = item, '1'
+            volumes.append((path, float(weight)))
+        return volumes or [(default_path, 1.0)]
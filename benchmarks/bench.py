@@ -0,0 +1,548 @@
+"""
+Бенчмарки загрузки, скачивания, удаления и аутентификации.
+
+Приложение поднимается через create_app() на временном STORAGE_PATH и временной SQLite,
+запросы идут через тестовый клиент Flask без сети, поэтому числа отражают FileService,
+FileStorage, репозитории и bcrypt, а не HTTP-сервер. Результат — JSON, который можно
+сравнить с прошлым прогоном:
+
+    poetry run python -m benchmarks.bench --output bench.json
+    poetry run python -m benchmarks.bench --quick --compare bench.json
+
+С --compare процесс завершается с кодом 1, если какой-то сценарий стал медленнее порога.
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+DEFAULT_SIZES = '1K,64K,1M,16M,128M,1G'
+QUICK_SIZES = '1K,64K,1M,16M'
+
+
+class PatternStream:
+    """
+    Детерминированное псевдослучайное содержимое заданного размера, читается потоком,
+    чтобы файлы на гигабайт не держать в памяти. Одинаковый seed — одинаковые байты.
+    """
+
+    BLOCK_SIZE: int = 1024 * 1024
+
+    def __init__(self, size: int, seed: str) -> None:
+        self.size = size
+        self.position = 0
+        self._random = random.Random(seed)
+        self._buffer = b''
+
+    def read(self, n: int = -1) -> bytes:
+        remaining = self.size - self.position
+        n = remaining if n is None or n < 0 else min(n, remaining)
+        while len(self._buffer) < n:
+            self._buffer += self._random.randbytes(min(PatternStream.BLOCK_SIZE, self.size))
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        self.position += n
+        return data
+
+
+class BenchmarkSuite:
+    """
+    Сценарии бенчмарка. Каждый сценарий добавляет в results записи вида
+    "<сценарий>/<вариант>" со статистикой по итерациям.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        from app import create_app
+        from app.extensions import limiter
+
+        self.args = args
+        self.app = create_app()
+        self.app.logger.setLevel('WARNING')
+        limiter.enabled = False
+        self.client = self.app.test_client()
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.failures: List[str] = []  # Нарушенные проверки сценариев, дают код выхода 1
+        self.basic = {'Authorization': 'Basic ' + base64.b64encode(b'user1:password1').decode()}
+        self.bearer = {'Authorization': 'Bearer ' + self.client.post('/auth/token', headers=self.basic).json['token']}
+
+    def run(self, scenarios: List[str]) -> Dict[str, Dict[str, Any]]:
+        for name in scenarios:
+            print(f"== {name}", file=sys.stderr)
+            getattr(self, f"bench_{name}")()
+        return self.results
+
+    def bench_upload(self) -> None:
+        """
+        Загрузка нового содержимого разных размеров.
+        Тело multipart собирается до замера, в замер входит только обработка запроса.
+        """
+        from werkzeug.test import EnvironBuilder
+
+        for label, size in self._sizes():
+            timings = []
+            for i in range(self._iterations(size)):
+                builder = EnvironBuilder(path='/files/upload', method='POST', headers=self.bearer,
+                                         data={'file': (PatternStream(size, f"upload-{size}-{i}"), 'bench.bin')})
+                try:
+                    request = builder.get_request()
+                    start = time.perf_counter()
+                    response = self.client.open(request)
+                    timings.append(time.perf_counter() - start)
+                finally:
+                    builder.close()
+                self._check(response, 200)
+            self._record(f"upload/{label}", timings, size)
+
+    def bench_upload_raw(self) -> None:
+        """
+        Загрузка нового содержимого сырым телом (PUT /files), для сравнения с multipart в upload.
+        Тело, как и в upload, готовится до замера.
+        """
+        for label, size in self._sizes():
+            timings = []
+            for i in range(self._iterations(size)):
+                with tempfile.TemporaryFile() as body:
+                    shutil.copyfileobj(PatternStream(size, f"upload-raw-{size}-{i}"), body, PatternStream.BLOCK_SIZE)
+                    body.seek(0)
+                    environ = {'wsgi.input': body, 'CONTENT_LENGTH': str(size)}
+                    start = time.perf_counter()
+                    response = self.client.put('/files', headers=self.bearer, environ_overrides=environ)
+                    timings.append(time.perf_counter() - start)
+                self._check(response, 200)
+            self._record(f"upload_raw/{label}", timings, size)
+
+    def bench_dedup(self) -> None:
+        """
+        Повторная загрузка уже хранящегося содержимого другими пользователями (попадание в дедупликацию).
+        """
+        from werkzeug.test import EnvironBuilder
+
+        users = self._create_users('dedup', self.args.iterations)
+        for label, size in self._sizes(limit=16 * SIZE_UNITS['M']):
+            seed = f"dedup-{size}"
+            self._check(self._upload(PatternStream(size, seed), self.bearer), 200)
+            timings = []
+            for headers in users:
+                builder = EnvironBuilder(path='/files/upload', method='POST', headers=headers,
+                                         data={'file': (PatternStream(size, seed), 'bench.bin')})
+                try:
+                    request = builder.get_request()
+                    start = time.perf_counter()
+                    response = self.client.open(request)
+                    timings.append(time.perf_counter() - start)
+                finally:
+                    builder.close()
+                self._check(response, 200)
+            self._record(f"dedup/{label}", timings, size)
+
+    def bench_download(self) -> None:
+        """
+        Скачивание: cold — после вытеснения файла из page cache (posix_fadvise) и из кэша процесса,
+        warm — повторное чтение того же файла.
+        """
+        from app.extensions import blob_cache
+
+        for label, size in self._sizes():
+            response = self._upload(PatternStream(size, f"download-{size}"), self.bearer)
+            self._check(response, 200)
+            file_hash = response.json['hash']
+            iterations = self._iterations(size)
+            for mode in ('cold', 'warm'):
+                timings = []
+                for _ in range(iterations):
+                    if mode == 'cold':
+                        blob_cache.invalidate(file_hash)
+                        self._evict_page_cache(file_hash)
+                    start = time.perf_counter()
+                    received = self._download(file_hash)
+                    timings.append(time.perf_counter() - start)
+                    if received != size:
+                        raise RuntimeError(f"Downloaded {received} bytes of {size}")
+                self._record(f"download_{mode}/{label}", timings, size)
+
+    def bench_delete(self) -> None:
+        """
+        Удаление одного содержимого у большого числа владельцев: каждый владелец удаляет свою ссылку,
+        последнее удаление ставит содержимое в очередь, затем сборщик мусора удаляет файл.
+        """
+        from app.models.user import User
+        from app.repositories.user_repository import UserRepository
+        from app.services.file_service import FileService
+        from app.services.gc_service import GarbageCollectionService
+
+        fan_out = self.args.fan_out
+        users = self._create_users('owner', fan_out)
+        response = self._upload(PatternStream(64 * SIZE_UNITS['K'], 'delete-fan-out'), self.bearer)
+        file_hash = response.json['hash']
+        with self.app.app_context():
+            for i in range(fan_out):
+                user: User = UserRepository.get_by_username(f"bench-owner-{i}")
+                FileService.register_file(user, file_hash, 64 * SIZE_UNITS['K'])
+
+        timings = []
+        for headers in users + [self.bearer]:
+            start = time.perf_counter()
+            response = self.client.delete(f"/files/{file_hash}", headers=headers)
+            timings.append(time.perf_counter() - start)
+            self._check(response, 204)
+        self._record(f"delete_fan_out/{fan_out}", timings)
+
+        with self.app.app_context():
+            start = time.perf_counter()
+            stats = GarbageCollectionService.collect(grace_seconds=0)
+            self._record('gc_collect/1', [time.perf_counter() - start])
+        if stats['deleted'] != 1:
+            raise RuntimeError(f"GC deleted {stats['deleted']} blobs, expected 1")
+
+    def bench_auth(self) -> None:
+        """
+        Стоимость проверки Basic (bcrypt) и Bearer (подпись токена) на /auth/verify.
+        """
+        for label, headers in (('basic', self.basic), ('bearer', self.bearer)):
+            timings = []
+            for _ in range(self.args.iterations):
+                start = time.perf_counter()
+                response = self.client.get('/auth/verify', headers=headers)
+                timings.append(time.perf_counter() - start)
+                self._check(response, 200)
+            self._record(f"auth_verify/{label}", timings)
+
+    def bench_concurrency(self) -> None:
+        """
+        Параллельные клиенты: в каждом потоке свой тестовый клиент, 80% скачиваний
+        и 20% загрузок нового содержимого по 64 KiB. Ошибки считаются, а не прерывают прогон.
+        """
+        size = 64 * SIZE_UNITS['K']
+        file_hash = self._upload(PatternStream(size, 'concurrency'), self.bearer).json['hash']
+        for level in self.args.concurrency:
+            errors = 0
+            lock = threading.Lock()
+
+            def worker(index: int) -> List[float]:
+                nonlocal errors
+                client = self.app.test_client()
+                timings = []
+                for i in range(self.args.iterations):
+                    start = time.perf_counter()
+                    if i % 5 == 4:
+                        stream = PatternStream(size, f"concurrency-{level}-{index}-{i}")
+                        response = client.post('/files/upload', headers=self.bearer,
+                                               data={'file': (stream, 'bench.bin')})
+                    else:
+                        response = client.get(f"/files/{file_hash}")
+                        response.get_data()
+                    timings.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        with lock:
+                            errors += 1
+                return timings
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                timings = [t for result in pool.map(worker, range(level)) for t in result]
+            elapsed = time.perf_counter() - start
+            self._record(f"concurrency/{level}", timings, rps=round(len(timings) / elapsed, 1), errors=errors)
+
+    def bench_upload_processes(self) -> None:
+        """
+        Загрузки из нескольких процессов в одну БД с заданной суммарной частотой, как у gunicorn
+        с несколькими воркерами. Сценарий проваливается при любой ошибке "database is locked"
+        и при темпе ниже --upload-rate больше чем на --rate-tolerance.
+        """
+        from app.config import Config
+
+        processes, rate = self.args.processes, self.args.upload_rate
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes) as pool:
+            results = pool.starmap(upload_worker, [
+                (Config.STORAGE_PATH, self.bearer, index, rate / processes, self.args.duration)
+                for index in range(processes)
+            ])
+        timings = [t for result in results for t in result['timings']]
+        name = f"upload_processes/{processes}x{rate:g}"
+        rps = len(timings) / self.args.duration
+        lock_errors = sum(result['lock_errors'] for result in results)
+        self._record(
+            name, timings, rps=round(rps, 1), target_rps=rate,
+            errors=sum(result['errors'] for result in results), lock_errors=lock_errors,
+        )
+        if lock_errors:
+            self.failures.append(f"{name}: {lock_errors} 'database is locked' error(s)")
+        if rps < rate * (1 - self.args.rate_tolerance):
+            self.failures.append(f"{name}: {rps:.1f} uploads/s, below target {rate:g}")
+
+    def _upload(self, stream: PatternStream, headers: Dict[str, str]) -> Any:
+        return self.client.post('/files/upload', headers=headers, data={'file': (stream, 'bench.bin')})
+
+    def _download(self, file_hash: str) -> int:
+        response = self.client.get(f"/files/{file_hash}", buffered=False)
+        self._check(response, 200)
+        try:
+            return sum(len(chunk) for chunk in response.response)
+        finally:
+            response.close()
+
+    def _create_users(self, prefix: str, count: int) -> List[Dict[str, str]]:
+        """
+        Создаёт пользователей с общим bcrypt-хэшем (bcrypt на каждого занял бы минуты)
+        и возвращает заголовки с их Bearer-токенами.
+        """
+        from app.extensions import db
+        from app.models.user import User
+        from app.services.auth_service import AuthService
+
+        with self.app.app_context():
+            password_hash = User.query.filter_by(username='user1').first().password_hash
+            users = [User(username=f"bench-{prefix}-{i}", password_hash=password_hash) for i in range(count)]
+            db.session.add_all(users)
+            db.session.commit()
+            return [{'Authorization': f"Bearer {AuthService.issue_token(user)}"} for user in users]
+
+    def _evict_page_cache(self, file_hash: str) -> None:
+        from app.repositories.chunk_repository import ChunkRepository
+        from app.utils.chunk_storage import ChunkStore
+        from app.utils.storage import FileStorage
+
+        with self.app.app_context():
+            if FileStorage.is_chunked():
+                paths = [ChunkStore.find_chunk_path(c.chunk_hash) for c in ChunkRepository.get_manifest_chunks(file_hash)]
+            else:
+                paths = [FileStorage.locate_file(file_hash)[0]]
+        for path in filter(None, paths):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+    def _sizes(self, limit: Optional[int] = None) -> List[tuple]:
+        sizes = [(label, parse_size(label)) for label in self.args.sizes.split(',')]
+        return [(label, size) for label, size in sizes if limit is None or size <= limit]
+
+    def _iterations(self, size: int) -> int:
+        """
+        Число итераций для размера: не больше --iterations и не больше --bytes-budget на сценарий.
+        """
+        return max(1, min(self.args.iterations, self.args.bytes_budget // size))
+
+    def _record(self, name: str, timings: List[float], size: Optional[int] = None, **extra: Any) -> None:
+        result = summarize(timings)
+        if size is not None:
+            result['bytes'] = size
+            result['mb_per_s'] = round(size * len(timings) / sum(timings) / SIZE_UNITS['M'], 2)
+        result.update(extra)
+        self.results[name] = result
+        print(f"{name:28} p50={result['p50_ms']:>10.3f} ms  p95={result['p95_ms']:>10.3f} ms"
+              + ''.join(f"  {k}={result[k]}" for k in ('mb_per_s', 'rps', 'errors', 'lock_errors') if k in result),
+              file=sys.stderr)
+
+    @staticmethod
+    def _check(response: Any, status: int) -> None:
+        if response.status_code != status:
+            raise RuntimeError(f"Unexpected status {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+
+def upload_worker(storage_path: str, headers: Dict[str, str], index: int, rate: float,
+                  duration: float) -> Dict[str, Any]:
+    """
+    Процесс сценария upload_processes: своё приложение на общей БД и хранилище,
+    загрузки по 64 KiB по расписанию rate в секунду в течение duration секунд.
+    """
+    from app.config import Config
+    Config.STORAGE_PATH = storage_path
+    from app import create_app
+    from app.extensions import limiter
+
+    app = create_app()
+    app.logger.setLevel('WARNING')
+    limiter.enabled = False
+    client = app.test_client()
+    timings: List[float] = []
+    errors = lock_errors = 0
+    start = time.perf_counter()
+    i = 0
+    while (elapsed := time.perf_counter() - start) < duration:
+        if i / rate > elapsed:
+            time.sleep(i / rate - elapsed)
+        stream = PatternStream(64 * SIZE_UNITS['K'], f"processes-{index}-{i}")
+        request_start = time.perf_counter()
+        response = client.post('/files/upload', headers=headers, data={'file': (stream, 'bench.bin')})
+        timings.append(time.perf_counter() - request_start)
+        if response.status_code != 200:
+            errors += 1
+            lock_errors += 'database is locked' in response.get_data(as_text=True)
+        i += 1
+    return {'timings': timings, 'errors': errors, 'lock_errors': lock_errors}
+
+
+SCENARIOS: List[str] = [name[len('bench_'):] for name in vars(BenchmarkSuite) if name.startswith('bench_')]
+
+
+def parse_size(value: str) -> int:
+    """
+    Размер вида 64K, 16M, 1G или число байт.
+    """
+    value = value.strip().upper()
+    if value[-1:] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    """
+    Статистика по замерам в миллисекундах (перцентили — nearest rank).
+    """
+    ordered = sorted(timings)
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        'iterations': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Сравнивает прогоны по p50 и пропускной способности.
+
+    :return: Описания регрессий сильнее threshold (доля)
+    """
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        # Для задержки рост — регрессия, для пропускной способности — падение
+        for key, higher_is_better in (('p50_ms', False), ('mb_per_s', True), ('rps', True)):
+            if key not in result or not old.get(key):
+                continue
+            change = result[key] / old[key] - 1
+            worse = -change if higher_is_better else change
+            line = f"{name:28} {key:9} {old[key]:>12} -> {result[key]:>12} ({change:+.1%})"
+            print(line, file=sys.stderr)
+            if worse > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Через запятую из: {', '.join(SCENARIOS)}")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Размеры файлов, например 1K,1M,1G')
+    parser.add_argument('--quick', action='store_true', help=f"Размеры {QUICK_SIZES} и меньше итераций")
+    parser.add_argument('--iterations', type=int, default=20, help='Итераций на вариант сценария')
+    parser.add_argument('--bytes-budget', type=parse_size, default=parse_size('2G'),
+                        help='Сколько байт максимум загружать/скачивать на один размер')
+    parser.add_argument('--fan-out', type=int, default=1000, help='Число владельцев в сценарии delete')
+    parser.add_argument('--concurrency', type=lambda v: [int(x) for x in v.split(',')], default=[1, 4, 16],
+                        help='Числа параллельных клиентов')
+    parser.add_argument('--processes', type=int, default=4, help='Процессов в сценарии upload_processes')
+    parser.add_argument('--upload-rate', type=float, default=100, help='Суммарная частота загрузок в секунду')
+    parser.add_argument('--duration', type=float, default=10, help='Длительность upload_processes, секунды')
+    parser.add_argument('--rate-tolerance', type=float, default=0.1,
+                        help='Допустимый недобор темпа upload_processes до --upload-rate, доля')
+    parser.add_argument('--engine', choices=('file', 'chunked'), default='file', help='STORAGE_ENGINE')
+    parser.add_argument('--compression', choices=('none', 'gzip'), default='none', help='STORAGE_COMPRESSION')
+    parser.add_argument('--output', help='Файл для JSON с результатами (по умолчанию stdout)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое ухудшение, доля')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.quick:
+        args.sizes = QUICK_SIZES if args.sizes == DEFAULT_SIZES else args.sizes
+        args.iterations = min(args.iterations, 5)
+        args.fan_out = min(args.fan_out, 200)
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    workdir = tempfile.mkdtemp(prefix='file-storage-bench-')
+    cwd = os.getcwd()
+    # Конфигурация читает окружение при импорте, поэтому приложение импортируется только после этого
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'STORAGE_ENGINE': args.engine,
+        'STORAGE_COMPRESSION': args.compression,
+        'METRICS_DIR': '',
+        'GC_INTERVAL_SECONDS': '0',
+    })
+    try:
+        from app.config import Config
+        Config.STORAGE_PATH = os.path.join(workdir, 'store')
+        os.chdir(workdir)  # Лог приложения пишется в ./logs
+        started = datetime.now(timezone.utc)
+        suite = BenchmarkSuite(args)
+        results = suite.run(scenarios)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'started_at': started.isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+        'failures': suite.failures,
+    }
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+    status = 0
+    if suite.failures:
+        print(f"{len(suite.failures)} check(s) failed:", file=sys.stderr)
+        for line in suite.failures:
+            print(f"  {line}", file=sys.stderr)
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            status = 1
+    return status
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import base64
+from typing import Callable, Dict, Iterator, List
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app.config import Config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch) -> Iterator[Flask]:
+    """
+    Приложение на временных SQLite и хранилище, без фоновых задач и лимитов запросов.
+    """
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'data.db'}")
+    monkeypatch.setattr(Config, 'STORAGE_PATH', str(tmp_path / 'store'))
+    monkeypatch.setattr(Config, 'STORAGE_VOLUMES', '')
+    monkeypatch.setattr(Config, 'STORAGE_TIERS', '')
+    monkeypatch.setattr(Config, 'METRICS_DIR', '')
+    monkeypatch.setattr(Config, 'GC_INTERVAL_SECONDS', 0)
+    monkeypatch.setattr(Config, 'RELOCATE_INTERVAL_SECONDS', 0)
+    monkeypatch.setattr(Config, 'UPLOAD_FINALIZE_INTERVAL_SECONDS', 0)
+    monkeypatch.chdir(tmp_path)  # Лог приложения пишется в ./logs
+
+    from app import create_app, db
+    from app.extensions import limiter
+
+    app = create_app()
+    app.logger.setLevel('WARNING')
+    monkeypatch.setattr(limiter, 'enabled', False)
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client: FlaskClient) -> Dict[str, Dict[str, str]]:
+    """
+    Заголовки Bearer для дефолтных пользователей: bcrypt проверяется один раз, а не в каждом запросе.
+    """
+    headers = {}
+    for username, password in (('user1', 'password1'), ('user2', 'password2'), ('user3', 'password3')):
+        basic = {'Authorization': 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()}
+        token = client.post('/auth/token', headers=basic).json['token']
+        headers[username] = {'Authorization': f"Bearer {token}"}
+    return headers
+
+
+@pytest.fixture
+def check_consistency(app: Flask) -> Callable[[], List[str]]:
+    """
+    Сверяет счётчики с записями о владении: refcount содержимого с числом файлов,
+    used_bytes и file_count пользователей с их файлами, а содержимое со ссылками — с диском.
+    Возвращает функцию, которая отдаёт список расхождений.
+    """
+    from sqlalchemy import func, select
+
+    from app import db
+    from app.models.blob import Blob
+    from app.models.file import File
+    from app.models.user import User
+    from app.utils.storage import FileStorage
+
+    def check() -> List[str]:
+        problems = []
+        with app.app_context():
+            links = dict(db.session.execute(select(File.hash, func.count()).group_by(File.hash)).all())
+            for blob in db.session.scalars(select(Blob)):
+                files = links.pop(blob.hash, 0)
+                if blob.refcount != files:
+                    problems.append(f"blob {blob.hash}: refcount {blob.refcount}, files {files}")
+                if blob.refcount > 0 and not FileStorage.exists(blob.hash):
+                    problems.append(f"blob {blob.hash}: referenced but missing from storage")
+            problems.extend(f"files reference missing blob {file_hash}" for file_hash in links)
+            for user in db.session.scalars(select(User)):
+                used, count = db.session.execute(
+                    select(func.coalesce(func.sum(Blob.size), 0), func.count())
+                    .select_from(File).join(Blob, Blob.hash == File.hash).where(File.user_id == user.id)
+                ).one()
+                if (user.used_bytes, user.file_count) != (used, count):
+                    problems.append(f"user {user.username}: used {user.used_bytes}/{user.file_count}, "
+                                    f"files {used}/{count}")
+        return problems
+
+    return check
@@ -0,0 +1,69 @@
+import hashlib
+import io
+import os
+import threading
+
+from app.services.gc_service import GarbageCollectionService
+
+THREADS_PER_USER = 3
+ROUNDS = 4
+
+
+def test_concurrent_uploads_and_deletes(app, auth_headers, check_consistency):
+    """
+    Пользователи параллельно загружают и удаляют одно и то же содержимое, пока сборщик мусора
+    без задержки удаляет освободившееся: ни один запрос не получает "database is locked",
+    счётчики ссылок и использования сходятся с записями о владении.
+    """
+    contents = [os.urandom(4096 + i) for i in range(THREADS_PER_USER * 4)]
+    errors = []
+    stop = threading.Event()
+
+    def worker(headers, owned):
+        client = app.test_client()
+        try:
+            for round_number in range(ROUNDS + 1):
+                for data in owned:
+                    response = client.post('/files/upload', data={'file': (io.BytesIO(data), 'f.bin')},
+                                           headers=headers)
+                    if response.status_code != 200:
+                        errors.append(('upload', response.status_code, response.get_data(as_text=True)))
+                if round_number == ROUNDS:
+                    break  # Последний раунд оставляет файлы, чтобы проверить их наличие на диске
+                for data in owned:
+                    response = client.delete(f"/files/{hashlib.sha256(data).hexdigest()}", headers=headers)
+                    if response.status_code != 204:
+                        errors.append(('delete', response.status_code, response.get_data(as_text=True)))
+        except Exception as e:  # Ошибка в потоке иначе потеряется
+            errors.append(('exception', type(e).__name__, str(e)))
+
+    def collector():
+        try:
+            while not stop.is_set():
+                with app.app_context():
+                    GarbageCollectionService.collect(grace_seconds=0)
+        except Exception as e:
+            errors.append(('gc', type(e).__name__, str(e)))
+
+    threads = [
+        threading.Thread(target=worker, args=(headers, contents[t::THREADS_PER_USER]))
+        for headers in auth_headers.values() for t in range(THREADS_PER_USER)
+    ]
+    gc_thread = threading.Thread(target=collector)
+    gc_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    gc_thread.join()
+
+    assert not [e for e in errors if 'locked' in str(e)]
+    assert errors == []
+    assert check_consistency() == []
+
+    client = app.test_client()
+    for data in contents:
+        response = client.get(f"/files/{hashlib.sha256(data).hexdigest()}")
+        assert response.status_code == 200
+        assert response.data == data
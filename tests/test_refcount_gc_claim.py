@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+
+from sqlalchemy import delete
+
+from app import db
+from app.models.blob import Blob, BlobGcCandidate
+from app.models.file import File
+from app.services.gc_service import GarbageCollectionService
+from app.utils.storage import FileStorage
+
+
+def upload(client, headers, data: bytes) -> str:
+    response = client.post('/files/upload', data={'file': (io.BytesIO(data), 'f.bin')}, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json['hash']
+
+
+def get_blob(app, file_hash: str):
+    with app.app_context():
+        return db.session.get(Blob, file_hash)
+
+
+def test_shared_content_is_stored_once_and_counted(app, client, auth_headers, check_consistency):
+    data = os.urandom(2048)
+    file_hash = upload(client, auth_headers['user1'], data)
+    assert upload(client, auth_headers['user2'], data) == file_hash
+    assert upload(client, auth_headers['user2'], data) == file_hash  # Повторная загрузка владельцем не считается
+
+    assert file_hash == hashlib.sha256(data).hexdigest()
+    assert get_blob(app, file_hash).refcount == 2
+    assert check_consistency() == []
+
+    assert client.delete(f"/files/{file_hash}", headers=auth_headers['user1']).status_code == 204
+    assert client.delete(f"/files/{file_hash}", headers=auth_headers['user1']).status_code == 404
+    assert get_blob(app, file_hash).refcount == 1
+    assert client.get(f"/files/{file_hash}").data == data
+    assert check_consistency() == []
+
+
+def test_gc_deletes_unreferenced_content_after_grace(app, client, auth_headers, check_consistency):
+    data = os.urandom(2048)
+    file_hash = upload(client, auth_headers['user1'], data)
+    assert client.delete(f"/files/{file_hash}", headers=auth_headers['user1']).status_code == 204
+    assert client.get(f"/files/{file_hash}").status_code == 404
+
+    with app.app_context():
+        assert GarbageCollectionService.collect() == {'deleted': 0, 'revived': 0}  # Ещё не прошёл GC_GRACE_SECONDS
+        assert FileStorage.exists(file_hash)
+        assert GarbageCollectionService.collect(grace_seconds=0) == {'deleted': 1, 'revived': 0}
+        assert not FileStorage.exists(file_hash)
+    assert get_blob(app, file_hash) is None
+    assert check_consistency() == []
+
+
+def test_gc_keeps_content_uploaded_again(app, client, auth_headers, check_consistency):
+    data = os.urandom(2048)
+    file_hash = upload(client, auth_headers['user1'], data)
+    assert client.delete(f"/files/{file_hash}", headers=auth_headers['user1']).status_code == 204
+    upload(client, auth_headers['user2'], data)
+
+    with app.app_context():
+        assert GarbageCollectionService.collect(grace_seconds=0) == {'deleted': 0, 'revived': 1}
+        assert db.session.get(BlobGcCandidate, file_hash) is None
+    assert client.get(f"/files/{file_hash}").data == data
+    assert check_consistency() == []
+
+
+def test_claim_links_existing_content(app, client, auth_headers, check_consistency):
+    data = os.urandom(2048)
+    file_hash = upload(client, auth_headers['user1'], data)
+
+    response = client.post(f"/files/{file_hash}/claim", json={'filename': 'copy.bin'}, headers=auth_headers['user2'])
+    assert response.status_code == 200
+    assert response.json == {'hash': file_hash, 'status': 'deduplicated'}
+    assert get_blob(app, file_hash).refcount == 2
+    assert check_consistency() == []
+
+
+def test_claim_rejects_unknown_and_released_content(app, client, auth_headers, check_consistency):
+    assert client.post(f"/files/{'0' * 64}/claim", headers=auth_headers['user2']).status_code == 404
+
+    file_hash = upload(client, auth_headers['user1'], os.urandom(2048))
+    assert client.delete(f"/files/{file_hash}", headers=auth_headers['user1']).status_code == 204
+    # Содержимое в очереди сборщика мусора нельзя воскресить через claim
+    assert client.post(f"/files/{file_hash}/claim", headers=auth_headers['user2']).status_code == 404
+    assert get_blob(app, file_hash).refcount == 0
+    assert check_consistency() == []
+
+
+def test_claim_rejects_non_object_body(client, auth_headers):
+    file_hash = upload(client, auth_headers['user1'], os.urandom(2048))
+    for body in ([], 'name', 1):
+        response = client.post(f"/files/{file_hash}/claim", json=body, headers=auth_headers['user2'])
+        assert response.status_code == 400
+    response = client.post(f"/files/{file_hash}/claim", json={'filename': 1}, headers=auth_headers['user2'])
+    assert response.status_code == 400
+
+
+def test_claim_loses_race_with_gc(app, client, auth_headers, monkeypatch):
+    """
+    Сборщик мусора удаляет содержимое между проверкой наличия файла и привязкой:
+    claim отвечает 404 и не создаёт ссылку на удалённое содержимое.
+    """
+    file_hash = upload(client, auth_headers['user1'], os.urandom(2048))
+    exists = FileStorage.exists
+
+    def exists_then_collected(checked_hash):
+        found = exists(checked_hash)
+        # То, что удаление владельцем и сборщик мусора сделали бы в других процессах
+        with db.engine.begin() as connection:
+            connection.execute(delete(File).where(File.hash == file_hash))
+            connection.execute(delete(Blob).where(Blob.hash == file_hash))
+        FileStorage.delete_file(file_hash)
+        return found
+
+    with monkeypatch.context() as patch:
+        patch.setattr(FileStorage, 'exists', staticmethod(exists_then_collected))
+        assert client.post(f"/files/{file_hash}/claim", headers=auth_headers['user2']).status_code == 404
+
+    assert get_blob(app, file_hash) is None
+    assert client.get('/files', headers=auth_headers['user2']).json['files'] == []
+
+
+def test_raw_upload_restores_content_collected_after_check(app, client, auth_headers, monkeypatch):
+    """
+    PUT /files с X-Content-SHA256 пропускает тело, если содержимое уже есть; если сборщик мусора
+    удалил его после проверки, тело всё же читается и файл сохраняется.
+    """
+    data = os.urandom(2048)
+    file_hash = upload(client, auth_headers['user1'], data)
+    exists = FileStorage.exists
+    collected = []
+
+    def exists_then_collected(checked_hash):
+        found = exists(checked_hash)
+        if checked_hash == file_hash and not collected:
+            with db.engine.begin() as connection:
+                connection.execute(delete(File).where(File.hash == file_hash))
+                connection.execute(delete(Blob).where(Blob.hash == file_hash))
+            FileStorage.delete_file(file_hash)
+            collected.append(file_hash)
+        return found
+
+    with monkeypatch.context() as patch:
+        patch.setattr(FileStorage, 'exists', staticmethod(exists_then_collected))
+        response = client.put('/files', data=data, headers={**auth_headers['user2'], 'X-Content-SHA256': file_hash})
+
+    assert response.status_code == 200, response.json
+    assert collected
+    assert get_blob(app, file_hash).refcount == 1
+    assert client.get(f"/files/{file_hash}").data == data